@@ -0,0 +1,478 @@
+from asyncio import run
+from datetime import datetime
+from enum import Enum
+from json import dumps
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import numpy as np
+from typer import Argument, Option, Typer, echo
+from typing_extensions import Annotated, Iterator, List, Optional, Tuple
+
+from app.storage.db import DBSession, create_db_engine, get_db_engine, new_db_session
+from app.storage.mappers import (
+    AreaMapper,
+    BranchMapper,
+    ItemMapper,
+    OrderMapper,
+    RestaurantMapper,
+    RiderMapper,
+    UserMapper,
+    insert,
+    update,
+)
+from app.storage.migrations import SCHEMA_VERSION, get_schema_version, migrate as migrate_db
+from app.config import DISPATCH_TICK_TARGET, PASSWORD_HASH_SCHEME, PASSWORD_HASH_ROUNDS
+from app.schemas import ImportResult, ItemCreate, OrderCreate, OrderLine, OrderStatus, RecordFormat
+from app.services import (
+    BranchService,
+    DispatchService,
+    EtaService,
+    ItemService,
+    OrderService,
+    RestaurantService,
+    SearchService,
+    run_dispatcher,
+    task_queue,
+)
+from app.services.geo import EARTH_RADIUS
+from app.services.password import benchmark_password_context, create_password_context
+from app.services.records import iter_lines, parse_records
+from app.services.serviceability import ServiceabilityService
+
+cli = Typer(help="Foodkoala maintenance commands")
+
+
+class ImportKind(str, Enum):
+    RESTAURANTS = "restaurants"
+    BRANCHES = "branches"
+    ITEMS = "items"
+
+
+_import_services = {
+    ImportKind.RESTAURANTS: RestaurantService,
+    ImportKind.BRANCHES: BranchService,
+    ImportKind.ITEMS: ItemService,
+}
+
+
+def _iter_file(path: Path, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    with path.open("rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def _echo_import_result(result: ImportResult, elapsed: float, max_errors: int = 20) -> None:
+    echo(f"Imported {result.imported} records, rejected {result.failed}, in {elapsed:.2f} s")
+    echo(f"{(result.imported + result.failed) / elapsed:.0f} records/s")
+    for error in result.errors[:max_errors]:
+        echo(f"line {error.loc[1]}: {'.'.join(map(str, error.loc[2:])) or 'record'}: {error.msg}")
+
+
+@cli.callback()
+def main():
+    pass
+
+
+@cli.command()
+def migrate():
+    """
+    Create or upgrade the database schema to the latest version. Run it once before starting the workers.
+    """
+    engine = get_db_engine()
+    applied = migrate_db(engine)
+    if applied:
+        echo(f"Applied migrations {', '.join(map(str, applied))}")
+    echo(f"Database schema is at version {get_schema_version(engine)} of {SCHEMA_VERSION}")
+
+
+@cli.command()
+def rebuild_serviceability():
+    """
+    Recompute the delivery cell to branch map, e.g. after changing `PROXIMITY_THRESHOLD`.
+    """
+    for db in new_db_session():
+        count = ServiceabilityService(db).rebuild()
+    echo(f"Wrote {count} serviceability entries")
+
+
+@cli.command()
+def rebuild_etas():
+    """
+    Relearn delivery times from all delivered orders and re-estimate them, e.g. after upgrading.
+    """
+    for db in new_db_session():
+        count = EtaService(db).rebuild()
+    echo(f"Learned delivery times from {count} orders")
+
+
+async def _run_dispatcher() -> None:
+    # The side effects of assigned orders run on the task queue, which only runs while started
+    await task_queue.start()
+    try:
+        await run_dispatcher()
+    finally:
+        await task_queue.stop()
+
+
+@cli.command()
+def dispatch(
+    loop: Annotated[bool, Option(help="Run a tick every `DISPATCH_INTERVAL` seconds until interrupted")] = False,
+):
+    """
+    Run one dispatch tick, matching pending orders with available riders. Dispatch should run in
+    one process only, so with several app workers, run it here with `--loop` rather than in the app.
+    Orders assigned here are not pushed to the subscribers of the app's workers, which only
+    see them when they fetch them.
+    """
+    if loop:
+        run(_run_dispatcher())
+        return
+    for db in new_db_session():
+        result = DispatchService(db).dispatch()
+    echo(
+        f"Assigned {result.assigned} of {result.orders} orders to {result.riders} riders in {result.areas} areas "
+        f"in {result.elapsed:.3f}s ({result.solve_time:.3f}s matching), {result.conflicts} conflicts"
+    )
+
+
+@cli.command()
+def purge_idempotency_keys():
+    """
+    Delete the expired idempotency keys of orders. Expired keys are ignored anyway, so this only reclaims space.
+    """
+    for db in new_db_session():
+        count = OrderService(db).purge_idempotency_keys()
+    echo(f"Deleted {count} expired idempotency keys")
+
+
+@cli.command()
+def benchmark_passwords(
+    scheme: Annotated[List[str], Option(help="Hash scheme to measure, repeatable")] = [PASSWORD_HASH_SCHEME],
+    rounds: Annotated[Optional[List[int]], Option(help="Cost to measure, repeatable")] = None,
+    duration: Annotated[float, Option(help="Seconds to hash for, per configuration")] = 1.0,
+):
+    """
+    Measure password hashes per second on one core for each scheme and cost, to size
+    `PASSWORD_HASH_ROUNDS` and `PASSWORD_WORKER_THREADS`.
+    """
+    for name in scheme:
+        for cost in rounds or [PASSWORD_HASH_ROUNDS]:
+            rate = benchmark_password_context(create_password_context(name, cost, []), duration=duration)
+            echo(f"{name:<16} rounds={cost if cost is not None else 'default':<8} {rate:10.1f} hashes/s/core")
+
+
+
+@cli.command()
+def benchmark_requests(
+    path: Annotated[str, Argument(help="Path and query of a GET endpoint, e.g. /api/v1/orders/?limit=100")],
+    requests: Annotated[int, Option(help="Number of timed requests")] = 500,
+    warmup: Annotated[int, Option(help="Number of untimed requests sent first")] = 20,
+):
+    """
+    Measure requests per second of a GET endpoint served in-process against the configured
+    database, without the network or the server in the way.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        for _ in range(warmup):
+            client.get(path).raise_for_status()
+        start = perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        elapsed = perf_counter() - start
+    echo(f"{requests / elapsed:.1f} requests/s, {1000 * elapsed / requests:.2f} ms/request")
+
+
+@cli.command()
+def benchmark_login(
+    requests: Annotated[int, Option(help="Number of timed logins")] = 200,
+    concurrency: Annotated[int, Option(help="Number of logins in flight at once")] = 16,
+    probe: Annotated[str, Option(help="GET endpoint timed while the logins run")] = "/api/v1/areas/",
+):
+    """
+    Measure the latency of concurrent `POST /login/access-token` requests served in-process against
+    the configured database, and of a GET endpoint called meanwhile, to check that password hashing
+    does not hold up other requests. Logs in as a benchmark user, created first if needed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi.testclient import TestClient
+    from app.config import API_V1_PREFIX
+    from app.main import app
+
+    email, password = "benchmark-login@example.com", "benchmark-password"
+    form = {"username": email, "password": password}
+
+    def timed(method: str, path: str, **kwargs) -> Tuple[float, int]:
+        start = perf_counter()
+        status_code = client.request(method, path, **kwargs).status_code
+        return perf_counter() - start, status_code
+
+    with TestClient(app) as client:
+        client.post(f"{API_V1_PREFIX}/users/", json={"email": email, "phone": "01700000000", "password": password})
+        client.post(f"{API_V1_PREFIX}/login/access-token", data=form).raise_for_status()
+        client.get(probe).raise_for_status()
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max(1, concurrency)) as executor:
+            futures = [
+                executor.submit(timed, "POST", f"{API_V1_PREFIX}/login/access-token", data=form)
+                for _ in range(requests)
+            ]
+            probes = []
+            while not all(future.done() for future in futures):
+                probes.append(timed("GET", probe))
+            logins = [future.result() for future in futures]
+        elapsed = perf_counter() - start
+
+    # Rejected logins (429 once `PASSWORD_QUEUE_MAX` are waiting) are counted apart from the latencies
+    for name, results in (("login", logins), ("probe", probes)):
+        latencies = sorted(1000 * latency for latency, status_code in results if status_code < 400)
+        failed = len(results) - len(latencies)
+        if not latencies:
+            echo(f"{name}: all {failed} requests failed")
+            continue
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+        echo(f"{name}: p50 {p50:.2f}ms, p99 {p99:.2f}ms, max {latencies[-1]:.2f}ms, {failed} failed")
+    echo(f"{requests / elapsed:.1f} logins/s with {concurrency} in flight")
+
+
+@cli.command("import")
+def import_records(
+    kind: Annotated[ImportKind, Argument(help="What the file contains")],
+    path: Annotated[Path, Argument(help="File to import, one record per line", exists=True, dir_okay=False)],
+    format: Annotated[Optional[RecordFormat], Option(help="Format of the file, by default from its extension")] = None,
+):
+    """
+    Import restaurants, branches or menu items from an NDJSON or CSV file, the same way as the
+    `POST /<kind>/import` endpoints.
+    """
+    if format is None:
+        format = RecordFormat.CSV if path.suffix.lower() == ".csv" else RecordFormat.NDJSON
+    start = perf_counter()
+    for db in new_db_session():
+        service = _import_services[kind](db)
+        result = service.import_records(parse_records(iter_lines(_iter_file(path)), format, service.CreateType))
+    _echo_import_result(result, perf_counter() - start)
+
+
+@cli.command()
+def benchmark_import(
+    rows: Annotated[int, Option(help="Number of menu items to import")] = 50000,
+    format: Annotated[RecordFormat, Option(help="Format of the generated file")] = RecordFormat.CSV,
+):
+    """
+    Measure import throughput by importing generated menu items into a scratch SQLite database.
+    """
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / f"items.{format.value}"
+        with path.open("w") as file:
+            if format == RecordFormat.CSV:
+                file.write("name,description,price,restaurant_id\n")
+                file.writelines(f"Item {i},Tasty item number {i},{1.5 + i % 500},1\n" for i in range(rows))
+            else:
+                records = (
+                    {"name": f"Item {i}", "description": f"Tasty item number {i}", "price": 1.5 + i % 500, "restaurant_id": 1}
+                    for i in range(rows)
+                )
+                file.writelines(dumps(record) + "\n" for record in records)
+
+        engine = create_db_engine(f"sqlite:///{directory}/benchmark.db")
+        migrate_db(engine)
+        with DBSession(engine) as db:
+            db.add(RestaurantMapper(name="Benchmark"))
+            db.commit()
+            start = perf_counter()
+            records = parse_records(iter_lines(_iter_file(path)), format, ItemCreate)
+            result = ItemService(db).import_records(records)
+            elapsed = perf_counter() - start
+        engine.dispose()
+    _echo_import_result(result, elapsed)
+
+
+@cli.command()
+def benchmark_orders(
+    orders: Annotated[int, Option(help="Number of orders to place")] = 2000,
+    lines: Annotated[int, Option(help="Number of distinct items per order")] = 5,
+):
+    """
+    Measure sustained order placement throughput, one session and transaction per order as in a
+    request, against a scratch SQLite database.
+    """
+    with TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/benchmark.db")
+        migrate_db(engine)
+        with DBSession(engine) as db:
+            db.add(UserMapper(email="benchmark@example.com", phone="+8801700000000", hashed_password=""))
+            db.add(RestaurantMapper(name="Benchmark"))
+            db.flush()
+            db.add(BranchMapper(restaurant_id=1, latitude=0.41, longitude=1.58))
+            db.add_all(
+                ItemMapper(name=f"Item {i}", description="", price=1.5 + i, restaurant_id=1) for i in range(100)
+            )
+            db.commit()
+
+        start = perf_counter()
+        for i in range(orders):
+            items = [OrderLine(item_id=1 + (i + j) % 100, quantity=1 + j) for j in range(lines)]
+            data = OrderCreate(customer_id=1, branch_id=1, latitude=0.41, longitude=1.58, items=items)
+            with DBSession(engine) as db:
+                OrderService(db).create(data=data)
+        elapsed = perf_counter() - start
+        engine.dispose()
+    echo(f"Placed {orders} orders of {lines} items in {elapsed:.2f}s ({orders / elapsed:.0f} orders/s)")
+
+
+@cli.command()
+def benchmark_dispatch(
+    orders: Annotated[int, Option(help="Number of pending orders")] = 1000,
+    riders: Annotated[int, Option(help="Number of available riders")] = 1000,
+    branches: Annotated[int, Option(help="Number of branches the orders are placed at")] = 100,
+    radius: Annotated[float, Option(help="Radius of the area, in meters")] = 3000,
+    ticks: Annotated[int, Option(help="Number of ticks to run")] = 5,
+):
+    """
+    Measure the latency of dispatch ticks against `DISPATCH_TICK_TARGET`, with orders and riders
+    spread at random over a single area of a scratch SQLite database.
+    """
+    rng = np.random.default_rng(0)
+    center = (0.41, 1.58)
+
+    def spread(count: int) -> List[Tuple[float, float]]:
+        # Uniformly over a disk around the center, in radians
+        distances = radius * np.sqrt(rng.uniform(0, 1, count)) / EARTH_RADIUS
+        bearings = rng.uniform(0, 2 * np.pi, count)
+        latitudes = center[0] + distances * np.cos(bearings)
+        longitudes = center[1] + distances * np.sin(bearings) / np.cos(center[0])
+        return list(zip(latitudes.tolist(), longitudes.tolist()))
+
+    with TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/benchmark.db")
+        migrate_db(engine)
+        now = datetime.now()
+        with DBSession(engine) as db:
+            db.add(UserMapper(email="benchmark@example.com", phone="+8801700000000", hashed_password=""))
+            db.add(RestaurantMapper(name="Benchmark"))
+            db.add(AreaMapper(name="Benchmark", latitude=center[0], longitude=center[1]))
+            db.flush()
+            branch_coords = spread(branches)
+            db.exec(
+                insert(BranchMapper),
+                params=[
+                    {"restaurant_id": 1, "area_id": 1, "latitude": lat, "longitude": lon, "address": "", "created_at": now}
+                    for lat, lon in branch_coords
+                ],
+            )
+            db.exec(
+                insert(OrderMapper),
+                params=[
+                    {
+                        "customer_id": 1,
+                        "branch_id": 1 + i % branches,
+                        "latitude": branch_coords[i % branches][0],
+                        "longitude": branch_coords[i % branches][1],
+                        "address": "",
+                        "status": OrderStatus.PENDING,
+                        "version": 0,
+                        "total": 0,
+                        "created_at": now,
+                    }
+                    for i in range(orders)
+                ],
+            )
+            db.exec(
+                insert(RiderMapper),
+                params=[
+                    {"name": f"Rider {i}", "latitude": lat, "longitude": lon, "available": True, "created_at": now}
+                    for i, (lat, lon) in enumerate(spread(riders))
+                ],
+            )
+            db.commit()
+
+        results = []
+        for _ in range(ticks):
+            with DBSession(engine) as db:
+                results.append(DispatchService(db).dispatch())
+                db.exec(update(OrderMapper).values(status=OrderStatus.PENDING, rider_id=None, version=0))
+                db.exec(update(RiderMapper).values(available=True))
+                db.commit()
+        engine.dispose()
+
+    for tick, result in enumerate(results, start=1):
+        echo(
+            f"tick {tick}: assigned {result.assigned} of {result.orders} orders to {result.riders} riders "
+            f"in {result.elapsed:.3f}s ({result.solve_time:.3f}s matching)"
+        )
+    elapsed = sorted(result.elapsed for result in results)
+    echo(f"median tick {elapsed[len(elapsed) // 2]:.3f}s, max {elapsed[-1]:.3f}s, target {DISPATCH_TICK_TARGET:.3f}s")
+
+
+@cli.command()
+def benchmark_search(
+    items: Annotated[int, Option(help="Number of items to search")] = 1_000_000,
+    words: Annotated[int, Option(help="Number of distinct words in names and descriptions")] = 20_000,
+    queries: Annotated[int, Option(help="Number of queries of each kind")] = 1000,
+    target: Annotated[float, Option(help="Target 99th percentile latency, in milliseconds")] = 10,
+):
+    """
+    Measure the latency of item search with the configured `SEARCH_INDEX`, on a scratch SQLite
+    database of items named and described with random words of Zipf-distributed frequencies, so
+    that the most common words are in most items.
+    """
+    rng = np.random.default_rng(0)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    vocabulary = ["".join(rng.choice(letters, rng.integers(3, 10))) for _ in range(words)]
+    frequencies = 1 / np.arange(1, words + 1)
+    frequencies /= frequencies.sum()
+
+    def sample(count: int) -> List[str]:
+        return [vocabulary[i] for i in rng.choice(words, count, p=frequencies)]
+
+    with TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/benchmark.db")
+        migrate_db(engine)
+        now = datetime.now()
+        with DBSession(engine) as db:
+            db.add(RestaurantMapper(name="Benchmark"))
+            db.flush()
+            for start in range(0, items, 100_000):
+                count = min(100_000, items - start)
+                name_words, description_words = sample(3 * count), sample(8 * count)
+                name_lengths = rng.integers(1, 4, count)
+                db.exec(
+                    insert(ItemMapper),
+                    params=[
+                        {
+                            "name": " ".join(name_words[3 * i : 3 * i + name_lengths[i]]),
+                            "description": " ".join(description_words[8 * i : 8 * i + 8]),
+                            "price": 1,
+                            "restaurant_id": 1,
+                            "created_at": now,
+                        }
+                        for i in range(count)
+                    ],
+                )
+            db.commit()
+
+        # Autocompletion of a word as it is typed, alone or after a complete word
+        typed = [word[: rng.integers(1, len(word) + 1)] for word in sample(queries)]
+        kinds = {"one word": typed, "two words": [f"{first} {last}" for first, last in zip(sample(queries), typed)]}
+        with DBSession(engine) as db:
+            service = SearchService(db)
+            service.search_items(query=typed[0])
+            for kind, kind_queries in kinds.items():
+                latencies = []
+                for query in kind_queries:
+                    start = perf_counter()
+                    service.search_items(query=query)
+                    latencies.append(perf_counter() - start)
+                latencies = sorted(latency * 1000 for latency in latencies)
+                p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+                echo(f"{kind}: p50 {p50:.2f}ms, p99 {p99:.2f}ms, max {latencies[-1]:.2f}ms, target p99 {target:.2f}ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    cli()
@@ -8,16 +8,87 @@ class RunMode(str, Enum):
     PROD = "prod"
 
 
+class EventBrokerKind(str, Enum):
+    LOCAL = "local"
+
+
+class SearchIndexKind(str, Enum):
+    FTS5 = "fts5"
+    MEMORY = "memory"
+
+
 load_dotenv()
 
 RUN_MODE = os.getenv("RUN_MODE", RunMode.DEV)
 API_V1_PREFIX = os.getenv("API_V1_PREFIX", "/api/v1")
 API_RESOURCE_QUERY_PAGE_MAX = int(os.getenv("API_V1_RESOURCE_MAX_LIMIT", 100))
+API_RESOURCE_BULK_MAX = int(os.getenv("API_V1_RESOURCE_BULK_MAX", 1000))
+API_RESOURCE_EXPORT_BATCH_SIZE = int(os.getenv("API_V1_RESOURCE_EXPORT_BATCH_SIZE", 1000))
+API_RESOURCE_IMPORT_CHUNK_SIZE = int(os.getenv("API_V1_RESOURCE_IMPORT_CHUNK_SIZE", 1000))
+API_RESOURCE_IMPORT_MAX_ERRORS = int(os.getenv("API_V1_RESOURCE_IMPORT_MAX_ERRORS", 1000))
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", str(RUN_MODE == RunMode.DEV)).lower() in ("1", "true", "yes")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_SQLITE_JOURNAL_MODE = os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL")
+DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+DB_SQLITE_MMAP_SIZE = int(os.getenv("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+DB_SQLITE_CACHE_SIZE = int(os.getenv("DB_SQLITE_CACHE_SIZE", -64000))  # negative means KiB
+DB_SQLITE_BUSY_TIMEOUT = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", 5000))  # milliseconds
+DB_WORKER_THREADS = int(os.getenv("DB_WORKER_THREADS", 16))
+PASSWORD_WORKER_THREADS = int(os.getenv("PASSWORD_WORKER_THREADS", os.cpu_count() or 1))
+PASSWORD_QUEUE_MAX = int(os.getenv("PASSWORD_QUEUE_MAX", 64))  # calls waiting for a password worker
+PASSWORD_QUEUE_RETRY_AFTER = int(os.getenv("PASSWORD_QUEUE_RETRY_AFTER", 1))  # seconds
+TASK_QUEUE_CONCURRENCY = int(os.getenv("TASK_QUEUE_CONCURRENCY", 4))
+TASK_QUEUE_MAX_SIZE = int(os.getenv("TASK_QUEUE_MAX_SIZE", 10000))
+TASK_QUEUE_MAX_RETRIES = int(os.getenv("TASK_QUEUE_MAX_RETRIES", 3))
+TASK_QUEUE_RETRY_DELAY = float(os.getenv("TASK_QUEUE_RETRY_DELAY", 0.5))  # seconds, doubled on each retry
+TASK_QUEUE_DRAIN_TIMEOUT = float(os.getenv("TASK_QUEUE_DRAIN_TIMEOUT", 10))  # seconds
+EVENT_BROKER = os.getenv("EVENT_BROKER", EventBrokerKind.LOCAL)
+EVENT_SUBSCRIPTION_MAX_PENDING = int(os.getenv("EVENT_SUBSCRIPTION_MAX_PENDING", 16))  # messages per subscriber
+EVENT_STREAM_HEARTBEAT = float(os.getenv("EVENT_STREAM_HEARTBEAT", 15))  # seconds
 
 
 JWT_SECRET = os.getenv("JWT_SECRET", "my_secret")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 SESSION_EXPIRE_MINUTES = int(os.getenv("SESSION_EXPIRE", 3600))
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS")) if os.getenv("PASSWORD_HASH_ROUNDS") else None
+PASSWORD_DEPRECATED_SCHEMES = [name for name in os.getenv("PASSWORD_DEPRECATED_SCHEMES", "").split(",") if name]
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 300))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", 10000))
+
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))  # seconds
 
 PROXIMITY_THRESHOLD = float(os.getenv("PROXIMITY_THRESHOLD", 5000))
+SPATIAL_INDEX_CELL_SIZE = float(os.getenv("SPATIAL_INDEX_CELL_SIZE", PROXIMITY_THRESHOLD))
+SPATIAL_INDEX_TTL = float(os.getenv("SPATIAL_INDEX_TTL", 60))  # seconds before a worker reloads its index
+
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", 60))
+AVAILABILITY_CACHE_MAX_SIZE = int(os.getenv("AVAILABILITY_CACHE_MAX_SIZE", 10000))
+
+RESTAURANT_SNAPSHOT_CACHE_TTL = float(os.getenv("RESTAURANT_SNAPSHOT_CACHE_TTL", 300))
+RESTAURANT_SNAPSHOT_CACHE_MAX_SIZE = int(os.getenv("RESTAURANT_SNAPSHOT_CACHE_MAX_SIZE", 10000))
+RESTAURANT_SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("RESTAURANT_SNAPSHOT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+SERVICEABILITY_GEOHASH_PRECISION = int(os.getenv("SERVICEABILITY_GEOHASH_PRECISION", 6))
+
+DISPATCH_INTERVAL = float(os.getenv("DISPATCH_INTERVAL", 5))  # seconds between ticks
+# Run dispatch ticks in the app. Dispatch must run in one process only, so with several workers, leave this off and run
+# `python -m app.cli dispatch --loop` instead, or set it in a single worker
+DISPATCH_IN_APP = os.getenv("DISPATCH_IN_APP", "false").lower() in ("1", "true", "yes")
+DISPATCH_MAX_DISTANCE = float(os.getenv("DISPATCH_MAX_DISTANCE", PROXIMITY_THRESHOLD))  # meters from rider to branch
+DISPATCH_TICK_TARGET = float(os.getenv("DISPATCH_TICK_TARGET", 1))  # seconds, longer ticks are logged
+
+ETA_MIN_SAMPLES = int(os.getenv("ETA_MIN_SAMPLES", 20))  # deliveries in an area before its own estimates are used
+ETA_DEFAULT_BASE = float(os.getenv("ETA_DEFAULT_BASE", 20 * 60))  # seconds to prepare and pick up an order
+ETA_DEFAULT_SPEED = float(os.getenv("ETA_DEFAULT_SPEED", 4))  # meters per second from branch to customer
+ETA_MAX_DURATION = float(os.getenv("ETA_MAX_DURATION", 4 * 60 * 60))  # seconds, longer deliveries are not learned from
+
+# SQLite's full-text index by default, the in-process one on other databases
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", SearchIndexKind.FTS5 if DB_URL.startswith("sqlite") else SearchIndexKind.MEMORY)
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", 100))  # matches ranked per query, see `SearchService`
@@ -1,5 +1,10 @@
 from .area import area_router
 from .restaurant import restaurant_router
+from .branch import branch_router
+from .item import item_router
 from .user import user_router
 from .order import order_router
-from .login import login_router
\ No newline at end of file
+from .rider import rider_router
+from .search import search_router
+from .login import login_router
+from .metrics import metrics_router
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends
 from typing_extensions import Annotated, List, Optional
 
-from app.schemas import Area, AreaCreate, AreaUpdate
-from app.services import AreaService
+from app.schemas import Area, AreaCreate, AreaUpdate, BulkUpdateEntry, BulkResult
+from app.services import AreaService, run_in_db_worker
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
 
 area_router = APIRouter(
     prefix="/areas",
@@ -13,25 +15,55 @@ AreaServiceDep = Annotated[AreaService, Depends()]
 
 
 @area_router.get("/", response_model=List[Area])
-async def get_areas(area_service: AreaServiceDep, offset: Optional[int] = None, limit: Optional[int] = None):
-    return area_service.get_list(offset=offset, limit=limit)
+async def get_areas(
+    area_service: AreaServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = area_service.get_fieldset(fields=fields, include=include)
+    areas, next_cursor = await run_in_db_worker(
+        area_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(areas, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@area_router.post("/bulk", response_model=BulkResult)
+async def create_areas(area_service: AreaServiceDep, data: List[AreaCreate]):
+    return BulkResult(ids=await run_in_db_worker(area_service.bulk_create, data=data))
+
+
+@area_router.put("/bulk", response_model=BulkResult)
+async def update_areas(area_service: AreaServiceDep, data: List[BulkUpdateEntry[AreaUpdate]]):
+    return BulkResult(ids=await run_in_db_worker(area_service.bulk_update, data=data))
+
+
+@area_router.delete("/bulk", response_model=BulkResult)
+async def delete_areas(area_service: AreaServiceDep, ids: List[int]):
+    return BulkResult(ids=await run_in_db_worker(area_service.bulk_delete, ids=ids))
 
 
 @area_router.get("/{area_id}", response_model=Area)
-async def get_area(area_service: AreaServiceDep, area_id: int):
-    return area_service.get(id=area_id)
+async def get_area(
+    area_service: AreaServiceDep, area_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = area_service.get_fieldset(fields=fields, include=include)
+    area = await run_in_db_worker(area_service.get, id=area_id, fieldset=fieldset)
+    return EntityResponse(area, content_type=fieldset.entity_type)
 
 
 @area_router.post("/", response_model=Area)
 async def create_area(area_service: AreaServiceDep, data: AreaCreate):
-    return area_service.create(data=data)
+    return await run_in_db_worker(area_service.create, data=data)
 
 
 @area_router.put("/{area_id}", response_model=Area)
 async def update_area(area_service: AreaServiceDep, area_id: int, data: AreaUpdate):
-    return area_service.update(id=area_id, data=data)
+    return await run_in_db_worker(area_service.update, id=area_id, data=data)
 
 
 @area_router.delete("/{area_id}", response_model=Area)
 async def delete_area(area_service: AreaServiceDep, area_id: int):
-    return area_service.delete(id=area_id)
+    return await run_in_db_worker(area_service.delete, id=area_id)
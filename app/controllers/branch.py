@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, Request
+from typing_extensions import Annotated, List, Optional
+
+from app.schemas import Branch, BranchCreate, BranchUpdate, BulkUpdateEntry, BulkResult, ImportResult, RecordFormat
+from app.services import BranchService, run_in_db_worker
+from app.controllers.imports import import_request_body
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
+
+branch_router = APIRouter(
+    prefix="/branches",
+    tags=["branches"],
+)
+
+BranchServiceDep = Annotated[BranchService, Depends()]
+
+
+@branch_router.get("/", response_model=List[Branch])
+async def get_branches(
+    branch_service: BranchServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = branch_service.get_fieldset(fields=fields, include=include)
+    branches, next_cursor = await run_in_db_worker(
+        branch_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(branches, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@branch_router.post("/bulk", response_model=BulkResult)
+async def create_branches(branch_service: BranchServiceDep, data: List[BranchCreate]):
+    return BulkResult(ids=await run_in_db_worker(branch_service.bulk_create, data=data))
+
+
+@branch_router.put("/bulk", response_model=BulkResult)
+async def update_branches(branch_service: BranchServiceDep, data: List[BulkUpdateEntry[BranchUpdate]]):
+    return BulkResult(ids=await run_in_db_worker(branch_service.bulk_update, data=data))
+
+
+@branch_router.delete("/bulk", response_model=BulkResult)
+async def delete_branches(branch_service: BranchServiceDep, ids: List[int]):
+    return BulkResult(ids=await run_in_db_worker(branch_service.bulk_delete, ids=ids))
+
+
+@branch_router.post("/import", response_model=ImportResult)
+async def import_branches(
+    branch_service: BranchServiceDep,
+    request: Request,
+    format: RecordFormat = RecordFormat.NDJSON,
+):
+    return await import_request_body(branch_service, request, format)
+
+
+@branch_router.get("/{branch_id}", response_model=Branch)
+async def get_branch(
+    branch_service: BranchServiceDep, branch_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = branch_service.get_fieldset(fields=fields, include=include)
+    branch = await run_in_db_worker(branch_service.get, id=branch_id, fieldset=fieldset)
+    return EntityResponse(branch, content_type=fieldset.entity_type)
+
+
+@branch_router.post("/", response_model=Branch)
+async def create_branch(branch_service: BranchServiceDep, data: BranchCreate):
+    return await run_in_db_worker(branch_service.create, data=data)
+
+
+@branch_router.put("/{branch_id}", response_model=Branch)
+async def update_branch(branch_service: BranchServiceDep, branch_id: int, data: BranchUpdate):
+    return await run_in_db_worker(branch_service.update, id=branch_id, data=data)
+
+
+@branch_router.delete("/{branch_id}", response_model=Branch)
+async def delete_branch(branch_service: BranchServiceDep, branch_id: int):
+    return await run_in_db_worker(branch_service.delete, id=branch_id)
@@ -0,0 +1,73 @@
+from csv import DictWriter
+from io import StringIO
+from json import dumps
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import Callable, Iterator, List, Type
+
+from app.schemas import RecordFormat
+from app.services import iterate_in_db_worker
+from app.storage.db import DBSession, get_db_engine
+
+
+_media_types = {
+    RecordFormat.NDJSON: "application/x-ndjson",
+    RecordFormat.CSV: "text/csv",
+}
+
+
+def _encode_ndjson(batches: Iterator[List[BaseModel]], entity_type: Type[BaseModel]) -> Iterator[bytes]:
+    adapter = TypeAdapter(entity_type)
+    for batch in batches:
+        yield b"".join(adapter.dump_json(entity) + b"\n" for entity in batch)
+
+
+def _encode_csv(batches: Iterator[List[BaseModel]], entity_type: Type[BaseModel]) -> Iterator[bytes]:
+    # One column per field, with nested lists and objects (e.g. the items of an order) as JSON
+    buffer = StringIO()
+    writer = DictWriter(buffer, fieldnames=list(entity_type.model_fields))
+    writer.writeheader()
+    for batch in batches:
+        for entity in batch:
+            writer.writerow(
+                {
+                    name: dumps(value) if isinstance(value, (list, dict)) else value
+                    for name, value in entity.model_dump(mode="json").items()
+                }
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_response(
+    export: Callable[[DBSession], Iterator[List[BaseModel]]],
+    *,
+    entity_type: Type[BaseModel],
+    format: RecordFormat,
+    filename: str,
+) -> StreamingResponse:
+    """
+    Stream an export as NDJSON or CSV, one chunk per batch of entities.
+
+    The export gets its own database session, held until the stream ends, since the session of
+    the request is closed before the response body is sent. Batches are pulled on database worker
+    threads, so neither the query nor the encoding blocks the event loop.
+
+    Parameters:
+    * `export`: `Callable[[DBSession], Iterator[List[BaseModel]]]` -- Starts the export on a session
+    * `entity_type`: `Type[BaseModel]` -- Type of the exported entities
+    * `format`: `RecordFormat` -- Format of the response body
+    * `filename`: `str` -- Name of the download, without extension
+    """
+    encode = _encode_csv if format == RecordFormat.CSV else _encode_ndjson
+
+    def chunks() -> Iterator[bytes]:
+        with DBSession(get_db_engine()) as db:
+            yield from encode(export(db), entity_type)
+
+    return StreamingResponse(
+        iterate_in_db_worker(chunks()),
+        media_type=_media_types[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format.value}"'},
+    )
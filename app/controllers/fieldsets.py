@@ -0,0 +1,15 @@
+from fastapi import Query
+from typing_extensions import Annotated, Optional
+
+# Sparse fieldsets of the read endpoints, parsed by `EntityCRUDMixin.get_fieldset`
+FieldsQuery = Annotated[
+    Optional[str],
+    Query(
+        description="Comma-separated fields to return, e.g. `id,name`. The `id` is always returned, "
+        "and relationships are only returned if listed here or in `include`."
+    ),
+]
+IncludeQuery = Annotated[
+    Optional[str],
+    Query(description="Comma-separated relationships to return, e.g. `branches`. By default all of them are."),
+]
@@ -0,0 +1,30 @@
+from anyio import from_thread
+from fastapi import Request
+from typing_extensions import Iterator
+
+from app.schemas import ImportResult, RecordFormat
+from app.services import EntityCRUDMixin, run_in_db_worker
+from app.services.records import iter_lines, parse_records
+
+
+def _iter_request_body(request: Request) -> Iterator[bytes]:
+    # Runs on a worker thread, fetching each chunk of the body from the event loop as it arrives
+    stream = request.stream()
+    while True:
+        try:
+            yield from_thread.run(stream.__anext__)
+        except StopAsyncIteration:
+            return
+
+
+async def import_request_body(service: EntityCRUDMixin, request: Request, format: RecordFormat) -> ImportResult:
+    """
+    Import the records uploaded as the raw body of the request, in NDJSON or CSV. The body is read
+    and inserted chunk by chunk on a database worker thread, so it is never held in memory whole.
+    """
+
+    def run_import() -> ImportResult:
+        records = parse_records(iter_lines(_iter_request_body(request)), format, service.CreateType)
+        return service.import_records(records)
+
+    return await run_in_db_worker(run_import)
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, Request
+from typing_extensions import Annotated, List, Optional
+
+from app.schemas import Item, ItemCreate, ItemUpdate, BulkUpdateEntry, BulkResult, ImportResult, RecordFormat
+from app.services import ItemService, run_in_db_worker
+from app.controllers.imports import import_request_body
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
+
+item_router = APIRouter(
+    prefix="/items",
+    tags=["items"],
+)
+
+ItemServiceDep = Annotated[ItemService, Depends()]
+
+
+@item_router.get("/", response_model=List[Item])
+async def get_items(
+    item_service: ItemServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = item_service.get_fieldset(fields=fields, include=include)
+    items, next_cursor = await run_in_db_worker(
+        item_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(items, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@item_router.post("/bulk", response_model=BulkResult)
+async def create_items(item_service: ItemServiceDep, data: List[ItemCreate]):
+    return BulkResult(ids=await run_in_db_worker(item_service.bulk_create, data=data))
+
+
+@item_router.put("/bulk", response_model=BulkResult)
+async def update_items(item_service: ItemServiceDep, data: List[BulkUpdateEntry[ItemUpdate]]):
+    return BulkResult(ids=await run_in_db_worker(item_service.bulk_update, data=data))
+
+
+@item_router.delete("/bulk", response_model=BulkResult)
+async def delete_items(item_service: ItemServiceDep, ids: List[int]):
+    return BulkResult(ids=await run_in_db_worker(item_service.bulk_delete, ids=ids))
+
+
+@item_router.post("/import", response_model=ImportResult)
+async def import_items(
+    item_service: ItemServiceDep,
+    request: Request,
+    format: RecordFormat = RecordFormat.NDJSON,
+):
+    return await import_request_body(item_service, request, format)
+
+
+@item_router.get("/{item_id}", response_model=Item)
+async def get_item(
+    item_service: ItemServiceDep, item_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = item_service.get_fieldset(fields=fields, include=include)
+    item = await run_in_db_worker(item_service.get, id=item_id, fieldset=fieldset)
+    return EntityResponse(item, content_type=fieldset.entity_type)
+
+
+@item_router.post("/", response_model=Item)
+async def create_item(item_service: ItemServiceDep, data: ItemCreate):
+    return await run_in_db_worker(item_service.create, data=data)
+
+
+@item_router.put("/{item_id}", response_model=Item)
+async def update_item(item_service: ItemServiceDep, item_id: int, data: ItemUpdate):
+    return await run_in_db_worker(item_service.update, id=item_id, data=data)
+
+
+@item_router.delete("/{item_id}", response_model=Item)
+async def delete_item(item_service: ItemServiceDep, item_id: int):
+    return await run_in_db_worker(item_service.delete, id=item_id)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from typing_extensions import Annotated, List, Optional
 
-from app.schemas import AuthToken, User
+from app.schemas import AuthToken, UserPrincipal
 from app.services.auth import AuthService
 
 login_router = APIRouter(
@@ -16,7 +16,7 @@ async def login_for_access_token(auth_token: Annotated[AuthToken, Depends(AuthSe
     return auth_token
 
 
-@login_router.post("/test-token", response_model=User)
-async def test_token(user: Annotated[User, Depends(AuthService.get_current_user)]):
+@login_router.post("/test-token", response_model=UserPrincipal)
+async def test_token(user: Annotated[UserPrincipal, Depends(AuthService.get_current_principal)]):
     return user
 
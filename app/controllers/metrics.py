@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from typing_extensions import List
+
+from app.schemas import CacheStats, DBPoolStats, EventBrokerStats, TaskQueueStats
+from app.services import TTLCache, event_broker, task_queue
+from app.storage.db import get_pool_stats
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@metrics_router.get("/caches", response_model=List[CacheStats])
+async def get_cache_stats():
+    return TTLCache.get_all_stats()
+
+
+@metrics_router.get("/db-pool", response_model=DBPoolStats)
+async def get_db_pool_stats():
+    return get_pool_stats()
+
+
+@metrics_router.get("/tasks", response_model=TaskQueueStats)
+async def get_task_queue_stats():
+    return task_queue.stats
+
+
+@metrics_router.get("/events", response_model=EventBrokerStats)
+async def get_event_broker_stats():
+    return event_broker.stats
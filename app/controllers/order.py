@@ -1,8 +1,23 @@
-from fastapi import APIRouter, Depends
-from typing_extensions import Annotated, List, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, Response
+from fastapi.responses import StreamingResponse
+from json import loads
+from starlette.background import BackgroundTask
+from typing_extensions import Annotated, AsyncIterator, List, Optional
 
-from app.schemas import Order, OrderCreate, OrderUpdate
-from app.services import OrderService
+from app.schemas import Order, OrderCreate, OrderUpdate, OrderExport, OrderStatus, OrderTransition, RecordFormat
+from app.services import (
+    ORDER_TRANSITIONS,
+    OrderService,
+    Subscription,
+    event_broker,
+    order_topic,
+    run_in_db_worker,
+)
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
+from app.controllers.export import export_response
+from app.config import EVENT_STREAM_HEARTBEAT
 
 order_router = APIRouter(
     prefix="/orders",
@@ -12,26 +27,117 @@ order_router = APIRouter(
 OrderServiceDep = Annotated[OrderService, Depends()]
 
 
+def _order_event(order_json: bytes, version: int) -> bytes:
+    return b"event: order\nid: %d\ndata: %s\n\n" % (version, order_json)
+
+
+async def _iter_order_events(subscription: Subscription, order: Order) -> AsyncIterator[bytes]:
+    with subscription:
+        version, status = order.version, order.status
+        yield _order_event(order.model_dump_json().encode(), version)
+        while ORDER_TRANSITIONS[status]:
+            message = await subscription.get(timeout=EVENT_STREAM_HEARTBEAT)
+            if message is None:
+                yield b": keep-alive\n\n"
+                continue
+            # Changes already sent, e.g. in the initial order, may still arrive, and out of order
+            event = loads(message)
+            if event["version"] <= version:
+                continue
+            version, status = event["version"], OrderStatus(event["status"])
+            yield _order_event(message, version)
+
+
 @order_router.get("/", response_model=List[Order])
-async def get_orders(order_service: OrderServiceDep, offset: Optional[int] = None, limit: Optional[int] = None):
-    return order_service.get_list(offset=offset, limit=limit)
+async def get_orders(
+    order_service: OrderServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = order_service.get_fieldset(fields=fields, include=include)
+    orders, next_cursor = await run_in_db_worker(
+        order_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(orders, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@order_router.get("/export", response_model=List[OrderExport])
+async def export_orders(
+    format: RecordFormat = RecordFormat.NDJSON,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[OrderStatus] = None,
+    branch_id: Optional[int] = None,
+):
+    return export_response(
+        lambda db: OrderService(db).export(since=since, until=until, status=status, branch_id=branch_id),
+        entity_type=OrderExport,
+        format=format,
+        filename="orders",
+    )
 
 
 @order_router.get("/{order_id}", response_model=Order)
-async def get_order(order_service: OrderServiceDep, order_id: int):
-    return order_service.get(id=order_id)
+async def get_order(
+    order_service: OrderServiceDep, order_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = order_service.get_fieldset(fields=fields, include=include)
+    order = await run_in_db_worker(order_service.get, id=order_id, fieldset=fieldset)
+    return EntityResponse(order, content_type=fieldset.entity_type)
+
+
+@order_router.get("/{order_id}/events", response_model=Order)
+async def stream_order_events(order_service: OrderServiceDep, order_id: int):
+    """
+    Server-sent events of an order: an `order` event with the order as it is now, then one for
+    each change of its status, until the order reaches a final status. Comments are sent while the
+    order is idle, so that proxies keep the connection open.
+    """
+    # Subscribe before reading the order, so that no change falls in between
+    subscription = event_broker.subscribe(order_topic(order_id))
+    try:
+        order = await run_in_db_worker(order_service.get, id=order_id)
+    except BaseException:
+        subscription.close()
+        raise
+    return StreamingResponse(
+        _iter_order_events(subscription, order),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also unsubscribes when the client disconnects before the stream starts
+        background=BackgroundTask(subscription.close),
+    )
 
 
 @order_router.post("/", response_model=Order)
-async def create_order(order_service: OrderServiceDep, data: OrderCreate):
-    return order_service.create(data=data)
+async def create_order(
+    order_service: OrderServiceDep,
+    data: OrderCreate,
+    response: Response,
+    idempotency_key: Annotated[Optional[str], Header(min_length=1, max_length=255)] = None,
+):
+    # Clients retrying on timeouts send the same Idempotency-Key, so that the order is placed only once
+    if idempotency_key is None:
+        return await run_in_db_worker(order_service.create, data=data)
+    order, replayed = await run_in_db_worker(order_service.create_idempotent, key=idempotency_key, data=data)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return order
+
+
+@order_router.post("/{order_id}/status", response_model=Order)
+async def transition_order(order_service: OrderServiceDep, order_id: int, data: OrderTransition):
+    return await run_in_db_worker(order_service.transition, id=order_id, data=data)
 
 
 @order_router.put("/{order_id}", response_model=Order)
 async def update_order(order_service: OrderServiceDep, order_id: int, data: OrderUpdate):
-    return order_service.update(id=order_id, data=data)
+    return await run_in_db_worker(order_service.update, id=order_id, data=data)
 
 
 @order_router.delete("/{order_id}", response_model=Order)
 async def delete_order(order_service: OrderServiceDep, order_id: int):
-    return order_service.delete(id=order_id)
+    return await run_in_db_worker(order_service.delete, id=order_id)
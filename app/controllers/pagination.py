@@ -0,0 +1,12 @@
+from fastapi import Response
+from typing_extensions import Optional
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """
+    Advertise the cursor of the next page of a list response, if there is one
+    """
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from typing_extensions import Any, Mapping, Optional
+
+from app.controllers.pagination import set_next_cursor
+
+
+@lru_cache(maxsize=None)
+def _get_type_adapter(content_type: Any) -> TypeAdapter:
+    return TypeAdapter(content_type)
+
+
+class EntityResponse(Response):
+    """
+    JSON response serialized from already validated entities by pydantic-core in a single pass,
+    straight to bytes.
+
+    Returning a response from a route bypasses FastAPI's handling of the `response_model`, which
+    would dump the entities to dicts, validate them again and encode the result. Keep declaring the
+    `response_model` on the route all the same, so that it still documents the response.
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        *,
+        content_type: Any,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.content_type = content_type
+        super().__init__(content, status_code=status_code, headers=headers)
+
+    def render(self, content: Any) -> bytes:
+        return _get_type_adapter(self.content_type).dump_json(content)
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Whether the `If-None-Match` header of a request lists the entity tag, by the weak comparison
+    that RFC 9110 prescribes for it.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def page_response(content: Any, next_cursor: Optional[str], *, content_type: Any) -> EntityResponse:
+    """
+    Serialize a page of a list with `EntityResponse`, advertising the cursor of the next page.
+    """
+    response = EntityResponse(content, content_type=content_type)
+    set_next_cursor(response, next_cursor)
+    return response
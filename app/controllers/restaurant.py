@@ -1,8 +1,20 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from typing_extensions import Annotated, List, Optional
 
-from app.schemas import Restaurant, RestaurantCreate, RestaurantUpdate, RestaurantAvailable
-from app.services import RestaurantService
+from app.schemas import (
+    Restaurant,
+    RestaurantCreate,
+    RestaurantUpdate,
+    RestaurantAvailable,
+    BulkUpdateEntry,
+    BulkResult,
+    ImportResult,
+    RecordFormat,
+)
+from app.services import RestaurantService, run_in_db_worker
+from app.controllers.imports import import_request_body
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, is_not_modified, page_response
 
 restaurant_router = APIRouter(
     prefix="/restaurants",
@@ -14,31 +26,85 @@ RestaurantServiceDep = Annotated[RestaurantService, Depends()]
 
 @restaurant_router.get("/", response_model=List[Restaurant])
 async def get_restaurants(
-    restaurant_service: RestaurantServiceDep, offset: Optional[int] = None, limit: Optional[int] = None
+    restaurant_service: RestaurantServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
 ):
-    return restaurant_service.get_list(offset=offset, limit=limit)
+    fieldset = restaurant_service.get_fieldset(fields=fields, include=include)
+    restaurants, next_cursor = await run_in_db_worker(
+        restaurant_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(restaurants, next_cursor, content_type=List[fieldset.entity_type])
 
 
 @restaurant_router.get("/available", response_model=List[RestaurantAvailable])
-async def get_available_restaurants(delivery_coords: tuple, restaurant_service: RestaurantServiceDep):
-    return restaurant_service.get_available_list(delivery_coords=delivery_coords)
+async def get_available_restaurants(restaurant_service: RestaurantServiceDep, latitude: float, longitude: float):
+    restaurants = await run_in_db_worker(restaurant_service.get_available_list, delivery_coords=(latitude, longitude))
+    return EntityResponse(restaurants, content_type=List[RestaurantAvailable])
+
+
+@restaurant_router.post("/bulk", response_model=BulkResult)
+async def create_restaurants(restaurant_service: RestaurantServiceDep, data: List[RestaurantCreate]):
+    return BulkResult(ids=await run_in_db_worker(restaurant_service.bulk_create, data=data))
+
+
+@restaurant_router.put("/bulk", response_model=BulkResult)
+async def update_restaurants(restaurant_service: RestaurantServiceDep, data: List[BulkUpdateEntry[RestaurantUpdate]]):
+    return BulkResult(ids=await run_in_db_worker(restaurant_service.bulk_update, data=data))
+
+
+@restaurant_router.delete("/bulk", response_model=BulkResult)
+async def delete_restaurants(restaurant_service: RestaurantServiceDep, ids: List[int]):
+    return BulkResult(ids=await run_in_db_worker(restaurant_service.bulk_delete, ids=ids))
+
+
+@restaurant_router.post("/import", response_model=ImportResult)
+async def import_restaurants(
+    restaurant_service: RestaurantServiceDep,
+    request: Request,
+    format: RecordFormat = RecordFormat.NDJSON,
+):
+    return await import_request_body(restaurant_service, request, format)
 
 
 @restaurant_router.get("/{restaurant_id}", response_model=Restaurant)
-async def get_restaurant(restaurant_service: RestaurantServiceDep, restaurant_id: int):
-    return restaurant_service.get(id=restaurant_id)
+async def get_restaurant(
+    restaurant_service: RestaurantServiceDep,
+    request: Request,
+    restaurant_id: int,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    # Snapshots hold whole restaurants, so sparse fieldsets are read from the database
+    if fields is not None or include is not None:
+        fieldset = restaurant_service.get_fieldset(fields=fields, include=include)
+        restaurant = await run_in_db_worker(restaurant_service.get, id=restaurant_id, fieldset=fieldset)
+        return EntityResponse(restaurant, content_type=fieldset.entity_type)
+
+    # A cached snapshot answers on the event loop, without a database worker or a query
+    snapshot = restaurant_service.get_cached_snapshot(id=restaurant_id)
+    if snapshot is None:
+        snapshot = await run_in_db_worker(restaurant_service.load_snapshot, id=restaurant_id)
+    # Clients must revalidate, as writes invalidate snapshots at any time
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.content, media_type="application/json", headers=headers)
 
 
 @restaurant_router.post("/", response_model=Restaurant)
 async def create_restaurant(restaurant_service: RestaurantServiceDep, data: RestaurantCreate):
-    return restaurant_service.create(data=data)
+    return await run_in_db_worker(restaurant_service.create, data=data)
 
 
 @restaurant_router.put("/{restaurant_id}", response_model=Restaurant)
 async def update_restaurant(restaurant_service: RestaurantServiceDep, restaurant_id: int, data: RestaurantUpdate):
-    return restaurant_service.update(id=restaurant_id, data=data)
+    return await run_in_db_worker(restaurant_service.update, id=restaurant_id, data=data)
 
 
 @restaurant_router.delete("/{restaurant_id}", response_model=Restaurant)
 async def delete_restaurant(restaurant_service: RestaurantServiceDep, restaurant_id: int):
-    return restaurant_service.delete(id=restaurant_id)
+    return await run_in_db_worker(restaurant_service.delete, id=restaurant_id)
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from typing_extensions import Annotated, List, Optional
+
+from app.schemas import Rider, RiderCreate, RiderUpdate
+from app.services import RiderService, run_in_db_worker
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
+
+rider_router = APIRouter(
+    prefix="/riders",
+    tags=["riders"],
+)
+
+RiderServiceDep = Annotated[RiderService, Depends()]
+
+
+@rider_router.get("/", response_model=List[Rider])
+async def get_riders(
+    rider_service: RiderServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = rider_service.get_fieldset(fields=fields, include=include)
+    riders, next_cursor = await run_in_db_worker(
+        rider_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(riders, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@rider_router.get("/{rider_id}", response_model=Rider)
+async def get_rider(
+    rider_service: RiderServiceDep, rider_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = rider_service.get_fieldset(fields=fields, include=include)
+    rider = await run_in_db_worker(rider_service.get, id=rider_id, fieldset=fieldset)
+    return EntityResponse(rider, content_type=fieldset.entity_type)
+
+
+@rider_router.post("/", response_model=Rider)
+async def create_rider(rider_service: RiderServiceDep, data: RiderCreate):
+    return await run_in_db_worker(rider_service.create, data=data)
+
+
+@rider_router.put("/{rider_id}", response_model=Rider)
+async def update_rider(rider_service: RiderServiceDep, rider_id: int, data: RiderUpdate):
+    return await run_in_db_worker(rider_service.update, id=rider_id, data=data)
+
+
+@rider_router.delete("/{rider_id}", response_model=Rider)
+async def delete_rider(rider_service: RiderServiceDep, rider_id: int):
+    return await run_in_db_worker(rider_service.delete, id=rider_id)
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, Query
+from typing_extensions import Annotated, List, Optional, Tuple
+
+from app.schemas import ItemSearchResult, RestaurantSearchResult
+from app.services import SearchService, run_in_db_worker
+from app.controllers.responses import EntityResponse
+
+search_router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+SearchServiceDep = Annotated[SearchService, Depends()]
+QueryParam = Annotated[str, Query(min_length=1, max_length=200)]
+
+
+def _get_coords(latitude: Optional[float], longitude: Optional[float]) -> Optional[Tuple[float, float]]:
+    return (latitude, longitude) if latitude is not None and longitude is not None else None
+
+
+@search_router.get("/items", response_model=List[ItemSearchResult])
+async def search_items(
+    search_service: SearchServiceDep,
+    q: QueryParam,
+    limit: int = 10,
+    prefix: bool = True,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+):
+    items = await run_in_db_worker(
+        search_service.search_items, query=q, limit=limit, prefix=prefix, coords=_get_coords(latitude, longitude)
+    )
+    return EntityResponse(items, content_type=List[ItemSearchResult])
+
+
+@search_router.get("/restaurants", response_model=List[RestaurantSearchResult])
+async def search_restaurants(
+    search_service: SearchServiceDep,
+    q: QueryParam,
+    limit: int = 10,
+    prefix: bool = True,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+):
+    restaurants = await run_in_db_worker(
+        search_service.search_restaurants, query=q, limit=limit, prefix=prefix, coords=_get_coords(latitude, longitude)
+    )
+    return EntityResponse(restaurants, content_type=List[RestaurantSearchResult])
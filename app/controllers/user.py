@@ -1,8 +1,12 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends
 from typing_extensions import Annotated, List, Optional
 
-from app.schemas import User, UserCreate, UserUpdate
-from app.services import UserService, AuthService
+from app.schemas import User, UserCreate, UserUpdate, UserExport, RecordFormat
+from app.services import UserService, AuthService, run_in_db_worker
+from app.controllers.fieldsets import FieldsQuery, IncludeQuery
+from app.controllers.responses import EntityResponse, page_response
+from app.controllers.export import export_response
 
 user_router = APIRouter(
     prefix="/users",
@@ -15,13 +19,33 @@ CurrentUserDep = Annotated[User, Depends(AuthService.get_current_user)]
 
 
 @user_router.get("/", response_model=List[User])
-async def get_users(user_service: UserServiceDep, offset: Optional[int] = None, limit: Optional[int] = None):
-    return user_service.get_list(offset=offset, limit=limit)
-
-
-@user_router.get("/{user_id}", response_model=User)
-async def get_user(user_service: UserServiceDep, user_id: int):
-    return user_service.get(id=user_id)
+async def get_users(
+    user_service: UserServiceDep,
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: FieldsQuery = None,
+    include: IncludeQuery = None,
+):
+    fieldset = user_service.get_fieldset(fields=fields, include=include)
+    users, next_cursor = await run_in_db_worker(
+        user_service.get_page, offset=offset, limit=limit, cursor=cursor, fieldset=fieldset
+    )
+    return page_response(users, next_cursor, content_type=List[fieldset.entity_type])
+
+
+@user_router.get("/export", response_model=List[UserExport])
+async def export_users(
+    format: RecordFormat = RecordFormat.NDJSON,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    return export_response(
+        lambda db: UserService(db).export(since=since, until=until),
+        entity_type=UserExport,
+        format=format,
+        filename="users",
+    )
 
 
 @user_router.get("/me", response_model=User)
@@ -29,16 +53,25 @@ async def get_me(current_user: CurrentUserDep):
     return current_user
 
 
+@user_router.get("/{user_id}", response_model=User)
+async def get_user(
+    user_service: UserServiceDep, user_id: int, fields: FieldsQuery = None, include: IncludeQuery = None
+):
+    fieldset = user_service.get_fieldset(fields=fields, include=include)
+    user = await run_in_db_worker(user_service.get, id=user_id, fieldset=fieldset)
+    return EntityResponse(user, content_type=fieldset.entity_type)
+
+
 @user_router.post("/", response_model=User)
 async def create_user(user_service: UserServiceDep, data: UserCreate):
-    return user_service.create(data=data)
+    return await user_service.create_async(data=data)
 
 
 @user_router.put("/{user_id}", response_model=User)
 async def update_user(user_service: UserServiceDep, user_id: int, data: UserUpdate):
-    return user_service.update(id=user_id, data=data)
+    return await run_in_db_worker(user_service.update, id=user_id, data=data)
 
 
 @user_router.delete("/{user_id}", response_model=User)
 async def delete_user(user_service: UserServiceDep, user_id: int):
-    return user_service.delete(id=user_id)
+    return await run_in_db_worker(user_service.delete, id=user_id)
@@ -1,13 +1,42 @@
+from asyncio import create_task, gather
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 
 from app.controllers import (
     login_router,
     restaurant_router,
+    branch_router,
+    item_router,
     user_router,
     area_router,
     order_router,
+    rider_router,
+    search_router,
+    metrics_router,
 )
-from app.config import RUN_MODE, RunMode, API_V1_PREFIX
+from app.config import RUN_MODE, RunMode, API_V1_PREFIX, DB_MIGRATE_ON_STARTUP, DISPATCH_IN_APP
+from app.services import run_dispatcher, task_queue
+from app.storage.db import dispose_db_engine, get_db_engine
+from app.storage.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    engine = get_db_engine()
+    if DB_MIGRATE_ON_STARTUP:
+        migrate(engine)
+    elif (version := get_schema_version(engine)) < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}; run `python -m app.cli migrate`"
+        )
+    await task_queue.start()
+    dispatcher = create_task(run_dispatcher()) if DISPATCH_IN_APP else None
+    yield
+    if dispatcher is not None:
+        dispatcher.cancel()
+        await gather(dispatcher, return_exceptions=True)
+    await task_queue.stop()
+    dispose_db_engine()
 
 
 api = APIRouter(prefix=API_V1_PREFIX)
@@ -15,8 +44,13 @@ api = APIRouter(prefix=API_V1_PREFIX)
 api.include_router(login_router)
 api.include_router(user_router)
 api.include_router(restaurant_router)
+api.include_router(branch_router)
+api.include_router(item_router)
 api.include_router(area_router)
 api.include_router(order_router)
+api.include_router(rider_router)
+api.include_router(search_router)
+api.include_router(metrics_router)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(api)
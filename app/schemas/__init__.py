@@ -2,8 +2,12 @@ from .auth import AuthToken, JWTPayload
 from .area import AreaBase, Area, AreaCreate, AreaUpdate
 from .branch import BranchBase, Branch, BranchCreate, BranchUpdate
 from .restaurant import RestaurantBase, Restaurant, RestaurantCreate, RestaurantUpdate
-from .user import UserBase, User, UserCreate, UserUpdate
+from .user import UserBase, User, UserCreate, UserUpdate, UserPrincipal, UserExport
 from .item import ItemBase, Item, ItemCreate, ItemUpdate
-from .order import OrderBase, Order, OrderCreate, OrderUpdate, OrderStatus
+from .order import OrderBase, Order, OrderCreate, OrderUpdate, OrderStatus, OrderExport, OrderTransition
 from .restaurant import RestaurantBase , Restaurant, RestaurantCreate, RestaurantUpdate, RestaurantAvailable
-from .order_item import OrderItemBase, OrderItem, OrderItemCreate, OrderItemUpdate
+from .order_item import OrderItemBase, OrderItem, OrderItemCreate, OrderItemUpdate, OrderLine
+from .rider import RiderBase, Rider, RiderCreate, RiderUpdate, DispatchResult
+from .metrics import CacheStats, DBPoolStats, EventBrokerStats, TaskQueueStats
+from .search import ItemSearchResult, RestaurantSearchResult
+from .bulk import BulkUpdateEntry, BulkResult, RecordFormat, ImportRowError, ImportResult
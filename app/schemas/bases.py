@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing_extensions import Annotated, Optional, Tuple
 
 
@@ -6,9 +6,12 @@ class ObjectBase(BaseModel):
     """
     Base class for all objects in the application's domain model. Inherited from
     Pydantic's `BaseModel` class to provide validation and serialization capabilities.
+
+    Objects can be validated from the attributes of any object, so that entities are built
+    straight from the ORM rows (mappers) that hold them.
     """
 
-    pass
+    model_config = ConfigDict(from_attributes=True)
 
 
 IdField = Annotated[int, Field(ge=0)]
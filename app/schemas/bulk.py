@@ -0,0 +1,56 @@
+from enum import Enum
+from typing_extensions import Any, Generic, List, TypeVar, Union
+
+from app.schemas.bases import ObjectBase, IdField
+
+
+_TUpdateType = TypeVar("_TUpdateType", bound=ObjectBase)
+
+
+class BulkUpdateEntry(ObjectBase, Generic[_TUpdateType]):
+    """
+    One entry of a bulk update: the ID of the entity and the values to update it with
+    """
+
+    id: IdField
+    data: _TUpdateType
+
+
+class BulkResult(ObjectBase):
+    """
+    IDs of the entities affected by a bulk operation, in request order
+    """
+
+    ids: List[IdField] = []
+
+
+class RecordFormat(str, Enum):
+    """
+    Format of a stream of records, one record per line (after the header line for CSV)
+    """
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class ImportRowError(ObjectBase):
+    """
+    Error of one rejected record of an import, shaped like FastAPI's request validation errors,
+    with `loc` starting with the line number of the record in the uploaded file
+    """
+
+    type: str
+    loc: List[Union[str, int]]
+    msg: str
+    input: Any = None
+
+
+class ImportResult(ObjectBase):
+    """
+    Outcome of an import: how many records were inserted or rejected, and why they were rejected
+    (only the first errors are listed)
+    """
+
+    imported: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
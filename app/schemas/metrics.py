@@ -0,0 +1,62 @@
+from typing_extensions import Optional
+
+from app.schemas.bases import ObjectBase
+
+
+class CacheStats(ObjectBase):
+    """
+    Counters of an in-process cache
+    """
+
+    name: str
+    size: int
+    max_size: int
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    bytes: int = 0  # total size of the values, for caches bounded by it
+    max_bytes: Optional[int] = None
+
+
+class TaskQueueStats(ObjectBase):
+    """
+    State and counters of the background task queue
+    """
+
+    size: int
+    max_size: int
+    concurrency: int
+    running: bool = False
+    submitted: int = 0
+    completed: int = 0
+    retried: int = 0
+    failed: int = 0
+    dropped: int = 0
+
+
+class EventBrokerStats(ObjectBase):
+    """
+    Topics, subscribers and message counters of the event broker
+    """
+
+    topics: int
+    subscribers: int
+    published: int = 0
+    delivered: int = 0
+    dropped: int = 0
+
+
+class DBPoolStats(ObjectBase):
+    """
+    State and checkout wait times of the database connection pool
+    """
+
+    size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checkouts: int
+    wait_time_total: float  # seconds
+    wait_time_max: float  # seconds
@@ -1,8 +1,9 @@
-from typing_extensions import List
+from datetime import datetime
+from typing_extensions import Annotated, List, Optional
 from enum import Enum
 
-from app.schemas.bases import ObjectBase, EntityObjectBase, LocatableBase, LocatableUpdateBase, IdField
-from app.schemas.order_item import OrderItem
+from app.schemas.bases import ObjectBase, EntityObjectBase, LocatableBase, LocatableUpdateBase, IdField, Field
+from app.schemas.order_item import OrderItem, OrderLine
 
 
 class OrderStatus(str, Enum):
@@ -21,15 +22,41 @@ class OrderBase(LocatableBase, ObjectBase):
 
 
 class OrderCreate(OrderBase):
-    pass
+    items: Annotated[List[OrderLine], Field(min_length=1)]
 
 
 class OrderUpdate(LocatableUpdateBase, OrderBase):
+    """
+    Changes to an order other than its status, which only changes by an `OrderTransition`
+    """
+
     customer_id: IdField = None
     branch_id: IdField = None
-    status: OrderStatus = None
     item_links: List[OrderItem] = []
 
 
+class OrderTransition(ObjectBase):
+    """
+    Change of the status of an order. If `version` is given, the change is rejected unless the
+    order is still at that version, i.e. unchanged since the client read it.
+    """
+
+    status: OrderStatus
+    version: Optional[int] = None
+
+
 class Order(OrderBase, EntityObjectBase):
+    status: OrderStatus = OrderStatus.PENDING
+    version: int = 0
+    rider_id: Optional[int] = None
+    total: float = 0
     item_links: List[OrderItem] = []
+
+
+class OrderExport(Order):
+    """
+    Order with its timestamps, as written by the export
+    """
+
+    created_at: datetime
+    updated_at: Optional[datetime] = None
@@ -22,5 +22,14 @@ class OrderItemUpdate(OrderItemBase):
     quantity: QuantityField = None
 
 
+class OrderLine(ObjectBase):
+    """
+    Item and quantity of an order being placed
+    """
+
+    item_id: IdField
+    quantity: QuantityField
+
+
 class OrderItem(OrderItemBase, ObjectBase):
-    pass
+    price: float = 0
@@ -1,4 +1,4 @@
-from typing_extensions import Annotated, List
+from typing_extensions import Annotated, List, Optional
 
 from app.schemas.bases import EntityObjectBase, ObjectBase, Field
 from app.schemas.branch import Branch
@@ -26,6 +26,7 @@ class RestaurantUpdate(RestaurantBase):
 class RestaurantAvailable(RestaurantBase, EntityObjectBase):
     branch: Branch
     items: List[Item] = []
+    eta: Optional[float] = None  # estimated delivery time from the branch in seconds, if known
 
 
 class Restaurant(RestaurantBase, EntityObjectBase):
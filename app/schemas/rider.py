@@ -0,0 +1,43 @@
+from typing_extensions import Annotated
+
+from app.schemas.bases import ObjectBase, EntityObjectBase, LocatableBase, LocatableUpdateBase, Field
+
+
+NameField = Annotated[str, Field(min_length=2, max_length=100)]
+
+
+class RiderBase(LocatableBase, ObjectBase):
+    """
+    Courier, at their last reported location. Riders are matched with the orders of the area
+    nearest to them by dispatch, which makes them unavailable until the order is over.
+    """
+
+    name: NameField
+    available: bool = True
+
+
+class RiderCreate(RiderBase):
+    pass
+
+
+class RiderUpdate(LocatableUpdateBase, RiderBase):
+    name: NameField = None
+    available: bool = None
+
+
+class Rider(RiderBase, EntityObjectBase):
+    pass
+
+
+class DispatchResult(ObjectBase):
+    """
+    Outcome of one dispatch tick
+    """
+
+    orders: int  # pending orders without a rider
+    riders: int  # available riders
+    areas: int  # areas with both, each matched separately
+    assigned: int = 0
+    conflicts: int = 0  # assignments dropped because the order or rider changed concurrently
+    solve_time: float = 0  # seconds spent matching
+    elapsed: float = 0  # seconds for the whole tick
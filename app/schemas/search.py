@@ -0,0 +1,11 @@
+from app.schemas.bases import EntityObjectBase
+from app.schemas.item import Item
+from app.schemas.restaurant import RestaurantBase
+
+
+class ItemSearchResult(Item):
+    score: float  # relevance to the query, higher is better
+
+
+class RestaurantSearchResult(RestaurantBase, EntityObjectBase):
+    score: float  # relevance to the query, higher is better
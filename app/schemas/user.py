@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import EmailStr, SecretStr
 from typing_extensions import Annotated, List, Optional
 
@@ -31,5 +32,22 @@ class UserPasswordUpdate(ObjectBase):
     new_password: PasswordField
 
 
-class User(UserBase, EntityObjectBase):
-    orders: List[Order] = []
\ No newline at end of file
+class UserPrincipal(UserBase, EntityObjectBase):
+    """
+    Authenticated user without the related objects, cheap to load and to cache per access token
+    """
+
+    pass
+
+
+class User(UserPrincipal):
+    orders: List[Order] = []
+
+
+class UserExport(UserPrincipal):
+    """
+    User with their timestamps, as written by the export
+    """
+
+    created_at: datetime
+    updated_at: Optional[datetime] = None
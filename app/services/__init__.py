@@ -1,7 +1,38 @@
 from .area import AreaService
-from .geo import get_distance, are_near_enough, PROXIMITY_THRESHOLD
-from .mixins import EntityCRUDMixin
+from .geo import (
+    get_distance,
+    get_distances,
+    get_distance_matrix,
+    are_near_enough,
+    CoordsArray,
+    PROXIMITY_THRESHOLD,
+)
+from .spatial import SpatialIndex, area_index
+from .mixins import EntityCRUDMixin, Fieldset
+from .workers import run_in_db_worker, iterate_in_db_worker, run_in_password_worker
+from .cache import TTLCache
+from .availability import AvailabilityCache, availability_cache
+from .principal import PrincipalCache, principal_cache
+from .snapshot import RestaurantSnapshot, RestaurantSnapshotCache, restaurant_snapshot_cache
 from .user import UserService
-from .order import OrderService
+from .tasks import TaskQueue, task_queue
+from .events import Broker, LocalBroker, Subscription, create_broker, event_broker
+from .order import OrderService, ORDER_TRANSITIONS, on_order_status, order_topic
+from .branch import BranchService
+from .item import ItemService
+from .eta import EtaService, DEFAULT_ETA_MODEL
+from .serviceability import ServiceabilityService
+from .search import (
+    SearchIndex,
+    FTS5SearchIndex,
+    MemorySearchIndex,
+    SearchService,
+    create_search_index,
+    item_search_index,
+    restaurant_search_index,
+    tokenize,
+)
 from .restaurant import RestaurantService
+from .rider import RiderService
+from .dispatch import DispatchService, run_dispatcher, solve_assignment
 from .auth import AuthService
@@ -1,15 +1,26 @@
-from typing_extensions import List, Tuple
-
 from app.schemas.area import Area, AreaCreate, AreaUpdate
-from app.storage.mappers import AreaMapper, select
+from app.storage.mappers import AreaMapper, selectinload
 from app.services.mixins import EntityCRUDMixin
-from app.services.geo import get_distance
+from app.services.spatial import area_index
+from app.services.availability import availability_cache
+from app.services.snapshot import restaurant_snapshot_cache
+from app.utilities import overrides
 
 
 class AreaService(EntityCRUDMixin[Area, AreaCreate, AreaUpdate, AreaMapper]):
+    loader_options = (selectinload(AreaMapper.branches),)
+
+    # Hooks
+    # -----
+
+    @overrides(EntityCRUDMixin)
+    def _after_save(self, row: AreaMapper) -> None:
+        area_index.upsert(row.id, row.coords)
 
-    def get_nearby_list(self, *, coords: Tuple[float, float], radius: float, limit: int = 10) -> List[Area]:
-        areas = self.db.exec(select(AreaMapper)).all()
-        areas = sorted(areas, key=lambda area: get_distance(area.coords, coords))
-        areas = [area for area in areas if get_distance(area.coords, coords) <= radius]
-        return areas[: max(0, min(limit, len(areas)))]
+    @overrides(EntityCRUDMixin)
+    def _after_delete(self, row: AreaMapper) -> None:
+        area_index.remove(row.id)
+        # Branches of the area lose their `area_id`; other area writes show neither in availability
+        # results nor in restaurants
+        availability_cache.invalidate_area(row.id)
+        restaurant_snapshot_cache.invalidate_branches(row.branches)
@@ -1,24 +1,25 @@
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi import Depends, HTTPException, status as http_status
-from jwt import encode, decode
+from jwt import encode, decode, ExpiredSignatureError, InvalidTokenError
 from typing_extensions import Annotated
 
-from app.storage.db import new_db_session
 from app.config import JWT_SECRET, JWT_ALGORITHM, API_V1_PREFIX, SESSION_EXPIRE_MINUTES
 from app.schemas.auth import AuthToken, JWTPayload
+from app.services.error import NotFoundHTTPException
 from app.services.user import UserService
-from app.schemas.user import User
+from app.services.principal import principal_cache
+from app.schemas.user import User, UserPrincipal
 
 LoginFormDep = Annotated[OAuth2PasswordRequestForm, Depends()]
+UserServiceDep = Annotated[UserService, Depends()]
 AccessTokenDep = Annotated[str, Depends(OAuth2PasswordBearer(tokenUrl=f"{API_V1_PREFIX}/login/access-token"))]
 
 class AuthService:
 
     @classmethod
-    def create_token(cls, form_data: LoginFormDep) -> AuthToken:
-        user_service = UserService(new_db_session())
-        user = user_service.authenticate_and_get_user(
+    async def create_token(cls, form_data: LoginFormDep, user_service: UserServiceDep) -> AuthToken:
+        user = await user_service.authenticate_and_get_user(
             email=form_data.username,
             password=form_data.password,
         )
@@ -28,9 +29,31 @@ class AuthService:
         )
 
     @classmethod
-    def get_current_user(cls, access_token: AccessTokenDep) -> User:
-        email = cls.decode_username_from_token(access_token=access_token)
-        return UserService(new_db_session()).get_by_email(email)
+    def get_current_principal(cls, access_token: AccessTokenDep, user_service: UserServiceDep) -> UserPrincipal:
+        """
+        Authenticate the request without loading the user's orders. Served from the principal
+        cache when the token has been verified before, without touching the database.
+        """
+        principal = principal_cache.get(access_token)
+        if principal is None:
+            version = principal_cache.version
+            payload = cls.decode_payload_from_token(access_token=access_token)
+            try:
+                principal = user_service.get_principal_by_email(payload.sub)
+            except NotFoundHTTPException:
+                raise cls._invalid_token_exception()
+            principal_cache.put(access_token, principal, expires_at=payload.exp, version=version)
+        return principal
+
+    @classmethod
+    def get_current_user(cls, access_token: AccessTokenDep, user_service: UserServiceDep) -> User:
+        principal = cls.get_current_principal(access_token, user_service)
+        try:
+            return user_service.get(id=principal.id)
+        except NotFoundHTTPException:
+            # The user was deleted since the token was cached, e.g. through another worker
+            principal_cache.invalidate(access_token)
+            raise cls._invalid_token_exception()
 
     @classmethod
     def encode_username_into_token(cls, *, username: str) -> str:
@@ -40,14 +63,27 @@ class AuthService:
         )
         return encode(payload.model_dump(), JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+    @classmethod
+    def decode_payload_from_token(cls, *, access_token: str) -> JWTPayload:
+        # The signature and the expiry (`exp`) are both verified by `decode`
+        try:
+            return JWTPayload(**decode(access_token, JWT_SECRET, algorithms=[JWT_ALGORITHM]))
+        except ExpiredSignatureError:
+            raise HTTPException(
+                status_code=http_status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired",
+            )
+        except InvalidTokenError:
+            raise cls._invalid_token_exception()
+
+    @classmethod
+    def _invalid_token_exception(cls) -> HTTPException:
+        return HTTPException(
+            status_code=http_status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+        )
+
     @classmethod
     def decode_username_from_token(cls, *, access_token: str) -> str:
-        payload = JWTPayload(**decode(access_token, JWT_SECRET, algorithms=[JWT_ALGORITHM]))
-        if payload.exp is not None:
-            if datetime.fromtimestamp(payload.exp, timezone.utc) < datetime.now(timezone.utc):
-                raise HTTPException(
-                    status_code=http_status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has expired",
-                )
-        return payload.sub
+        return cls.decode_payload_from_token(access_token=access_token).sub
 
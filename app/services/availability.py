@@ -0,0 +1,136 @@
+from threading import RLock
+from typing_extensions import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import (
+    AVAILABILITY_CACHE_MAX_SIZE,
+    AVAILABILITY_CACHE_TTL,
+    PROXIMITY_THRESHOLD,
+    SERVICEABILITY_GEOHASH_PRECISION,
+)
+from app.schemas.restaurant import RestaurantAvailable
+from app.services.cache import TTLCache
+from app.services.geo import geohash_cells_within, geohash_encode
+
+
+class AvailabilityCache:
+    """
+    Cache of the restaurants that may deliver to a serviceability cell: one `RestaurantAvailable`
+    per branch whose delivery range reaches any point of the cell, keyed by the geohash of the
+    cell. `RestaurantService.get_available_list` filters them by the exact distance to the
+    delivery location, so every customer in the cell shares one entry and gets the same answer as
+    without the cache.
+
+    Entries are invalidated only when a write can change them:
+
+    * a branch that is listed in the entry is updated or deleted
+    * a branch is created or moved to within `PROXIMITY_THRESHOLD` of the cell
+    * a restaurant that is listed in the entry is updated or deleted
+    * an area that a listed branch belongs to is deleted (the branch's `area_id` is cleared), or
+      learns from a delivery (the delivery times of its branches change)
+
+    Each entry is indexed by the branches, restaurants and areas it lists, so that invalidating
+    them only touches the entries concerned. Every invalidation bumps `version`. Reads take
+    `version` before going to the database and pass it to `put`, so an entry read before a write is
+    never stored after it. Writes made by other processes show once the entry expires.
+    """
+
+    def __init__(
+        self,
+        *,
+        precision: int = SERVICEABILITY_GEOHASH_PRECISION,
+        max_size: int = AVAILABILITY_CACHE_MAX_SIZE,
+        ttl: float = AVAILABILITY_CACHE_TTL,
+    ) -> None:
+        self.precision = precision
+        self._cache: TTLCache[str, List[RestaurantAvailable]] = TTLCache(
+            "availability", max_size=max_size, ttl=ttl, on_remove=self._unindex
+        )
+        self._cells_by_branch: Dict[int, Set[str]] = {}
+        self._cells_by_restaurant: Dict[int, Set[str]] = {}
+        self._cells_by_area: Dict[int, Set[str]] = {}
+        self._version = 0
+        # Every call into the cache holds this lock, so that the indexes change along with the entries
+        self._lock = RLock()
+
+    # Private methods
+    # ---------------
+
+    def _get_indexes(self, restaurants: List[RestaurantAvailable]) -> Iterable[Tuple[Dict[int, Set[str]], int]]:
+        for restaurant in restaurants:
+            yield self._cells_by_branch, restaurant.branch.id
+            yield self._cells_by_restaurant, restaurant.id
+            if restaurant.branch.area_id is not None:
+                yield self._cells_by_area, restaurant.branch.area_id
+
+    def _index(self, cell: str, restaurants: List[RestaurantAvailable]) -> None:
+        for index, id in self._get_indexes(restaurants):
+            index.setdefault(id, set()).add(cell)
+
+    def _unindex(self, cell: str, restaurants: List[RestaurantAvailable]) -> None:
+        for index, id in self._get_indexes(restaurants):
+            cells = index.get(id)
+            if cells is not None:
+                cells.discard(cell)
+                if not cells:
+                    del index[id]
+
+    def _invalidate(self, cells: Iterable[str]) -> None:
+        with self._lock:
+            self._version += 1
+            for cell in list(cells):
+                self._cache.invalidate(cell)
+
+    # Public methods
+    # --------------
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get_cell(self, coords: Tuple[float, float]) -> str:
+        return geohash_encode(coords, self.precision)
+
+    def get(self, cell: str) -> Optional[List[RestaurantAvailable]]:
+        with self._lock:
+            return self._cache.get(cell)
+
+    def put(self, cell: str, restaurants: List[RestaurantAvailable], *, version: int) -> None:
+        with self._lock:
+            if version == self._version and self._cache.put(cell, restaurants):
+                self._index(cell, restaurants)
+
+    def invalidate_branch(self, branch_id: int, coords: Optional[Tuple[float, float]] = None) -> None:
+        """
+        Invalidate the entries listing the branch, and, if `coords` is given, the entries of the
+        cells within delivery range of the branch's new location.
+        """
+        with self._lock:
+            cells = set(self._cells_by_branch.get(branch_id, ()))
+            if coords is not None:
+                cells.update(cell for cell, _ in geohash_cells_within(coords, PROXIMITY_THRESHOLD, self.precision))
+            self._invalidate(cells)
+
+    def invalidate_restaurants(self, restaurant_ids: Set[int]) -> None:
+        with self._lock:
+            self._invalidate(
+                {cell for restaurant_id in restaurant_ids for cell in self._cells_by_restaurant.get(restaurant_id, ())}
+            )
+
+    def invalidate_area(self, area_id: int) -> None:
+        with self._lock:
+            self._invalidate(set(self._cells_by_area.get(area_id, ())))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._cache.clear()
+            self._cells_by_branch.clear()
+            self._cells_by_restaurant.clear()
+            self._cells_by_area.clear()
+
+
+availability_cache = AvailabilityCache()
@@ -0,0 +1,54 @@
+from typing_extensions import Any, Dict, List
+
+from app.schemas.bases import IdField
+from app.schemas.branch import Branch, BranchCreate, BranchUpdate
+from app.storage.mappers import BranchMapper
+from app.services.mixins import EntityCRUDMixin
+from app.services.spatial import area_index
+from app.services.availability import availability_cache
+from app.services.serviceability import ServiceabilityService
+from app.services.snapshot import restaurant_snapshot_cache
+from app.utilities import overrides
+
+
+class BranchService(EntityCRUDMixin[Branch, BranchCreate, BranchUpdate, BranchMapper]):
+
+    # Hooks
+    # -----
+
+    @overrides(EntityCRUDMixin)
+    def _before_save_commit(self, rows: List[BranchMapper]) -> None:
+        ServiceabilityService(self.db).update_branches(rows)
+
+    @overrides(EntityCRUDMixin)
+    def _before_import_commit(self, ids: List[IdField]) -> None:
+        self._before_save_commit(list(self._get_rows_by_ids(ids).values()))
+
+    @overrides(EntityCRUDMixin)
+    def _after_save(self, row: BranchMapper) -> None:
+        self._after_bulk_save([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_save(self, rows: List[BranchMapper]) -> None:
+        for row in rows:
+            availability_cache.invalidate_branch(row.id, row.coords)
+        restaurant_snapshot_cache.invalidate_branches(rows)
+
+    @overrides(EntityCRUDMixin)
+    def _before_import(self, values: List[Dict[str, Any]]) -> None:
+        # Put each branch without an area in the nearest one
+        index = area_index.ensure_built(self.db)
+        for row_values in values:
+            if row_values.get("area_id") is None:
+                row_values["area_id"] = index.query_nearest((row_values["latitude"], row_values["longitude"]))
+
+    @overrides(EntityCRUDMixin)
+    def _after_delete(self, row: BranchMapper) -> None:
+        self._after_bulk_delete([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_delete(self, rows: List[BranchMapper]) -> None:
+        for row in rows:
+            availability_cache.invalidate_branch(row.id)
+        # Their serviceability entries were deleted by cascade
+        restaurant_snapshot_cache.invalidate_branches(rows)
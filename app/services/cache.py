@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from threading import RLock
+from time import monotonic
+from typing_extensions import Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+from app.schemas.metrics import CacheStats
+
+
+_TKey = TypeVar("_TKey", bound=Hashable)
+_TValue = TypeVar("_TValue")
+
+
+class TTLCache(Generic[_TKey, _TValue]):
+    """
+    Thread-safe in-process cache bounded by entry count, where entries also expire `ttl` seconds
+    after being stored. When full, the least recently used entry is evicted.
+
+    With `max_bytes` and `get_size`, the cache is also bounded by the total size of its values, as
+    measured by `get_size`; a value larger than `max_bytes` on its own is not stored.
+
+    `on_remove` is called with the key and value of every entry that leaves the cache other than
+    through `clear`, with the lock of the cache held.
+
+    A cache with `max_size` of 0 stores nothing, so every lookup is a miss.
+    """
+
+    _registry: Dict[str, "TTLCache"] = {}
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_size: int,
+        ttl: float,
+        max_bytes: Optional[int] = None,
+        get_size: Optional[Callable[[_TValue], int]] = None,
+        on_remove: Optional[Callable[[_TKey, _TValue], None]] = None,
+    ) -> None:
+        self.name = name
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.max_bytes = max_bytes if get_size is not None else None
+        self._get_size = get_size
+        self._on_remove = on_remove
+        self._entries: "OrderedDict[_TKey, Tuple[float, _TValue, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = RLock()
+        self._stats = CacheStats(name=name, size=0, max_size=self.max_size, max_bytes=self.max_bytes)
+        TTLCache._registry[name] = self
+
+    # Class methods
+    # -------------
+
+    @classmethod
+    def get_all_stats(cls) -> List[CacheStats]:
+        return [cache.stats for cache in cls._registry.values()]
+
+    # Private methods
+    # ---------------
+
+    def _remove(self, key: _TKey) -> None:
+        _, value, size = self._entries.pop(key)
+        self._bytes -= size
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+
+    # Public methods
+    # --------------
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return self._stats.model_copy(update={"size": len(self._entries), "bytes": self._bytes})
+
+    def get(self, key: _TKey) -> Optional[_TValue]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= monotonic():
+                self._remove(key)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def put(self, key: _TKey, value: _TValue, ttl: Optional[float] = None) -> bool:
+        """
+        Store a value, expiring after `ttl` seconds if given, capped at the TTL of the cache.
+
+        Returns:
+        * `bool` -- Whether the value was stored
+        """
+        if not self.enabled:
+            return False
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return False
+        size = self._get_size(value) if self._get_size is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (monotonic() + ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_size or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+        return True
+
+    def invalidate(self, key: _TKey) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._stats.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[_TKey, _TValue], bool]) -> None:
+        """
+        Drop every entry for which `predicate(key, value)` is true.
+        """
+        with self._lock:
+            keys = [key for key, (_, value, _) in self._entries.items() if predicate(key, value)]
+            for key in keys:
+                self._remove(key)
+            self._stats.invalidations += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,268 @@
+from asyncio import sleep
+from collections import defaultdict
+from datetime import datetime
+from fastapi import Depends
+from logging import getLogger
+import numpy as np
+from time import monotonic, perf_counter
+from sqlalchemy import Row, case
+from typing_extensions import Annotated, Dict, List, Optional, Sequence, Tuple
+
+from app.config import DISPATCH_INTERVAL, DISPATCH_MAX_DISTANCE, DISPATCH_TICK_TARGET
+from app.schemas.bases import IdField
+from app.schemas.order import OrderStatus
+from app.schemas.rider import DispatchResult
+from app.storage.mappers import AreaMapper, BranchMapper, OrderMapper, RiderMapper, column, select, update
+from app.storage.db import DBSession, get_db_engine, new_db_session
+from app.services.geo import get_distance_matrix
+from app.services.order import OrderService
+from app.services.workers import run_in_db_worker
+
+logger = getLogger(__name__)
+
+# Matched pairs written per statement, keeping the number of bound parameters low
+_WRITE_CHUNK_SIZE = 500
+
+# Factor by which the bid increment shrinks from one phase of the auction to the next
+_EPSILON_SCALING = 4.0
+
+
+def solve_assignment(costs: np.ndarray) -> np.ndarray:
+    """
+    Assign the rows of a cost matrix to distinct columns with the minimum total cost, by the
+    auction algorithm with ε-scaling. Costs are rounded to integers, for which the assignment is
+    optimal, so costs in meters are optimal to the meter.
+
+    The matrix is padded to a square one with zero cost dummies, so that every row is assigned
+    when there are at least as many columns, and every column otherwise.
+
+    Parameters:
+    * `costs`: `np.ndarray` -- Matrix of non-negative costs, with a row per task and a column per agent
+
+    Returns:
+    * `np.ndarray` -- The column assigned to each row, or -1 if the row is left unassigned
+    """
+    rows, columns = costs.shape
+    size = max(rows, columns)
+    if min(rows, columns) == 0:
+        return np.full(rows, -1, dtype=np.intp)
+    benefits = np.zeros((size, size))
+    benefits[:rows, :columns] = -np.rint(costs)
+
+    # Rows bid for their best column at its price, outbidding its owner by the margin over their
+    # second best plus ε. Each phase restarts from the prices of the last one with a smaller ε,
+    # down to one below 1 / size, at which an assignment of integer costs is optimal.
+    prices = np.zeros(size)
+    owner = np.full(size, -1, dtype=np.intp)
+    assigned = np.full(size, -1, dtype=np.intp)
+    final_epsilon = 1.0 / (size + 1)
+    epsilon = max(float(np.ptp(benefits)) / _EPSILON_SCALING, final_epsilon)
+    while True:
+        owner.fill(-1)
+        assigned.fill(-1)
+        unassigned = list(range(size))
+        while unassigned:
+            row = unassigned.pop()
+            values = benefits[row] - prices
+            best = int(values.argmax())
+            best_value = values[best]
+            values[best] = -np.inf
+            second_value = values.max() if size > 1 else best_value
+            prices[best] += best_value - second_value + epsilon
+            if owner[best] >= 0:
+                assigned[owner[best]] = -1
+                unassigned.append(owner[best])
+            owner[best] = row
+            assigned[row] = best
+        if epsilon <= final_epsilon:
+            break
+        epsilon = max(epsilon / _EPSILON_SCALING, final_epsilon)
+
+    assignment = assigned[:rows]
+    assignment[assignment >= columns] = -1
+    return assignment
+
+
+def _get_nearest(coords: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    # Position of the nearest candidate of each point, in chunks to bound the size of the distance matrix
+    nearest = np.empty(len(coords), dtype=np.intp)
+    for start in range(0, len(coords), 1024):
+        nearest[start : start + 1024] = get_distance_matrix(coords[start : start + 1024], candidates).argmin(axis=1)
+    return nearest
+
+
+class DispatchService:
+    """
+    Matches pending orders with available riders, area by area, and accepts the matched orders.
+
+    Orders belong to the area of their branch, and riders to the area nearest to them. Within an
+    area, orders and riders are matched as a whole, minimizing the total distance from the riders
+    to the branches with as many orders matched as possible, rather than giving each order in turn
+    its nearest rider. Riders farther than `DISPATCH_MAX_DISTANCE` from a branch are never sent.
+    """
+
+    # Constructor
+    # -----------
+
+    def __init__(self, db: Annotated[DBSession, Depends(new_db_session)]) -> None:
+        self.db = db
+
+    # Private methods
+    # ---------------
+
+    def _group_by_area(
+        self, coords: np.ndarray, area_ids: Sequence[Optional[int]], areas: Sequence
+    ) -> Dict[Optional[int], List[int]]:
+        # Positions of the points in each area, putting the points without an area in the nearest one
+        area_ids = list(area_ids)
+        missing = [position for position, area_id in enumerate(area_ids) if area_id is None]
+        if missing and areas:
+            nearest = _get_nearest(coords[missing], np.array([(area.latitude, area.longitude) for area in areas]))
+            for position, area_position in zip(missing, nearest):
+                area_ids[position] = areas[area_position].id
+        groups: Dict[Optional[int], List[int]] = defaultdict(list)
+        for position, area_id in enumerate(area_ids):
+            groups[area_id].append(position)
+        return groups
+
+    def _accept(self, pairs: List[Tuple[Row, Row]]) -> List[IdField]:
+        # Claim the riders that are still available, then accept the orders that are still pending
+        # and have their rider, and release the riders of the others; a few statements per chunk
+        now = datetime.now()
+        claimed = set(
+            self.db.exec(
+                update(RiderMapper)
+                .where(column(RiderMapper.id).in_([rider.id for _, rider in pairs]), column(RiderMapper.available))
+                .values(available=False, updated_at=now)
+                .returning(RiderMapper.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        rider_ids = {order.id: rider.id for order, rider in pairs if rider.id in claimed}
+        if not rider_ids:
+            return []
+        # Orders only leave `PENDING` through a transition, so a pending order is still at the version it was read at
+        accepted = list(
+            self.db.exec(
+                update(OrderMapper)
+                .where(
+                    column(OrderMapper.id).in_(rider_ids),
+                    column(OrderMapper.status) == OrderStatus.PENDING,
+                    column(OrderMapper.rider_id).is_(None),
+                )
+                .values(
+                    status=OrderStatus.ACCEPTED,
+                    rider_id=case(rider_ids, value=column(OrderMapper.id)),
+                    version=column(OrderMapper.version) + 1,
+                    updated_at=now,
+                )
+                .returning(OrderMapper.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        released = claimed - {rider_ids[id] for id in accepted}
+        if released:
+            self.db.exec(
+                update(RiderMapper)
+                .where(column(RiderMapper.id).in_(released))
+                .values(available=True)
+                .execution_options(synchronize_session=False)
+            )
+        return accepted
+
+    # Public methods
+    # --------------
+
+    def dispatch(self, *, max_distance: float = DISPATCH_MAX_DISTANCE) -> DispatchResult:
+        """
+        Run one dispatch tick: match the pending orders without a rider with the available riders,
+        then give each matched order its rider and move it to `ACCEPTED`, in one transaction.
+
+        Orders and riders are read without locks, so the writes check that each order is still
+        pending without a rider, and each rider still available; a pair that fails either check is
+        skipped, and left to the next tick.
+
+        Returns:
+        * `DispatchResult` -- Counts and timings of the tick
+        """
+        start = perf_counter()
+        orders = self.db.exec(
+            select(OrderMapper.id, BranchMapper.latitude, BranchMapper.longitude, BranchMapper.area_id)
+            .join(BranchMapper, column(BranchMapper.id) == column(OrderMapper.branch_id))
+            .where(column(OrderMapper.status) == OrderStatus.PENDING, column(OrderMapper.rider_id).is_(None))
+            .order_by(column(OrderMapper.id))
+        ).all()
+        riders = self.db.exec(
+            select(RiderMapper.id, RiderMapper.latitude, RiderMapper.longitude).where(column(RiderMapper.available))
+        ).all()
+        result = DispatchResult(orders=len(orders), riders=len(riders), areas=0)
+        if not orders or not riders:
+            result.elapsed = perf_counter() - start
+            return result
+
+        areas = self.db.exec(select(AreaMapper.id, AreaMapper.latitude, AreaMapper.longitude)).all()
+        order_coords = np.array([(order.latitude, order.longitude) for order in orders])
+        rider_coords = np.array([(rider.latitude, rider.longitude) for rider in riders])
+        order_groups = self._group_by_area(order_coords, [order.area_id for order in orders], areas)
+        rider_groups = self._group_by_area(rider_coords, [None] * len(riders), areas)
+
+        pairs = []
+        for area_id, order_positions in order_groups.items():
+            rider_positions = rider_groups.get(area_id)
+            if not rider_positions:
+                continue
+            result.areas += 1
+            costs = get_distance_matrix(order_coords[order_positions], rider_coords[rider_positions])
+            # A pair out of reach costs more than all the others together, so that the matching
+            # first leaves as few orders out of reach as it can; those pairs are dropped afterwards
+            out_of_reach = costs > max_distance
+            costs[out_of_reach] = max_distance * max(costs.shape) + 1
+
+            solve_start = perf_counter()
+            assignment = solve_assignment(costs)
+            result.solve_time += perf_counter() - solve_start
+
+            for row, rider_column in enumerate(assignment):
+                if rider_column >= 0 and not out_of_reach[row, rider_column]:
+                    pairs.append((orders[order_positions[row]], riders[rider_positions[rider_column]]))
+
+        accepted = []
+        for chunk_start in range(0, len(pairs), _WRITE_CHUNK_SIZE):
+            accepted += self._accept(pairs[chunk_start : chunk_start + _WRITE_CHUNK_SIZE])
+        self.db.commit()
+        result.assigned = len(accepted)
+        result.conflicts = len(pairs) - len(accepted)
+        OrderService(self.db).announce_status_change(ids=accepted, previous=OrderStatus.PENDING)
+        result.elapsed = perf_counter() - start
+        return result
+
+
+def _dispatch_tick() -> DispatchResult:
+    with DBSession(get_db_engine()) as db:
+        return DispatchService(db).dispatch()
+
+
+async def run_dispatcher(interval: float = DISPATCH_INTERVAL) -> None:
+    """
+    Run a dispatch tick every `interval` seconds, on a database worker thread, until cancelled.
+    Ticks that take longer than `DISPATCH_TICK_TARGET` are logged. Run it in one process only, see
+    `DISPATCH_IN_APP`: the ticks of several processes would not assign an order twice, but would get
+    in each other's way.
+    """
+    next_tick = monotonic() + interval
+    while True:
+        await sleep(max(0.0, next_tick - monotonic()))
+        next_tick = max(next_tick + interval, monotonic())
+        try:
+            result = await run_in_db_worker(_dispatch_tick)
+        except Exception:
+            logger.exception("Dispatch tick failed")
+            continue
+        if result.elapsed > DISPATCH_TICK_TARGET:
+            logger.warning(
+                "Dispatch tick took %.3f s (%.3f s matching) for %d orders and %d riders",
+                result.elapsed,
+                result.solve_time,
+                result.orders,
+                result.riders,
+            )
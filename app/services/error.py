@@ -1,4 +1,5 @@
 from fastapi import HTTPException, status as http_status
+from typing_extensions import Any, Dict, List
 
 
 class NotFoundHTTPException(HTTPException):
@@ -7,3 +8,41 @@ class NotFoundHTTPException(HTTPException):
             status_code=http_status.HTTP_404_NOT_FOUND,
             detail=f"{entity_type.__name__}{details} not found",
         )
+
+
+class BadRequestHTTPException(HTTPException):
+    def __init__(self, details: str):
+        super().__init__(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=details,
+        )
+
+
+class ConflictHTTPException(HTTPException):
+    def __init__(self, details: str):
+        super().__init__(
+            status_code=http_status.HTTP_409_CONFLICT,
+            detail=details,
+        )
+
+
+class TooManyRequestsHTTPException(HTTPException):
+    def __init__(self, details: str, retry_after: int):
+        super().__init__(
+            status_code=http_status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=details,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class BatchHTTPException(HTTPException):
+    """
+    Rejects a whole batch, listing the error of each failed item in the same shape as FastAPI's
+    request validation errors, with `loc` pointing at the item's index in the request body.
+    """
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=errors,
+        )
@@ -0,0 +1,218 @@
+from collections import defaultdict
+from fastapi import Depends
+import numpy as np
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from typing_extensions import Annotated, Any, Dict, List, Optional, Tuple
+
+from app.config import ETA_DEFAULT_BASE, ETA_DEFAULT_SPEED, ETA_MAX_DURATION, ETA_MIN_SAMPLES
+from app.schemas.order import Order, OrderStatus
+from app.storage.mappers import (
+    AreaMapper,
+    BranchMapper,
+    DeliveryStatsMapper,
+    OrderMapper,
+    ServiceabilityMapper,
+    column,
+    delete,
+    insert,
+    select,
+    update,
+)
+from app.storage.db import DBSession, get_db_engine, new_db_session
+from app.services.availability import availability_cache
+from app.services.geo import get_distance
+from app.services.order import on_order_status
+
+# Delivery time model: seconds before the order sets off (preparation and pickup), and seconds per meter after
+EtaModel = Tuple[float, float]
+
+DEFAULT_ETA_MODEL: EtaModel = (ETA_DEFAULT_BASE, 1 / ETA_DEFAULT_SPEED)
+
+
+def _fit(stats: Optional[DeliveryStatsMapper]) -> EtaModel:
+    # Least squares line through the deliveries of an area, once it has enough of them at different distances
+    if stats is None or stats.samples < ETA_MIN_SAMPLES or stats.distance_deviation <= 0:
+        return DEFAULT_ETA_MODEL
+    pace = max(stats.co_deviation / stats.distance_deviation, 0.0)
+    return max(stats.mean_duration - pace * stats.mean_distance, 0.0), pace
+
+
+def _select_deliveries():
+    return (
+        select(
+            OrderMapper.created_at,
+            OrderMapper.updated_at,
+            OrderMapper.latitude,
+            OrderMapper.longitude,
+            OrderMapper.branch_id,
+            column(BranchMapper.latitude).label("branch_latitude"),
+            column(BranchMapper.longitude).label("branch_longitude"),
+            BranchMapper.area_id,
+        )
+        .join(BranchMapper, column(BranchMapper.id) == column(OrderMapper.branch_id))
+        .where(column(OrderMapper.status) == OrderStatus.DELIVERED, column(BranchMapper.area_id).is_not(None))
+    )
+
+
+def _insert_or_ignore(db: DBSession, values: Dict[str, Any]) -> None:
+    # Insert a row of statistics unless the area already has one, without failing if a concurrent
+    # transaction inserts it first
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(DeliveryStatsMapper).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(DeliveryStatsMapper).on_conflict_do_nothing()
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(DeliveryStatsMapper).prefix_with("IGNORE")
+    else:
+        raise NotImplementedError(f"Inserting or ignoring is not supported on {dialect}")
+    db.exec(stmt.values(**values))
+
+
+def _get_sample(row) -> Optional[Tuple[float, float]]:
+    # Distance and duration of a delivery, or `None` if its duration is implausible
+    if row.updated_at is None:
+        return None
+    duration = (row.updated_at - row.created_at).total_seconds()
+    if not 0 < duration <= ETA_MAX_DURATION:
+        return None
+    return get_distance((row.branch_latitude, row.branch_longitude), (row.latitude, row.longitude)), duration
+
+
+class EtaService:
+    """
+    Maintains the delivery time estimates in the `serviceability` table, one per branch and
+    delivery cell, so that an estimate costs nothing more than the lookup of the branches that can
+    deliver to a location.
+
+    The delivery time of a branch's orders is modelled as a fixed time plus a time per meter from
+    the branch to the customer, fitted by least squares to the delivered orders of the branch's
+    area (placed to delivered). Areas with fewer than `ETA_MIN_SAMPLES` deliveries, and branches
+    without an area, use `ETA_DEFAULT_BASE` and `ETA_DEFAULT_SPEED`.
+
+    Each delivery updates the statistics of its area and the estimates of its own branch, and
+    invalidates the cached availability listing that branch. The other branches of the area are
+    re-estimated with their own next delivery, so that a delivery costs one branch's cells however
+    large its area is. To learn from the orders delivered before estimates were kept, and to
+    re-estimate every branch, run `python -m app.cli rebuild-etas`.
+    """
+
+    # Constructor
+    # -----------
+
+    def __init__(self, db: Annotated[DBSession, Depends(new_db_session)]) -> None:
+        self.db = db
+
+    # Private methods
+    # ---------------
+
+    def _refresh(self, branch_ids: Any, model: EtaModel) -> int:
+        # Re-estimate the cells of the branches, given by a list or a subquery of their IDs, in one statement
+        base, pace = model
+        result = self.db.exec(
+            update(ServiceabilityMapper)
+            .where(column(ServiceabilityMapper.branch_id).in_(branch_ids))
+            .values(eta=base + pace * column(ServiceabilityMapper.distance))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    # Public methods
+    # --------------
+
+    def get_model(self, area_id: Optional[int]) -> EtaModel:
+        """
+        Get the delivery time model of the branches of an area, or of the branches without one.
+        """
+        if area_id is None:
+            return DEFAULT_ETA_MODEL
+        return _fit(self.db.get(DeliveryStatsMapper, area_id))
+
+    def record_delivery(self, order_id: int) -> bool:
+        """
+        Learn from a delivered order, then re-estimate the delivery times of its branch.
+
+        Returns:
+        * `bool` -- Whether the order was learned from; orders of branches without an area, and
+        orders that took implausibly long, are not
+        """
+        row = self.db.exec(_select_deliveries().where(column(OrderMapper.id) == order_id)).first()
+        sample = _get_sample(row) if row is not None else None
+        if sample is None:
+            return False
+        distance, duration = sample
+
+        _insert_or_ignore(self.db, {"area_id": row.area_id})
+
+        # Welford's update, in one statement whose terms all use the statistics before it, so that
+        # concurrent deliveries in the same area are all counted
+        samples = column(DeliveryStatsMapper.samples)
+        mean_distance = column(DeliveryStatsMapper.mean_distance)
+        mean_duration = column(DeliveryStatsMapper.mean_duration)
+        distance_deviation = column(DeliveryStatsMapper.distance_deviation)
+        co_deviation = column(DeliveryStatsMapper.co_deviation)
+        distance_delta = distance - mean_distance
+        duration_delta = duration - mean_duration
+        self.db.exec(
+            update(DeliveryStatsMapper)
+            .where(column(DeliveryStatsMapper.area_id) == row.area_id)
+            .values(
+                samples=samples + 1,
+                mean_distance=mean_distance + distance_delta / (samples + 1),
+                mean_duration=mean_duration + duration_delta / (samples + 1),
+                distance_deviation=distance_deviation + distance_delta * distance_delta * samples / (samples + 1),
+                co_deviation=co_deviation + distance_delta * duration_delta * samples / (samples + 1),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        stats = self.db.get(DeliveryStatsMapper, row.area_id, populate_existing=True)
+        self._refresh([row.branch_id], _fit(stats))
+        self.db.commit()
+        availability_cache.invalidate_branch(row.branch_id)
+        return True
+
+    def rebuild(self) -> int:
+        """
+        Relearn the statistics of every area from all the delivered orders, and re-estimate every
+        delivery time, in one transaction.
+
+        Returns:
+        * `int` -- The number of deliveries learned from
+        """
+        samples: Dict[int, List[Tuple[float, float]]] = defaultdict(list)
+        for row in self.db.exec(_select_deliveries()):
+            sample = _get_sample(row)
+            if sample is not None:
+                samples[row.area_id].append(sample)
+
+        self.db.exec(delete(DeliveryStatsMapper))
+        stats_rows = []
+        for area_id, area_samples in samples.items():
+            distances, durations = np.array(area_samples).T
+            distance_deviations = distances - distances.mean()
+            stats_rows.append(
+                {
+                    "area_id": area_id,
+                    "samples": len(area_samples),
+                    "mean_distance": float(distances.mean()),
+                    "mean_duration": float(durations.mean()),
+                    "distance_deviation": float(distance_deviations @ distance_deviations),
+                    "co_deviation": float(distance_deviations @ (durations - durations.mean())),
+                }
+            )
+        if stats_rows:
+            self.db.exec(insert(DeliveryStatsMapper), params=stats_rows)
+
+        area_id = column(BranchMapper.area_id)
+        for id in self.db.exec(select(AreaMapper.id)).all():
+            self._refresh(select(BranchMapper.id).where(area_id == id), self.get_model(id))
+        self._refresh(select(BranchMapper.id).where(area_id.is_(None)), DEFAULT_ETA_MODEL)
+        self.db.commit()
+        availability_cache.clear()
+        return sum(len(area_samples) for area_samples in samples.values())
+
+
+@on_order_status(OrderStatus.DELIVERED)
+def learn_delivery_time(order: Order, previous: Optional[OrderStatus]) -> None:
+    with DBSession(get_db_engine()) as db:
+        EtaService(db).record_delivery(order.id)
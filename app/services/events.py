@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+from asyncio import AbstractEventLoop, Event, TimeoutError as AsyncTimeoutError, get_running_loop, wait_for
+from collections import deque
+from threading import Lock
+from typing_extensions import Deque, Dict, Optional, Set
+
+from app.config import EVENT_BROKER, EVENT_SUBSCRIPTION_MAX_PENDING, EventBrokerKind
+from app.schemas.metrics import EventBrokerStats
+
+
+class Subscription:
+    """
+    Messages published to a topic since the subscription was made, buffered up to `max_pending`.
+    When a subscriber falls behind, its oldest messages are dropped, so an idle or slow subscriber
+    costs a bounded amount of memory and never holds up the publisher.
+
+    A subscription is used from the event loop it was made on, and is a context manager that
+    unsubscribes on exit.
+    """
+
+    def __init__(self, broker: "Broker", topic: str, *, max_pending: int) -> None:
+        self.broker = broker
+        self.topic = topic
+        self._messages: Deque[bytes] = deque(maxlen=max(1, max_pending))
+        self._ready = Event()
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def deliver(self, message: bytes) -> bool:
+        """
+        Buffer a message. Called by the broker on the event loop of the subscription.
+
+        Returns:
+        * `bool` -- Whether the oldest buffered message was dropped to make room
+        """
+        dropped = len(self._messages) == self._messages.maxlen
+        self._messages.append(message)
+        self._ready.set()
+        return dropped
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Wait for the next message, for at most `timeout` seconds if given.
+
+        Returns:
+        * `Optional[bytes]` -- The message, or `None` on timeout
+        """
+        while not self._messages:
+            self._ready.clear()
+            try:
+                await wait_for(self._ready.wait(), timeout)
+            except AsyncTimeoutError:
+                return None
+        return self._messages.popleft()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker(ABC):
+    """
+    Publish/subscribe hub of the app, carrying already encoded messages on named topics (e.g. one
+    per order), so that a message is encoded once however many subscribers it goes to.
+
+    `LocalBroker` only reaches the subscribers of the same process. Deployments running several
+    workers plug in a broker shared by the workers by implementing this interface and adding it to
+    `EventBrokerKind`.
+    """
+
+    @abstractmethod
+    def publish(self, topic: str, message: bytes) -> None:
+        """
+        Send a message to the current subscribers of a topic, without waiting for them. Safe to
+        call from any thread.
+        """
+        pass
+
+    @abstractmethod
+    def subscribe(self, topic: str) -> Subscription:
+        """
+        Subscribe to a topic on the running event loop.
+        """
+        pass
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        pass
+
+    @property
+    @abstractmethod
+    def stats(self) -> EventBrokerStats:
+        pass
+
+
+class LocalBroker(Broker):
+    """
+    In-process broker. Subscribers wait on an event each rather than on a task or a queue, so
+    thousands of idle subscribers cost little more than their connections.
+    """
+
+    def __init__(self, *, max_pending: int = EVENT_SUBSCRIPTION_MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[AbstractEventLoop] = None
+        self._lock = Lock()
+        self._stats = EventBrokerStats(topics=0, subscribers=0)
+
+    # Private methods
+    # ---------------
+
+    def _fan_out(self, topic: str, message: bytes) -> None:
+        # Only called on the event loop of the subscribers
+        subscriptions = list(self._topics.get(topic, ()))
+        dropped = sum(subscription.deliver(message) for subscription in subscriptions)
+        with self._lock:
+            self._stats.delivered += len(subscriptions)
+            self._stats.dropped += dropped
+
+    # Public methods
+    # --------------
+
+    @property
+    def stats(self) -> EventBrokerStats:
+        with self._lock:
+            return self._stats.model_copy(
+                update={
+                    "topics": len(self._topics),
+                    "subscribers": sum(len(subscriptions) for subscriptions in self._topics.values()),
+                }
+            )
+
+    def publish(self, topic: str, message: bytes) -> None:
+        with self._lock:
+            self._stats.published += 1
+            loop = self._loop
+        if loop is None or topic not in self._topics:
+            return
+        try:
+            on_loop = get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(topic, message)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, topic, message)
+
+    def subscribe(self, topic: str) -> Subscription:
+        # Subscribers all live on the event loop of the app, which may be restarted (e.g. in tests)
+        self._loop = get_running_loop()
+        subscription = Subscription(self, topic, max_pending=self.max_pending)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._topics.get(subscription.topic)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._topics[subscription.topic]
+
+
+def create_broker(kind: EventBrokerKind = EVENT_BROKER) -> Broker:
+    """
+    Create the broker configured by `EVENT_BROKER`.
+    """
+    if kind == EventBrokerKind.LOCAL:
+        return LocalBroker()
+    raise ValueError(f"Unknown event broker: {kind}")
+
+
+event_broker = create_broker()
@@ -1,8 +1,16 @@
-from math import sin, cos, sqrt, atan2
-from typing_extensions import Tuple
+from math import asin, sin, cos, sqrt, atan2, pi, degrees, radians, floor
+import numpy as np
+from typing_extensions import List, Sequence, Tuple, Union
 
 from app.config import PROXIMITY_THRESHOLD
 
+EARTH_RADIUS = 6371000  # radius of the Earth in meters
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Maximum absolute difference, in meters, between `get_distance` and `get_distances` for the same pair
+BATCH_DISTANCE_TOLERANCE = 1e-3
+
 
 def get_distance(coords1: Tuple[float, float], coords2: Tuple[float, float]) -> float:
     """
@@ -17,13 +25,201 @@ def get_distance(coords1: Tuple[float, float], coords2: Tuple[float, float]) ->
     """
     lat1, lon1 = coords1
     lat2, lon2 = coords2
-    R = 6371000  # radius of the Earth in meters
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c  # distance in meters
+    return EARTH_RADIUS * c  # distance in meters
+
+
+def get_bounding_box(
+    coords: Tuple[float, float], radius: float
+) -> Tuple[Tuple[float, float], List[Tuple[float, float]]]:
+    """
+    Smallest latitude/longitude box containing every point within `radius` meters of `coords`.
+
+    Parameters:
+    * `coords`: `Tuple[float, float]` -- Latitude and longitude of the center, in radians
+    * `radius`: `float` -- The radius, in meters
+
+    Returns:
+    * `Tuple[Tuple[float, float], List[Tuple[float, float]]]` -- The `(min, max)` latitude range and
+    one or two `(min, max)` longitude ranges (two when the box crosses the antimeridian), in radians
+    """
+    lat, lon = coords
+    dlat = radius / EARTH_RADIUS
+    lat_range = (max(lat - dlat, -pi / 2), min(lat + dlat, pi / 2))
+
+    # A circle that reaches a pole spans every meridian
+    if dlat >= pi / 2 - abs(lat):
+        return lat_range, [(-pi, pi)]
+
+    dlon = asin(min(1.0, sin(dlat) / cos(lat)))
+    lon_min, lon_max = lon - dlon, lon + dlon
+    if lon_min < -pi:
+        return lat_range, [(lon_min + 2 * pi, pi), (-pi, lon_max)]
+    if lon_max > pi:
+        return lat_range, [(lon_min, pi), (-pi, lon_max - 2 * pi)]
+    return lat_range, [(lon_min, lon_max)]
+
+
+def geohash_encode(coords: Tuple[float, float], precision: int) -> str:
+    """
+    Geohash of the cell containing a point.
+
+    Parameters:
+    * `coords`: `Tuple[float, float]` -- Latitude and longitude of the point, in radians
+    * `precision`: `int` -- Number of characters in the geohash; 7 gives cells of about 150 m
+
+    Returns:
+    * `str` -- The geohash of the cell
+    """
+    lat, lon = degrees(coords[0]), degrees(coords[1])
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars: List[str] = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value, value_range = (lon, lon_range) if even else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            value_range[0] = middle
+        else:
+            bits = bits << 1
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """
+    Center of a geohash cell.
+
+    Returns:
+    * `Tuple[float, float]` -- Latitude and longitude of the center of the cell, in radians
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if (bits >> shift) & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return radians((lat_range[0] + lat_range[1]) / 2), radians((lon_range[0] + lon_range[1]) / 2)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Height and width of the geohash cells of a given precision.
+
+    Returns:
+    * `Tuple[float, float]` -- Latitude and longitude extent of a cell, in radians
+    """
+    bits = 5 * precision
+    return radians(180.0 / 2 ** (bits // 2)), radians(360.0 / 2 ** (bits - bits // 2))
+
+
+def geohash_cells_within(coords: Tuple[float, float], radius: float, precision: int) -> List[Tuple[str, float]]:
+    """
+    Geohash cells that have at least one point within `radius` meters of `coords`. A cell is
+    included when its center is within `radius` plus its half-diagonal, so the result may contain
+    a few cells that are just out of range, but never misses one.
+
+    Returns:
+    * `List[Tuple[str, float]]` -- `(geohash, distance)` pairs, where `distance` is from `coords`
+    to the center of the cell, in meters
+    """
+    height, width = geohash_cell_size(precision)
+    (lat_min, lat_max), lon_ranges = get_bounding_box(coords, radius + EARTH_RADIUS * sqrt(height**2 + width**2))
+    output: List[Tuple[str, float]] = []
+    row = floor((lat_min + pi / 2) / height)
+    while row * height - pi / 2 <= lat_max and row * height < pi:
+        center_lat = (row + 0.5) * height - pi / 2
+        half_diagonal = get_distance((center_lat, 0.0), (center_lat + height / 2, width / 2))
+        for lon_min, lon_max in lon_ranges:
+            col = floor((lon_min + pi) / width)
+            while col * width - pi <= lon_max and col * width < 2 * pi:
+                center = (center_lat, (col + 0.5) * width - pi)
+                distance = get_distance(center, coords)
+                if distance <= radius + half_diagonal:
+                    output.append((geohash_encode(center, precision), distance))
+                col += 1
+        row += 1
+    return output
 
 
 def are_near_enough(coords1: Tuple[float, float], coords2: Tuple[float, float]) -> bool:
     return get_distance(coords1, coords2) <= PROXIMITY_THRESHOLD
+
+
+class CoordsArray:
+    """
+    Batch of coordinates (in radians) stored as NumPy arrays, with the cosine of each latitude
+    precomputed so that repeated distance queries against the same batch only pay for the
+    origin-dependent terms.
+    """
+
+    def __init__(self, coords: Union[Sequence[Tuple[float, float]], np.ndarray]) -> None:
+        array = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.latitudes = array[:, 0]
+        self.longitudes = array[:, 1]
+        self.cos_latitudes = np.cos(self.latitudes)
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+
+def get_distances(
+    origin: Tuple[float, float],
+    coords: Union[CoordsArray, Sequence[Tuple[float, float]], np.ndarray],
+) -> np.ndarray:
+    """
+    Vectorized haversine distances from one point to a batch of points. Agrees with
+    `get_distance` to within `BATCH_DISTANCE_TOLERANCE` meters.
+
+    Parameters:
+    * `origin`: `Tuple[float, float]` -- Latitude and longitude of the origin, in radians
+    * `coords`: `CoordsArray` or sequence of `(latitude, longitude)` -- The other points, in radians
+
+    Returns:
+    * `np.ndarray` -- The distance from the origin to each point, in meters
+    """
+    if not isinstance(coords, CoordsArray):
+        coords = CoordsArray(coords)
+    lat, lon = origin
+    a = np.sin((coords.latitudes - lat) / 2) ** 2 + cos(lat) * coords.cos_latitudes * np.sin(
+        (coords.longitudes - lon) / 2
+    ) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def get_distance_matrix(
+    origins: Union[CoordsArray, Sequence[Tuple[float, float]], np.ndarray],
+    destinations: Union[CoordsArray, Sequence[Tuple[float, float]], np.ndarray],
+) -> np.ndarray:
+    """
+    Vectorized haversine distances between every origin and every destination, e.g. the cost
+    matrix of an assignment problem. Agrees with `get_distance` to within `BATCH_DISTANCE_TOLERANCE`
+    meters.
+
+    Returns:
+    * `np.ndarray` -- Matrix of distances in meters, with a row per origin and a column per destination
+    """
+    if not isinstance(origins, CoordsArray):
+        origins = CoordsArray(origins)
+    if not isinstance(destinations, CoordsArray):
+        destinations = CoordsArray(destinations)
+    a = np.sin((destinations.latitudes - origins.latitudes[:, None]) / 2) ** 2 + np.outer(
+        origins.cos_latitudes, destinations.cos_latitudes
+    ) * np.sin((destinations.longitudes - origins.longitudes[:, None]) / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
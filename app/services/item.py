@@ -0,0 +1,45 @@
+from typing_extensions import List
+
+from app.schemas.bases import IdField
+from app.schemas.item import Item, ItemCreate, ItemUpdate
+from app.storage.mappers import ItemMapper, column, select
+from app.services.mixins import EntityCRUDMixin
+from app.services.search import item_search_index
+from app.services.snapshot import restaurant_snapshot_cache
+from app.utilities import overrides
+
+
+class ItemService(EntityCRUDMixin[Item, ItemCreate, ItemUpdate, ItemMapper]):
+
+    # Hooks
+    # -----
+
+    @overrides(EntityCRUDMixin)
+    def _after_save(self, row: ItemMapper) -> None:
+        self._after_bulk_save([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_save(self, rows: List[ItemMapper]) -> None:
+        item_search_index.upsert(rows)
+        restaurant_snapshot_cache.invalidate_items(rows)
+
+    @overrides(EntityCRUDMixin)
+    def _after_import(self, ids: List[IdField]) -> None:
+        # Only an in-process search index needs the imported rows, so they are not loaded back otherwise;
+        # new items are in no cached snapshot, so only their restaurants' snapshots are stale
+        if item_search_index.needs_rows:
+            super()._after_import(ids)
+            return
+        restaurant_ids = self.db.exec(
+            select(ItemMapper.restaurant_id).where(column(ItemMapper.id).in_(ids)).distinct()
+        ).all()
+        restaurant_snapshot_cache.invalidate_restaurants(set(restaurant_ids))
+
+    @overrides(EntityCRUDMixin)
+    def _after_delete(self, row: ItemMapper) -> None:
+        self._after_bulk_delete([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_delete(self, rows: List[ItemMapper]) -> None:
+        item_search_index.remove([row.id for row in rows])
+        restaurant_snapshot_cache.invalidate_items(rows)
@@ -1,20 +1,85 @@
-from abc import ABC, abstractmethod
+from abc import ABC
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
 from datetime import datetime
 from fastapi import Depends
-from typing_extensions import Annotated, Generic, List, Optional, Type, TypeVar, get_args
+from functools import lru_cache
+from pydantic import ValidationError, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+from typing_extensions import (
+    Annotated,
+    Any,
+    ClassVar,
+    Dict,
+    FrozenSet,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    get_args,
+)
 
 
 from app.schemas.bases import EntityObjectBase, ObjectBase, IdField
-from app.services.error import NotFoundHTTPException
-from app.storage.mappers import EntityMapperBase, column, select
+from app.schemas.bulk import BulkUpdateEntry, ImportResult, ImportRowError
+from app.services.error import (
+    BadRequestHTTPException,
+    BatchHTTPException,
+    ConflictHTTPException,
+    NotFoundHTTPException,
+)
+from app.storage.mappers import EntityMapperBase, IntegrityError, column, insert, select
+from app.services.records import Record
 from app.storage.db import DBSession, new_db_session
-from app.config import API_RESOURCE_QUERY_PAGE_MAX
+from app.config import (
+    API_RESOURCE_BULK_MAX,
+    API_RESOURCE_EXPORT_BATCH_SIZE,
+    API_RESOURCE_IMPORT_CHUNK_SIZE,
+    API_RESOURCE_IMPORT_MAX_ERRORS,
+    API_RESOURCE_QUERY_PAGE_MAX,
+)
 
 
 _TEntityType = TypeVar("_TEntityType", bound=EntityObjectBase)
 _TCreateType = TypeVar("_TCreateType", bound=ObjectBase)
 _TUpdateType = TypeVar("_TUpdateType", bound=ObjectBase)
 _TMapperType = TypeVar("_TMapperType", bound=EntityMapperBase)
+_TObjectType = TypeVar("_TObjectType", bound=ObjectBase)
+
+
+class Fieldset(NamedTuple):
+    """
+    Fields of an entity to read and return (see `EntityCRUDMixin.get_fieldset`): the columns
+    selected in SQL, the relationships loaded, and the type that validates and serializes the
+    entity restricted to them, which is the entity type itself when no field is left out.
+    """
+
+    entity_type: Type[ObjectBase]
+    columns: FrozenSet[str]
+    relationships: FrozenSet[str]
+
+
+@lru_cache(maxsize=None)
+def _get_sparse_type(entity_type: Type[ObjectBase], names: FrozenSet[str]) -> Type[ObjectBase]:
+    # The entity type with only some of its fields, each validated as it is in the entity type
+    if names == set(entity_type.model_fields):
+        return entity_type
+    fields = {name: (field.annotation, field) for name, field in entity_type.model_fields.items() if name in names}
+    return create_model(f"Sparse{entity_type.__name__}", __config__=entity_type.model_config, **fields)
+
+
+def _split_names(value: Optional[str]) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
 
 
 class EntityCRUDMixin(Generic[_TEntityType, _TCreateType, _TUpdateType, _TMapperType], ABC):
@@ -42,6 +107,10 @@ class EntityCRUDMixin(Generic[_TEntityType, _TCreateType, _TUpdateType, _TMapper
     UpdateType: Type[_TUpdateType]
     MapperType: Type[_TMapperType]
 
+    # Loader options (e.g. `selectinload(...)`) applied to every select of the mapper, so that the
+    # relationships serialized by `EntityType` are loaded eagerly instead of one query per row
+    loader_options: ClassVar[Sequence[Any]] = ()
+
     # Class methods
     # -------------
 
@@ -68,6 +137,57 @@ class EntityCRUDMixin(Generic[_TEntityType, _TCreateType, _TUpdateType, _TMapper
         cls.UpdateType = type_hints[2]
         cls.MapperType = type_hints[3]
 
+    @classmethod
+    def get_fieldset(cls, *, fields: Optional[str] = None, include: Optional[str] = None) -> Fieldset:
+        """
+        Parse the sparse fieldset of a read request. `fields` lists the fields to return, columns
+        and relationships alike, and `id` is always returned; `include` lists relationships to
+        return besides. Without `fields`, every column is returned, and without either, every
+        relationship too, so that entities are returned whole.
+
+        Parameters:
+        * `fields`: `Optional[str]` -- Comma-separated names of fields of `EntityType`
+        * `include`: `Optional[str]` -- Comma-separated names of relationships of `EntityType`
+
+        Returns:
+        * `Fieldset` -- The columns and relationships to read, and the type of the entities
+        """
+        entity_fields = set(cls.EntityType.model_fields)
+        columns = entity_fields & set(cls.MapperType.__table__.columns.keys())
+        relationships = entity_fields & set(inspect(cls.MapperType).relationships.keys())
+
+        field_names = _split_names(fields)
+        include_names = _split_names(include)
+        checks = (("fields", field_names, entity_fields), ("include", include_names, relationships))
+        for parameter, names, valid in checks:
+            unknown = (names or set()) - valid
+            if unknown:
+                raise BadRequestHTTPException(
+                    f"Unknown {parameter} of {cls.EntityType.__name__}: {', '.join(sorted(unknown))}"
+                    f" (expected any of {', '.join(sorted(valid))})"
+                )
+
+        if field_names is not None:
+            columns = (field_names & columns) | {"id"}
+        if field_names is not None or include_names is not None:
+            relationships = ((field_names or set()) | (include_names or set())) & relationships
+        return Fieldset(
+            entity_type=_get_sparse_type(cls.EntityType, frozenset(columns | relationships)),
+            columns=frozenset(columns),
+            relationships=frozenset(relationships),
+        )
+
+    @classmethod
+    def encode_cursor(cls, id: IdField) -> str:
+        return urlsafe_b64encode(str(id).encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> IdField:
+        try:
+            return int(urlsafe_b64decode(cursor.encode()).decode())
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise BadRequestHTTPException(f"Invalid cursor: {cursor}")
+
     # Constructor
     # -----------
 
@@ -77,35 +197,274 @@ class EntityCRUDMixin(Generic[_TEntityType, _TCreateType, _TUpdateType, _TMapper
     # Private methods
     # ---------------
 
-    @abstractmethod
-    def _get_optional_row(self, *, id: IdField) -> Optional[_TMapperType]:
-        return self.db.exec(select(self.MapperType).where(column(self.MapperType.id) == id)).first()
-
-    @abstractmethod
-    def _get_row_or_raise(self, *, id: IdField) -> _TMapperType:
-        row = self._get_optional_row(id=id)
+    def _get_select_options(self, fieldset: Optional[Fieldset]) -> Sequence[Any]:
+        # The loader options of the relationships in the fieldset, and the columns to select, so
+        # that the fields left out are neither selected nor loaded
+        if fieldset is None:
+            return self.loader_options
+        # The path of a relationship's loader option starts with the mapper, then the relationship
+        options = [option for option in self.loader_options if option.path[1].key in fieldset.relationships]
+        if len(fieldset.columns) < len(self.MapperType.__table__.columns):
+            options.append(load_only(*(getattr(self.MapperType, name) for name in fieldset.columns)))
+        return options
+
+    def _get_optional_row(self, *, id: IdField, fieldset: Optional[Fieldset] = None) -> Optional[_TMapperType]:
+        stmt = select(self.MapperType).where(column(self.MapperType.id) == id)
+        return self.db.exec(stmt.options(*self._get_select_options(fieldset))).first()
+
+    def _get_row_or_raise(self, *, id: IdField, fieldset: Optional[Fieldset] = None) -> _TMapperType:
+        row = self._get_optional_row(id=id, fieldset=fieldset)
         if row is None:
             raise NotFoundHTTPException(self.EntityType, f" with id = {id}")
         return row
 
-    @abstractmethod
-    def _construct_entity(self, row: _TMapperType) -> _TEntityType:
-        return self.EntityType.model_validate(row)
+    def _construct_entity(self, row: _TMapperType, fieldset: Optional[Fieldset] = None) -> _TEntityType:
+        entity_type = self.EntityType if fieldset is None else fieldset.entity_type
+        return entity_type.model_validate(row)
+
+    def _construct_row(self, data: _TCreateType) -> _TMapperType:
+        return self.MapperType.model_validate(data)
+
+    def _get_rows_by_ids(self, ids: List[IdField]) -> Dict[IdField, _TMapperType]:
+        # Get all the rows in one query, reporting every missing ID by its position in the batch
+        stmt = select(self.MapperType).where(column(self.MapperType.id).in_(ids)).options(*self.loader_options)
+        rows_by_id = {row.id: row for row in self.db.exec(stmt).all()}
+        errors = [
+            {
+                "type": "not_found",
+                "loc": ["body", index],
+                "msg": f"{self.EntityType.__name__} with id = {id} not found",
+                "input": id,
+            }
+            for index, id in enumerate(ids)
+            if id not in rows_by_id
+        ]
+        if errors:
+            raise BatchHTTPException(errors)
+        return rows_by_id
+
+    def _iter_export_batches(
+        self,
+        *where: Any,
+        entity_type: Type[_TObjectType],
+        options: Sequence[Any] = (),
+        batch_size: int = API_RESOURCE_EXPORT_BATCH_SIZE,
+    ) -> Iterator[List[_TObjectType]]:
+        # Stream the rows in primary key order, `batch_size` at a time. The session only holds weak
+        # references to unmodified rows, so each batch is freed once converted and memory use does
+        # not grow with the size of the table
+        stmt = (
+            select(self.MapperType)
+            .where(*where)
+            .options(*options)
+            .order_by(column(self.MapperType.id))
+            .execution_options(yield_per=batch_size)
+        )
+        for rows in self.db.exec(stmt).partitions():
+            yield [entity_type.model_validate(row) for row in rows]
+
+    def _insert_rows(self, rows: List[_TMapperType]) -> List[IdField]:
+        # Insert the rows with a single executemany statement, getting the new IDs in order
+        values = [row.model_dump(exclude={"id"}) for row in rows]
+
+        # Reject dangling references by the index of their item, before the insert would fail
+        missing = self._find_missing_references(values)
+        if missing:
+            errors = [
+                {
+                    "type": "not_found",
+                    "loc": ["body", position, name],
+                    "msg": f"{name} = {value} not found",
+                    "input": value,
+                }
+                for position, (name, value) in sorted(missing.items())
+            ]
+            raise BatchHTTPException(errors)
+
+        stmt = insert(self.MapperType).returning(column(self.MapperType.id), sort_by_parameter_order=True)
+        try:
+            ids = self.db.exec(stmt, params=values).scalars().all()
+        except IntegrityError as error:
+            self.db.rollback()
+            raise ConflictHTTPException(f"{self.EntityType.__name__} violates a constraint: {error.orig}")
+        for row, id in zip(rows, ids):
+            row.id = id
+        return list(ids)
+
+    def _construct_import_values(self, data: _TCreateType) -> Dict[str, Any]:
+        # Column values straight from the validated record, plus the defaults of the columns it
+        # lacks (e.g. `created_at`). Building a mapper instance per record would cost several times
+        # as much as the insert itself.
+        values = data.model_dump()
+        for name, field in self.MapperType.model_fields.items():
+            if name not in values and field.default_factory is not None:
+                values[name] = field.default_factory()
+        return values
+
+    def _find_missing_references(self, values: List[Dict[str, Any]]) -> Dict[int, Tuple[str, Any]]:
+        # Check every foreign key of the rows with one query per key, so that a dangling reference
+        # rejects its own row rather than the whole transaction
+        missing: Dict[int, Tuple[str, Any]] = {}
+        for foreign_key in self.MapperType.__table__.foreign_keys:
+            name = foreign_key.parent.name
+            referenced = {row_values.get(name) for row_values in values} - {None}
+            if not referenced:
+                continue
+            stmt = select(foreign_key.column).where(foreign_key.column.in_(referenced))
+            existing = set(self.db.exec(stmt).all())
+            for position, row_values in enumerate(values):
+                value = row_values.get(name)
+                if value is not None and value not in existing:
+                    missing.setdefault(position, (name, value))
+        return missing
+
+    def _import_chunk(self, chunk: List[Tuple[int, _TCreateType]], result: ImportResult) -> None:
+        lines = [line for line, _ in chunk]
+        values = [self._construct_import_values(data) for _, data in chunk]
+
+        missing = self._find_missing_references(values)
+        for position, (name, value) in missing.items():
+            error = ImportRowError(
+                type="not_found",
+                loc=["body", lines[position], name],
+                msg=f"{name} = {value} not found",
+                input=value,
+            )
+            self._add_import_error(result, error)
+        if missing:
+            lines = [line for position, line in enumerate(lines) if position not in missing]
+            values = [row_values for position, row_values in enumerate(values) if position not in missing]
+        if not values:
+            return
+
+        self._before_import(values)
+        try:
+            # The hooks only need the set of new IDs. Asking for them in parameter order would make
+            # SQLite run one INSERT per row instead of a few multi-row ones
+            stmt = insert(self.MapperType).returning(column(self.MapperType.id))
+            ids = self.db.exec(stmt, params=values).scalars().all()
+            self._before_import_commit(list(ids))
+            self.db.commit()
+        except IntegrityError as error:
+            # Only the whole chunk can be rejected at this point
+            self.db.rollback()
+            for line in lines:
+                msg = f"Chunk violates a constraint: {error.orig}"
+                self._add_import_error(result, ImportRowError(type="conflict", loc=["body", line], msg=msg))
+            return
+
+        result.imported += len(ids)
+        self._after_import(list(ids))
+
+    def _add_import_error(self, result: ImportResult, error: ImportRowError, *, failed: bool = True) -> None:
+        result.failed += failed
+        if len(result.errors) < API_RESOURCE_IMPORT_MAX_ERRORS:
+            result.errors.append(error)
+
+    def _check_batch_size(self, size: int) -> None:
+        if size > API_RESOURCE_BULK_MAX:
+            raise BadRequestHTTPException(f"Batch of {size} exceeds the maximum of {API_RESOURCE_BULK_MAX} items")
+
+    def _commit_or_raise(self) -> None:
+        try:
+            self.db.commit()
+        except IntegrityError as error:
+            self.db.rollback()
+            raise ConflictHTTPException(f"{self.EntityType.__name__} violates a constraint: {error.orig}")
+
+    def _flush_or_raise(self) -> None:
+        # Same as `_commit_or_raise`, but leaves the transaction open, e.g. to read generated IDs
+        try:
+            self.db.flush()
+        except IntegrityError as error:
+            self.db.rollback()
+            raise ConflictHTTPException(f"{self.EntityType.__name__} violates a constraint: {error.orig}")
+
+    # Hooks
+    # -----
+
+    def _before_save_commit(self, rows: List[_TMapperType]) -> None:
+        """
+        Called with created or updated rows once they are flushed, right before their transaction is
+        committed. Subclasses override this to write derived rows that must be committed along with
+        them, so that a failure rolls back both.
+        """
+        pass
+
+    def _after_save(self, row: _TMapperType) -> None:
+        """
+        Called once a created or updated row has been committed. Subclasses override this to keep
+        derived state (indexes, caches) in sync with the table.
+        """
+        pass
+
+    def _after_delete(self, row: _TMapperType) -> None:
+        """
+        Called once the deletion of a row has been committed.
+        """
+        pass
+
+    def _after_bulk_save(self, rows: List[_TMapperType]) -> None:
+        """
+        Called once a batch of created or updated rows has been committed. Calls `_after_save`
+        for each row unless overridden with a batched equivalent.
+        """
+        for row in rows:
+            self._after_save(row)
+
+    def _before_import(self, values: List[Dict[str, Any]]) -> None:
+        """
+        Called with the column values of each chunk of imported records right before they are
+        inserted, to fill in derived columns.
+        """
+        pass
+
+    def _before_import_commit(self, ids: List[IdField]) -> None:
+        """
+        Called with the IDs of each chunk of imported records once they are inserted, right before
+        the chunk is committed. Imports skip `_before_save_commit`, since loading the new rows would
+        slow them down, so services that override it load the rows they need here.
+        """
+        pass
+
+    def _after_import(self, ids: List[IdField]) -> None:
+        """
+        Called once each chunk of imported records has been committed. Loads the new rows and
+        passes them to `_after_bulk_save`, unless overridden by a service that can do without them.
+        """
+        self._after_bulk_save(list(self._get_rows_by_ids(ids).values()))
+
+    def _after_bulk_delete(self, rows: List[_TMapperType]) -> None:
+        """
+        Called once the deletion of a batch of rows has been committed. Calls `_after_delete` for
+        each row unless overridden with a batched equivalent.
+        """
+        for row in rows:
+            self._after_delete(row)
 
     # Public methods
     # --------------
 
-    @abstractmethod
-    def get(self, *, id: IdField) -> _TEntityType:
-        # Get the row from the database by ID
-        row = self._get_row_or_raise(id=id)
-        return self._construct_entity(row)
-
-    @abstractmethod
-    def get_list(self, *, offset: Optional[int] = None, limit: Optional[int] = None) -> List[_TEntityType]:
-        # Prepare the select statement and apply the offset and limit
-        stmt = select(self.MapperType)
-        if offset is not None:
+    def get(self, *, id: IdField, fieldset: Optional[Fieldset] = None) -> _TEntityType:
+        # Get the row from the database by ID, with only the fields of the fieldset if one is given
+        row = self._get_row_or_raise(id=id, fieldset=fieldset)
+        return self._construct_entity(row, fieldset)
+
+    def get_list(
+        self,
+        *,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fieldset: Optional[Fieldset] = None,
+    ) -> List[_TEntityType]:
+        # Prepare the select statement in primary key order, so that pages are stable
+        stmt = select(self.MapperType).options(*self._get_select_options(fieldset)).order_by(column(self.MapperType.id))
+
+        # Apply the cursor (keyset pagination, served by the primary key index) or the offset
+        if cursor is not None:
+            stmt = stmt.where(column(self.MapperType.id) > self.decode_cursor(cursor))
+        elif offset is not None:
             stmt = stmt.offset(max(0, offset))
         if limit is not None:
             stmt = stmt.limit(max(0, min(limit, API_RESOURCE_QUERY_PAGE_MAX)))
@@ -114,44 +473,163 @@ class EntityCRUDMixin(Generic[_TEntityType, _TCreateType, _TUpdateType, _TMapper
         rows = self.db.exec(stmt).all()
 
         # Return a list of entities constructed from the rows
-        return [self._construct_entity(row) for row in rows]
+        return [self._construct_entity(row, fieldset) for row in rows]
+
+    def get_page(
+        self,
+        *,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fieldset: Optional[Fieldset] = None,
+    ) -> Tuple[List[_TEntityType], Optional[str]]:
+        """
+        Same as `get_list`, but also return the cursor of the next page, or `None` if this page is
+        the last one. The cursor can be passed back as `cursor` in either pagination mode.
+        """
+        entities = self.get_list(offset=offset, limit=limit, cursor=cursor, fieldset=fieldset)
+        if limit is None or not entities or len(entities) < max(0, min(limit, API_RESOURCE_QUERY_PAGE_MAX)):
+            return entities, None
+        return entities, self.encode_cursor(entities[-1].id)
 
-    @abstractmethod
     def create(self, *, data: _TCreateType) -> _TEntityType:
         # Create a new row object and commit it to the database
-        row = self.MapperType.model_validate(data)
+        row = self._construct_row(data)
         self.db.add(row)
-        self.db.commit()
+        self._flush_or_raise()
+        self._before_save_commit([row])
+        self._commit_or_raise()
         self.db.refresh(row)
+        self._after_save(row)
 
         # Return the new entity constructed from the row
         return self._construct_entity(row)
 
-    @abstractmethod
     def update(self, *, id: IdField, data: _TUpdateType) -> _TEntityType:
         # Get the row from the database
         row = self._get_row_or_raise(id=id)
 
         # Update the entity with the new values and set the `updated_at` field
-        row = row.model_copy(update=data.model_dump(exclude_unset=True))
+        row.sqlmodel_update(data.model_dump(exclude_unset=True))
         row.updated_at = datetime.now()
 
         # Commit the changes to the database
         self.db.add(row)
-        self.db.commit()
+        self._flush_or_raise()
+        self._before_save_commit([row])
+        self._commit_or_raise()
         self.db.refresh(row)
+        self._after_save(row)
 
         # Return the entity updated with the new values
         return self._construct_entity(row)
 
-    @abstractmethod
     def delete(self, id: IdField) -> _TEntityType:
         # Get the row from the database
         row = self._get_row_or_raise(id=id)
 
         # Delete the row from the database
         self.db.delete(row)
-        self.db.commit()
+        self._commit_or_raise()
+        self._after_delete(row)
 
         # Return the entity constructed from the deleted row
         return self._construct_entity(row)
+
+    def bulk_create(self, *, data: List[_TCreateType]) -> List[IdField]:
+        self._check_batch_size(len(data))
+        if not data:
+            return []
+
+        # Build all the rows first, so that nothing is written unless the whole batch is valid
+        rows = [self._construct_row(item) for item in data]
+        ids = self._insert_rows(rows)
+        self._before_save_commit(rows)
+        self._commit_or_raise()
+
+        self._after_bulk_save(rows)
+        return ids
+
+    def bulk_update(self, *, data: List[BulkUpdateEntry[_TUpdateType]]) -> List[IdField]:
+        self._check_batch_size(len(data))
+        if not data:
+            return []
+        ids = [entry.id for entry in data]
+        rows_by_id = self._get_rows_by_ids(ids)
+
+        # Update every row and commit them together
+        now = datetime.now()
+        for entry in data:
+            row = rows_by_id[entry.id]
+            row.sqlmodel_update(entry.data.model_dump(exclude_unset=True))
+            row.updated_at = now
+            self.db.add(row)
+        self._flush_or_raise()
+        self._before_save_commit(list(rows_by_id.values()))
+        self._commit_or_raise()
+
+        # Reload the committed rows in one query rather than one refresh per row
+        self._after_bulk_save(list(self._get_rows_by_ids(ids).values()))
+        return ids
+
+    def bulk_delete(self, *, ids: List[IdField]) -> List[IdField]:
+        self._check_batch_size(len(ids))
+        if not ids:
+            return []
+        rows_by_id = self._get_rows_by_ids(ids)
+
+        for row in rows_by_id.values():
+            self.db.delete(row)
+        self._commit_or_raise()
+
+        self._after_bulk_delete(list(rows_by_id.values()))
+        return ids
+
+    def import_records(
+        self,
+        records: Iterable[Tuple[int, Record]],
+        *,
+        chunk_size: int = API_RESOURCE_IMPORT_CHUNK_SIZE,
+    ) -> ImportResult:
+        """
+        Validate a stream of records (see `app.services.records`) against `CreateType` and insert
+        them, committing every `chunk_size` valid records. Invalid records are skipped and reported
+        with their line number, and the import goes on.
+
+        Records are inserted without going through `_construct_row`, so this does not suit entities
+        whose rows are more than their create values plus column defaults (e.g. users).
+
+        Parameters:
+        * `records`: `Iterable[Tuple[int, Record]]` -- Line numbers and records, parsed or not
+        * `chunk_size`: `int` -- Number of records per transaction
+
+        Returns:
+        * `ImportResult` -- Counts of imported and rejected records, and the first errors
+        """
+        result = ImportResult()
+        chunk: List[Tuple[int, _TCreateType]] = []
+        for line, record in records:
+            if isinstance(record, ValueError):
+                self._add_import_error(result, ImportRowError(type="value_error", loc=["body", line], msg=str(record)))
+                continue
+            try:
+                chunk.append((line, self.CreateType.model_validate(record)))
+            except ValidationError as error:
+                for index, details in enumerate(error.errors(include_url=False)):
+                    self._add_import_error(
+                        result,
+                        ImportRowError(
+                            type=details["type"],
+                            loc=["body", line, *details["loc"]],
+                            msg=details["msg"],
+                            input=details.get("input"),
+                        ),
+                        failed=index == 0,
+                    )
+                continue
+            if len(chunk) >= chunk_size:
+                self._import_chunk(chunk, result)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, result)
+        return result
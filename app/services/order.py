@@ -1,20 +1,358 @@
+from datetime import datetime, timedelta
 from fastapi import HTTPException, status as http_status
+from hashlib import sha256
+from typing_extensions import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
 
-from app.schemas.order import Order, OrderCreate, OrderUpdate
-from app.storage.mappers import OrderMapper, BranchMapper
+from app.schemas.bases import IdField
+from app.schemas.branch import Branch
+from app.schemas.order import Order, OrderCreate, OrderUpdate, OrderExport, OrderStatus, OrderTransition
+from app.schemas.order_item import OrderLine
+from app.storage.mappers import (
+    BranchMapper,
+    IdempotencyKeyMapper,
+    IntegrityError,
+    ItemMapper,
+    OrderItemMapper,
+    OrderMapper,
+    RiderMapper,
+    column,
+    delete,
+    select,
+    selectinload,
+    update,
+)
+from app.services.error import (
+    BadRequestHTTPException,
+    BatchHTTPException,
+    ConflictHTTPException,
+    NotFoundHTTPException,
+)
 from app.services.mixins import EntityCRUDMixin
 from app.services.geo import are_near_enough
+from app.services.events import event_broker
+from app.services.tasks import task_queue
 from app.utilities import overrides
+from app.config import IDEMPOTENCY_KEY_TTL
+
+# Statuses an order can go to from each status; delivered, rejected and cancelled orders are final
+ORDER_TRANSITIONS: Dict[OrderStatus, FrozenSet[OrderStatus]] = {
+    OrderStatus.PENDING: frozenset({OrderStatus.ACCEPTED, OrderStatus.REJECTED, OrderStatus.CANCELLED}),
+    OrderStatus.ACCEPTED: frozenset({OrderStatus.PICKEDUP, OrderStatus.CANCELLED}),
+    OrderStatus.PICKEDUP: frozenset({OrderStatus.DELIVERED}),
+    OrderStatus.DELIVERED: frozenset(),
+    OrderStatus.REJECTED: frozenset(),
+    OrderStatus.CANCELLED: frozenset(),
+}
+
+
+def order_topic(id: IdField) -> str:
+    """
+    Topic of the event broker on which the changes of an order are published, as `Order` JSON.
+    """
+    return f"order:{id}"
+
+
+OrderEffect = Callable[[Order, Optional[OrderStatus]], Any]
+
+_order_effects: Dict[OrderStatus, List[OrderEffect]] = {status: [] for status in OrderStatus}
+
+
+def on_order_status(*statuses: OrderStatus) -> Callable[[OrderEffect], OrderEffect]:
+    """
+    Register a side effect of orders reaching any of `statuses`, or any status if none is given.
+    Effects are called on the task queue once the change is committed, with the order and its
+    previous status (`None` for a new order). An effect that raises is retried, so it may run more
+    than once.
+
+    Usage:
+    ```python
+    @on_order_status(OrderStatus.ACCEPTED)
+    def assign_rider(order: Order, previous: Optional[OrderStatus]) -> None: ...
+    ```
+    """
+
+    def register(effect: OrderEffect) -> OrderEffect:
+        for status in statuses or OrderStatus:
+            _order_effects[status].append(effect)
+        return effect
+
+    return register
 
 
 class OrderService(EntityCRUDMixin[Order, OrderCreate, OrderUpdate, OrderMapper]):
+    loader_options = (selectinload(OrderMapper.item_links),)
+
+    # Hooks
+    # -----
 
     @overrides(EntityCRUDMixin)
-    def create(self, *, data: OrderCreate) -> Order:
+    def _after_delete(self, row: OrderMapper) -> None:
+        self._after_bulk_delete([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_delete(self, rows: List[OrderMapper]) -> None:
+        # The riders of deleted orders that were not over are free for the next one, as on a final transition
+        rider_ids = {row.rider_id for row in rows if row.rider_id is not None and ORDER_TRANSITIONS[row.status]}
+        if not rider_ids:
+            return
+        self.db.exec(
+            update(RiderMapper)
+            .where(column(RiderMapper.id).in_(rider_ids))
+            .values(available=True, updated_at=datetime.now())
+        )
+        self.db.commit()
+
+    # Private methods
+    # ---------------
+
+    def _get_item_prices(self, lines: List[OrderLine], restaurant_id: IdField) -> Dict[IdField, float]:
+        # Get the price of every item in one query, reporting each item that is missing or sold by
+        # another restaurant by its position in the order
+        stmt = select(ItemMapper.id, ItemMapper.price, ItemMapper.restaurant_id).where(
+            column(ItemMapper.id).in_({line.item_id for line in lines})
+        )
+        items = {id: (price, item_restaurant_id) for id, price, item_restaurant_id in self.db.exec(stmt).all()}
+        errors = []
+        for index, id in enumerate(line.item_id for line in lines):
+            if id not in items:
+                errors.append((index, id, "not_found", f"Item with id = {id} not found"))
+            elif items[id][1] != restaurant_id:
+                errors.append((index, id, "wrong_restaurant", f"Item with id = {id} is not sold by the branch"))
+        if errors:
+            raise BatchHTTPException(
+                [
+                    {"type": type, "loc": ["body", "items", index, "item_id"], "msg": msg, "input": id}
+                    for index, id, type, msg in errors
+                ]
+            )
+        return {id: price for id, (price, _) in items.items()}
+
+    def _add_order(self, data: OrderCreate) -> OrderMapper:
+        # Check the order, then add it with its items and flush, leaving the transaction open
         branch = self.db.get(BranchMapper, data.branch_id)
+        if branch is None:
+            raise NotFoundHTTPException(Branch, f" with id = {data.branch_id}")
         if not are_near_enough(branch.coords, data.coords):
             raise HTTPException(
                 status_code=http_status.HTTP_400_BAD_REQUEST,
                 detail="Order is too far from the branch",
             )
-        return super().create(data)
+
+        prices = self._get_item_prices(data.items, branch.restaurant_id)
+
+        # Merge repeated items, since an item appears at most once per order
+        lines: Dict[IdField, int] = {}
+        for line in data.items:
+            lines[line.item_id] = lines.get(line.item_id, 0) + line.quantity
+
+        row = OrderMapper(
+            **data.model_dump(exclude={"items"}),
+            status=OrderStatus.PENDING,
+            total=sum(prices[item_id] * quantity for item_id, quantity in lines.items()),
+            item_links=[
+                OrderItemMapper(item_id=item_id, quantity=quantity, price=prices[item_id])
+                for item_id, quantity in lines.items()
+            ],
+        )
+        self.db.add(row)
+        self._flush_or_raise()
+        return row
+
+    def _after_status_change(self, order: Order, previous: Optional[OrderStatus]) -> None:
+        # Push the order to its subscribers right away, and queue the side effects of its new status
+        event_broker.publish(order_topic(order.id), order.model_dump_json().encode())
+        for effect in _order_effects[order.status]:
+            task_queue.submit(effect, order, previous)
+
+    def _get_replay(self, customer_id: IdField, key: str, fingerprint: str) -> Optional[Order]:
+        # Get the order stored for a live idempotency key of the customer, forgetting the key if it has expired
+        row = self.db.get(IdempotencyKeyMapper, (customer_id, key))
+        if row is None:
+            return None
+        if row.expires_at <= datetime.now():
+            self.db.expunge(row)
+            self.db.exec(
+                delete(IdempotencyKeyMapper).where(
+                    column(IdempotencyKeyMapper.customer_id) == customer_id,
+                    column(IdempotencyKeyMapper.key) == key,
+                    column(IdempotencyKeyMapper.expires_at) <= datetime.now(),
+                )
+            )
+            self.db.commit()
+            return None
+        if row.fingerprint != fingerprint:
+            raise BadRequestHTTPException("Idempotency-Key was already used for a different request")
+        return Order.model_validate_json(row.response)
+
+    # Public methods
+    # --------------
+
+    @overrides(EntityCRUDMixin)
+    def create(self, *, data: OrderCreate) -> Order:
+        """
+        Place an order with its items: check that the branch can deliver to the order's location
+        and sells every item, price the items at their current prices and write the order and all
+        of its items in a single transaction.
+        """
+        row = self._add_order(data)
+
+        # Build the entity before committing, since committing expires the row and its items
+        entity = self._construct_entity(row)
+        self._commit_or_raise()
+        self._after_save(row)
+        self._after_status_change(entity, None)
+        return entity
+
+    def create_idempotent(self, *, key: str, data: OrderCreate) -> Tuple[Order, bool]:
+        """
+        Same as `create`, but place the order at most once per customer and idempotency key. Retries
+        of the request get the stored order back without checking it again, until the key expires. A
+        request that reuses the key with a different body, as told by a hash of the body, is rejected.
+
+        The key is inserted in the same transaction as the order, ahead of it, so a concurrent
+        duplicate blocks on the key until the first request commits, then replays its order. If
+        placing the order fails, the key is released with it and the request can be retried.
+
+        Parameters:
+        * `key`: `str` -- The `Idempotency-Key` of the request
+        * `data`: `OrderCreate` -- The order to place
+
+        Returns:
+        * `Tuple[Order, bool]` -- The order, and whether it was replayed rather than placed
+        """
+        fingerprint = sha256(data.model_dump_json().encode()).hexdigest()
+        if (replay := self._get_replay(data.customer_id, key, fingerprint)) is not None:
+            return replay, True
+
+        key_row = IdempotencyKeyMapper(
+            customer_id=data.customer_id,
+            key=key,
+            fingerprint=fingerprint,
+            expires_at=datetime.now() + timedelta(seconds=IDEMPOTENCY_KEY_TTL),
+        )
+        self.db.add(key_row)
+        try:
+            self.db.flush()
+        except IntegrityError:
+            # Another request with the key has committed in the meantime
+            self.db.rollback()
+            if (replay := self._get_replay(data.customer_id, key, fingerprint)) is not None:
+                return replay, True
+            raise ConflictHTTPException("A request with this Idempotency-Key is already being processed")
+
+        try:
+            row = self._add_order(data)
+        except Exception:
+            self.db.rollback()
+            raise
+        entity = self._construct_entity(row)
+        key_row.order_id = entity.id
+        key_row.response = entity.model_dump_json()
+        self._commit_or_raise()
+        self._after_save(row)
+        self._after_status_change(entity, None)
+        return entity, False
+
+    def transition(self, *, id: IdField, data: OrderTransition) -> Order:
+        """
+        Change the status of an order, if `ORDER_TRANSITIONS` allows it from the current status.
+        The change is written only if the order is still at the version it was read at, so of two
+        concurrent transitions one fails rather than both applying. The side effects of the new
+        status are queued, not run.
+
+        Parameters:
+        * `id`: `IdField` -- ID of the order
+        * `data`: `OrderTransition` -- The new status, and optionally the version it applies to
+
+        Returns:
+        * `Order` -- The order with its new status and version
+        """
+        row = self._get_row_or_raise(id=id)
+        version, previous = row.version, row.status
+        if data.version is not None and data.version != version:
+            raise ConflictHTTPException(f"Order with id = {id} is at version {version}, not {data.version}")
+        if data.status not in ORDER_TRANSITIONS[previous]:
+            raise ConflictHTTPException(
+                f"Order with id = {id} cannot go from {previous.value} to {data.status.value}"
+            )
+
+        result = self.db.exec(
+            update(OrderMapper)
+            .where(column(OrderMapper.id) == id, column(OrderMapper.version) == version)
+            .values(status=data.status, version=version + 1, updated_at=datetime.now())
+        )
+        if result.rowcount == 0:
+            self.db.rollback()
+            raise ConflictHTTPException(f"Order with id = {id} was changed concurrently, reload it and try again")
+
+        # The rider of an order that is over is free for the next one
+        if not ORDER_TRANSITIONS[data.status] and row.rider_id is not None:
+            self.db.exec(
+                update(RiderMapper)
+                .where(column(RiderMapper.id) == row.rider_id)
+                .values(available=True, updated_at=datetime.now())
+            )
+
+        # The update is applied to the loaded row too, so build the entity before committing
+        entity = self._construct_entity(row)
+        self._commit_or_raise()
+        self._after_status_change(entity, previous)
+        return entity
+
+    def announce_status_change(self, *, ids: List[IdField], previous: OrderStatus) -> None:
+        """
+        Publish the orders whose status was changed, from `previous`, other than by `transition`,
+        e.g. by dispatch, and queue the side effects of their new status.
+        """
+        if not ids:
+            return
+        rows = self.db.exec(
+            select(OrderMapper).where(column(OrderMapper.id).in_(ids)).options(*self.loader_options)
+        ).all()
+        for row in rows:
+            self._after_status_change(self._construct_entity(row), previous)
+
+    def purge_idempotency_keys(self) -> int:
+        """
+        Delete the idempotency keys that have expired.
+
+        Returns:
+        * `int` -- The number of keys deleted
+        """
+        result = self.db.exec(
+            delete(IdempotencyKeyMapper).where(column(IdempotencyKeyMapper.expires_at) <= datetime.now())
+        )
+        self.db.commit()
+        return result.rowcount
+
+    def export(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        status: Optional[OrderStatus] = None,
+        branch_id: Optional[int] = None,
+    ) -> Iterator[List[OrderExport]]:
+        """
+        Stream the orders, with their items, in batches of constant size.
+
+        Parameters:
+        * `since`: `Optional[datetime]` -- Only orders created at or after this time
+        * `until`: `Optional[datetime]` -- Only orders created before this time
+        * `status`: `Optional[OrderStatus]` -- Only orders with this status
+        * `branch_id`: `Optional[int]` -- Only orders placed at this branch
+
+        Returns:
+        * `Iterator[List[OrderExport]]` -- The batches of orders, in ID order
+        """
+        where = []
+        if since is not None:
+            where.append(column(OrderMapper.created_at) >= since)
+        if until is not None:
+            where.append(column(OrderMapper.created_at) < until)
+        if status is not None:
+            where.append(column(OrderMapper.status) == status)
+        if branch_id is not None:
+            where.append(column(OrderMapper.branch_id) == branch_id)
+        return self._iter_export_batches(*where, entity_type=OrderExport, options=self.loader_options)
+
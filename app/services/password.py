@@ -0,0 +1,50 @@
+from passlib.context import CryptContext
+from time import perf_counter
+from typing_extensions import List, Optional
+
+from app.config import PASSWORD_HASH_SCHEME, PASSWORD_HASH_ROUNDS, PASSWORD_DEPRECATED_SCHEMES
+
+
+def create_password_context(
+    scheme: str = PASSWORD_HASH_SCHEME,
+    rounds: Optional[int] = PASSWORD_HASH_ROUNDS,
+    deprecated_schemes: List[str] = PASSWORD_DEPRECATED_SCHEMES,
+) -> CryptContext:
+    """
+    Create the context that hashes new passwords with `scheme` at cost `rounds` (the scheme's own
+    default if not given). Hashes made with `deprecated_schemes`, or with the scheme at another
+    cost, still verify but are reported by `needs_update`, so they can be rehashed on login.
+
+    Parameters:
+    * `scheme`: `str` -- Name of a passlib hash scheme, e.g. `bcrypt` or `argon2`
+    * `rounds`: `Optional[int]` -- Cost parameter of the scheme
+    * `deprecated_schemes`: `List[str]` -- Schemes that existing hashes may still use
+
+    Returns:
+    * `CryptContext` -- The configured context
+    """
+    settings = {} if rounds is None else {f"{scheme}__rounds": rounds}
+    return CryptContext(
+        schemes=[scheme, *[name for name in deprecated_schemes if name != scheme]],
+        default=scheme,
+        deprecated="auto",
+        **settings,
+    )
+
+
+def benchmark_password_context(context: CryptContext, *, duration: float = 1.0) -> float:
+    """
+    Hash a fixed password on the current thread for about `duration` seconds.
+
+    Returns:
+    * `float` -- Hashes per second, i.e. the throughput of one core
+    """
+    count = 0
+    start = perf_counter()
+    while (elapsed := perf_counter() - start) < duration or count == 0:
+        context.hash("correct horse battery staple")
+        count += 1
+    return count / elapsed
+
+
+password_context = create_password_context()
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from threading import Lock
+from typing_extensions import Optional
+
+from app.config import PRINCIPAL_CACHE_MAX_SIZE, PRINCIPAL_CACHE_TTL
+from app.schemas.user import UserPrincipal
+from app.services.cache import TTLCache
+
+
+class PrincipalCache:
+    """
+    Cache of verified access tokens and the users they authenticate, so that authenticated
+    requests skip both decoding the JWT and looking the user up. An entry never outlives the
+    expiry of its token.
+
+    Entries of a user are invalidated whenever the user is updated or deleted. Lookups read
+    `version` before going to the database and pass it to `put`, so a principal read before an
+    invalidation is never stored after it.
+    """
+
+    def __init__(self, *, max_size: int = PRINCIPAL_CACHE_MAX_SIZE, ttl: float = PRINCIPAL_CACHE_TTL) -> None:
+        self._cache: TTLCache[str, UserPrincipal] = TTLCache("principal", max_size=max_size, ttl=ttl)
+        self._version = 0
+        self._version_lock = Lock()
+
+    # Public methods
+    # --------------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, access_token: str) -> Optional[UserPrincipal]:
+        return self._cache.get(access_token)
+
+    def put(
+        self,
+        access_token: str,
+        principal: UserPrincipal,
+        *,
+        expires_at: Optional[datetime],
+        version: int,
+    ) -> None:
+        ttl = None if expires_at is None else (expires_at - datetime.now(timezone.utc)).total_seconds()
+        with self._version_lock:
+            if version == self._version:
+                self._cache.put(access_token, principal, ttl)
+
+    def invalidate(self, access_token: str) -> None:
+        self._cache.invalidate(access_token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._version_lock:
+            self._version += 1
+            self._cache.invalidate_where(lambda _, principal: principal.id == user_id)
+
+
+principal_cache = PrincipalCache()
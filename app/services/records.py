@@ -0,0 +1,92 @@
+from codecs import getincrementaldecoder
+from csv import Error as CSVError, reader as csv_reader
+from json import JSONDecodeError, loads
+from pydantic import BaseModel
+from typing_extensions import Any, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple, Type, Union
+
+from app.schemas.bulk import RecordFormat
+
+
+Record = Union[Dict[str, Any], ValueError]
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decode a stream of UTF-8 bytes (e.g. an upload) into lines, newline included, without holding
+    more than one chunk in memory.
+    """
+    decoder = getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _parse_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, Record]]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = loads(line)
+        except JSONDecodeError as error:
+            yield line_number, ValueError(f"Invalid JSON: {error}")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, ValueError("Record must be a JSON object")
+            continue
+        yield line_number, record
+
+
+def _parse_csv(lines: Iterable[str], optional: FrozenSet[str]) -> Iterator[Tuple[int, Record]]:
+    rows = csv_reader(lines)
+    try:
+        header = next(rows)
+    except StopIteration:
+        return
+    while True:
+        try:
+            values = next(rows)
+        except StopIteration:
+            return
+        except CSVError as error:
+            yield rows.line_num, ValueError(f"Invalid CSV: {error}")
+            continue
+        if not values:
+            continue
+        if len(values) != len(header):
+            yield rows.line_num, ValueError(f"Expected {len(header)} fields, got {len(values)}")
+            continue
+        # Empty cells of optional fields are missing values, so that they take their defaults. Other
+        # empty cells are empty strings, which the schema accepts or rejects like any other value
+        yield rows.line_num, {
+            name: value for name, value in zip(header, values) if value != "" or name not in optional
+        }
+
+
+def parse_records(
+    lines: Iterable[str],
+    format: RecordFormat,
+    schema: Optional[Type[BaseModel]] = None,
+) -> Iterator[Tuple[int, Record]]:
+    """
+    Parse NDJSON lines, or CSV lines starting with a header, into records. Malformed records are
+    yielded as `ValueError`s rather than raised, so that the rest of the stream can be processed.
+
+    Parameters:
+    * `lines`: `Iterable[str]` -- Lines of the stream, e.g. from `iter_lines`
+    * `format`: `RecordFormat` -- Format of the stream
+    * `schema`: `Optional[Type[BaseModel]]` -- Schema the records are validated against. Empty CSV
+      cells of its fields that have a default are left out of the records
+
+    Returns:
+    * `Iterator[Tuple[int, Record]]` -- The line number of each record and the record, as a dict
+    """
+    if format == RecordFormat.CSV:
+        fields = schema.model_fields if schema is not None else {}
+        return _parse_csv(lines, frozenset(name for name, field in fields.items() if not field.is_required()))
+    return _parse_ndjson(lines)
@@ -1,47 +1,142 @@
-from typing_extensions import List, Tuple
+from pydantic import TypeAdapter
+from typing_extensions import Dict, List, Optional, Tuple
 
+from app.config import PROXIMITY_THRESHOLD
+from app.schemas.bases import IdField
 from app.schemas.restaurant import Branch, Restaurant, RestaurantCreate, RestaurantUpdate, RestaurantAvailable
-from app.storage.mappers import RestaurantMapper, BranchMapper, select, column
-from app.storage.db import new_db_session
+from app.storage.mappers import RestaurantMapper, BranchMapper, select, selectinload, column
 from app.services.mixins import EntityCRUDMixin
-from app.services.area import AreaService
-from app.services.geo import get_distance, are_near_enough, PROXIMITY_THRESHOLD
+from app.services.availability import availability_cache
+from app.services.geo import get_distances
+from app.services.serviceability import ServiceabilityService
+from app.services.search import item_search_index, restaurant_search_index
+from app.services.snapshot import RestaurantSnapshot, restaurant_snapshot_cache
+from app.utilities import overrides
+
+_restaurant_adapter = TypeAdapter(Restaurant)
 
 
 class RestaurantService(EntityCRUDMixin[Restaurant, RestaurantCreate, RestaurantUpdate, RestaurantMapper]):
+    loader_options = (selectinload(RestaurantMapper.branches), selectinload(RestaurantMapper.items))
 
-    def get_available_list(self, *, delivery_coords: Tuple[float, float]) -> List[RestaurantAvailable]:
+    # Hooks
+    # -----
 
-        # Get nearby areas
-        nearby_areas = AreaService(self.db).get_nearby_list(
-            coords=delivery_coords,
-            radius=PROXIMITY_THRESHOLD,
-            limit=4,
-        )
+    @overrides(EntityCRUDMixin)
+    def _after_save(self, row: RestaurantMapper) -> None:
+        availability_cache.invalidate_restaurants({row.id})
+        restaurant_snapshot_cache.invalidate_restaurants({row.id})
+        restaurant_search_index.upsert([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_save(self, rows: List[RestaurantMapper]) -> None:
+        availability_cache.invalidate_restaurants({row.id for row in rows})
+        restaurant_snapshot_cache.invalidate_restaurants({row.id for row in rows})
+        restaurant_search_index.upsert(rows)
+
+    @overrides(EntityCRUDMixin)
+    def _after_import(self, ids: List[IdField]) -> None:
+        # New restaurants have no branches yet, so no cached availability can list them, no
+        # snapshot of them can be cached yet, and only an in-process search index needs the rows
+        if restaurant_search_index.needs_rows:
+            restaurant_search_index.upsert(self._get_rows_by_ids(ids).values())
 
-        # Get restaurants from branches within nearby areas
+    @overrides(EntityCRUDMixin)
+    def _after_delete(self, row: RestaurantMapper) -> None:
+        self._after_bulk_delete([row])
+
+    @overrides(EntityCRUDMixin)
+    def _after_bulk_delete(self, rows: List[RestaurantMapper]) -> None:
+        # Branches are deleted along with their restaurant, and their serviceability entries by cascade
+        availability_cache.invalidate_restaurants({row.id for row in rows})
+        restaurant_snapshot_cache.invalidate_restaurants({row.id for row in rows})
+        restaurant_search_index.remove(row.id for row in rows)
+        item_search_index.remove(item.id for row in rows for item in row.items)
+
+    # Private methods
+    # ---------------
+
+    def _find_candidates(self, *, cell: str) -> List[RestaurantAvailable]:
+        # One entry per branch that can deliver to at least part of the cell
+        nearby = ServiceabilityService(self.db).get_cell_branch_rows(cell=cell)
+        if not nearby:
+            return []
+
+        # Get the restaurants of those branches
         restaurants_rows = self.db.exec(
-            select(RestaurantMapper)
-            .join(BranchMapper)
-            .where(column(BranchMapper.area_id).in_([area.id for area in nearby_areas]))
+            select(RestaurantMapper).where(
+                column(RestaurantMapper.id).in_({branch_row.restaurant_id for branch_row, _ in nearby})
+            )
         ).all()
+        restaurants_rows_by_id = {row.id: row for row in restaurants_rows}
 
-        # Get the closest branch for each restaurant and check if it is serviceable
         output: list[RestaurantAvailable] = []
-        for row in restaurants_rows:
-            if not row.branches:
+        for branch_row, eta in nearby:
+            row = restaurants_rows_by_id.get(branch_row.restaurant_id)
+            if row is None:
                 continue
-            closest_branch_row = min(
-                row.branches,
-                key=lambda branch: get_distance(branch.coords, delivery_coords),
-            )
-            if are_near_enough(closest_branch_row.coords, delivery_coords):
-                branch = Branch.model_validate(closest_branch_row)
-                output.append(
-                    RestaurantAvailable(
-                        **row.model_dump(exclude={"branches"}),
-                        branch=branch,
-                    )
+            branch = Branch.model_validate(branch_row)
+            output.append(
+                RestaurantAvailable(
+                    **row.model_dump(exclude={"branches"}),
+                    branch=branch,
+                    eta=eta,
                 )
+            )
 
         return output
+
+    def _select_available(
+        self, candidates: List[RestaurantAvailable], *, delivery_coords: Tuple[float, float]
+    ) -> List[RestaurantAvailable]:
+        # Keep the closest branch of each restaurant within delivery range, closest first
+        if not candidates:
+            return []
+        distances = get_distances(delivery_coords, [candidate.branch.coords for candidate in candidates])
+        output: Dict[int, RestaurantAvailable] = {}
+        for i in distances.argsort(kind="stable"):
+            if distances[i] > PROXIMITY_THRESHOLD:
+                break
+            output.setdefault(candidates[i].id, candidates[i])
+        return list(output.values())
+
+    # Public methods
+    # --------------
+
+    def get_cached_snapshot(self, *, id: IdField) -> Optional[RestaurantSnapshot]:
+        """
+        Get the restaurant with its branches and items, serialized to JSON, if the snapshot cache
+        has it, without touching the database.
+        """
+        return restaurant_snapshot_cache.get(id)
+
+    def load_snapshot(self, *, id: IdField) -> RestaurantSnapshot:
+        """
+        Load the restaurant with its branches and items and serialize it to JSON, caching the
+        snapshot until the restaurant is written to.
+
+        Returns:
+        * `RestaurantSnapshot` -- The serialized restaurant and its ETag
+        """
+        version = restaurant_snapshot_cache.version
+        restaurant = self.get(id=id)
+        snapshot = RestaurantSnapshot.from_content(
+            _restaurant_adapter.dump_json(restaurant),
+            branch_ids=[branch.id for branch in restaurant.branches],
+            item_ids=[item.id for item in restaurant.items],
+        )
+        restaurant_snapshot_cache.put(id, snapshot, version=version)
+        return snapshot
+
+    def get_available_list(self, *, delivery_coords: Tuple[float, float]) -> List[RestaurantAvailable]:
+        # Candidates are shared by every customer in the delivery location's cell, then filtered exactly
+        cell = availability_cache.get_cell(delivery_coords)
+        if not availability_cache.enabled:
+            candidates = self._find_candidates(cell=cell)
+        else:
+            version = availability_cache.version
+            candidates = availability_cache.get(cell)
+            if candidates is None:
+                candidates = self._find_candidates(cell=cell)
+                availability_cache.put(cell, candidates, version=version)
+        return self._select_available(candidates, delivery_coords=delivery_coords)
@@ -0,0 +1,7 @@
+from app.schemas.rider import Rider, RiderCreate, RiderUpdate
+from app.storage.mappers import RiderMapper
+from app.services.mixins import EntityCRUDMixin
+
+
+class RiderService(EntityCRUDMixin[Rider, RiderCreate, RiderUpdate, RiderMapper]):
+    pass
@@ -0,0 +1,488 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from fastapi import Depends
+from heapq import merge
+import re
+from sqlalchemy import bindparam
+from threading import RLock
+from typing_extensions import Annotated, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple, Type
+from unicodedata import combining, normalize
+
+from app.config import API_RESOURCE_QUERY_PAGE_MAX, SEARCH_CANDIDATES, SEARCH_INDEX, SearchIndexKind
+from app.schemas.search import ItemSearchResult, RestaurantSearchResult
+from app.storage.mappers import EntityMapperBase, ItemMapper, RestaurantMapper, column, select, sqltext
+from app.storage.db import DBSession, new_db_session
+from app.services.serviceability import ServiceabilityService
+
+_token_pattern = re.compile(r"[^\W_]+")
+
+# Rows are keyed by the length of their name in the high bits and their id in the low 32 bits, so
+# that walking a token's rows in key order gives the shortest names first
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+# Weight of a match in the name relative to one in the description, and the BM25 parameters
+_NAME_WEIGHT = 5.0
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into the tokens it is indexed by, as SQLite's `unicode61 remove_diacritics 2`
+    tokenizer does: runs of letters and digits, in lowercase and without diacritics.
+    """
+    if not text.isascii():
+        text = "".join(char for char in normalize("NFKD", text) if not combining(char))
+    return _token_pattern.findall(text.lower())
+
+
+def _get_key(name: str, id: int) -> int:
+    return len(name) << _ID_BITS | id
+
+
+class SearchIndex(ABC):
+    """
+    Full-text index over the names and descriptions of a table, giving the rows that match a query
+    in key order: shortest name first, then by id. Finding the first few matches in that order
+    stops as soon as they are found, however many rows match, so the cost of a query is bounded.
+    """
+
+    def __init__(self, mapper_type: Type[EntityMapperBase]) -> None:
+        self.mapper_type = mapper_type
+
+    @property
+    def needs_rows(self) -> bool:
+        """
+        Whether the index must be given the rows written through `upsert` and `remove`.
+        """
+        return False
+
+    @abstractmethod
+    def find(
+        self,
+        db: DBSession,
+        tokens: List[str],
+        *,
+        prefix: bool,
+        names_only: bool,
+        restaurant_ids: Optional[Set[int]],
+        limit: int,
+    ) -> List[int]:
+        """
+        Find the first `limit` rows, in key order, that contain every token in their name, or in
+        their name or description. With `prefix`, the last token also matches the tokens it is a
+        prefix of. With `restaurant_ids`, only the rows of those restaurants are found.
+
+        The rows may include a few that do not contain a long prefix, so the caller checks them.
+
+        Returns:
+        * `List[int]` -- The ids of the rows
+        """
+        pass
+
+    @abstractmethod
+    def rebuild(self, db: DBSession) -> int:
+        """
+        Reindex every row of the table.
+
+        Returns:
+        * `int` -- The number of rows indexed
+        """
+        pass
+
+    def upsert(self, rows: Iterable[EntityMapperBase]) -> None:
+        pass
+
+    def remove(self, ids: Iterable[int]) -> None:
+        pass
+
+
+class FTS5SearchIndex(SearchIndex):
+    """
+    SQLite FTS5 tables named after the table with a `_search` suffix, over the name and
+    description, and a `_name_search` suffix, over the name alone, created by the migrations along
+    with the triggers that keep them in sync with every write to the table, so they need not be
+    told about writes. Names have a table of their own because filtering matches by column takes
+    reading the position of every occurrence of the tokens, many times slower on common tokens.
+    """
+
+    # Longest prefix the tables index; longer prefixes are cut to it, and the rows checked afterwards
+    max_prefix = 6
+
+    def __init__(self, mapper_type: Type[EntityMapperBase]) -> None:
+        super().__init__(mapper_type)
+        self.table = mapper_type.__tablename__
+        self.index = f"{self.table}_search"
+        self.name_index = f"{self.table}_name_search"
+
+    def find(
+        self,
+        db: DBSession,
+        tokens: List[str],
+        *,
+        prefix: bool,
+        names_only: bool,
+        restaurant_ids: Optional[Set[int]],
+        limit: int,
+    ) -> List[int]:
+        # Tokens are letters and digits only, so they are safe to quote
+        terms = [f'"{token}"' for token in tokens]
+        if prefix:
+            terms[-1] = f'"{tokens[-1][: self.max_prefix]}"*'
+        index = self.name_index if names_only else self.index
+        statement = f"SELECT rowid FROM {index} WHERE {index} MATCH :expression"
+        params = {"expression": " ".join(terms), "limit": limit}
+        if restaurant_ids is not None:
+            if self.mapper_type is RestaurantMapper:
+                statement += f" AND (rowid & {_ID_MASK}) IN :restaurant_ids"
+            else:
+                statement += (
+                    f" AND (rowid & {_ID_MASK}) IN (SELECT id FROM {self.table} WHERE restaurant_id IN :restaurant_ids)"
+                )
+            params["restaurant_ids"] = list(restaurant_ids)
+        query = sqltext(statement + " ORDER BY rowid LIMIT :limit")
+        if restaurant_ids is not None:
+            query = query.bindparams(bindparam("restaurant_ids", expanding=True))
+        return [rowid & _ID_MASK for rowid in db.execute(query, params).scalars()]
+
+    def rebuild(self, db: DBSession) -> int:
+        for index, columns in ((self.index, "name, description"), (self.name_index, "name")):
+            db.execute(sqltext(f"INSERT INTO {index} ({index}) VALUES ('delete-all')"))
+            result = db.execute(
+                sqltext(
+                    f"INSERT INTO {index} (rowid, {columns}) "
+                    f"SELECT length(name) * {1 << _ID_BITS} + id, {columns} FROM {self.table}"
+                )
+            )
+        db.commit()
+        return result.rowcount
+
+
+class _Document(NamedTuple):
+    key: int
+    name_tokens: FrozenSet[str]
+    tokens: FrozenSet[str]  # of the name and the description
+    restaurant_id: int
+
+
+class MemorySearchIndex(SearchIndex):
+    """
+    In-process inverted index, for databases without a full-text index of their own. Each token
+    maps to the keys of the rows that contain it, kept sorted.
+
+    The index is built lazily from the database on first use, and kept up to date by the CRUD
+    services through `upsert` and `remove`. Each worker process holds its own index.
+    """
+
+    def __init__(self, mapper_type: Type[EntityMapperBase]) -> None:
+        super().__init__(mapper_type)
+        self._documents: Dict[int, _Document] = {}
+        self._name_postings: Dict[str, List[int]] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._tokens: List[str] = []  # tokens of `_postings`, sorted to find those starting with a prefix
+        self._built = False
+        self._lock = RLock()
+
+    # Private methods
+    # ---------------
+
+    def _get_restaurant_id(self, row: EntityMapperBase) -> int:
+        return row.id if self.mapper_type is RestaurantMapper else row.restaurant_id
+
+    def _insert(self, id: int, name: str, description: str, restaurant_id: int) -> None:
+        name_tokens = frozenset(tokenize(name))
+        tokens = name_tokens | frozenset(tokenize(description))
+        document = _Document(_get_key(name, id), name_tokens, tokens, restaurant_id)
+        self._documents[id] = document
+        for token in document.name_tokens:
+            insort(self._name_postings.setdefault(token, []), document.key)
+        for token in document.tokens:
+            if token not in self._postings:
+                self._postings[token] = []
+                insort(self._tokens, token)
+            insort(self._postings[token], document.key)
+
+    def _discard(self, id: int) -> None:
+        document = self._documents.pop(id, None)
+        if document is None:
+            return
+        for token in document.name_tokens:
+            self._discard_key(self._name_postings, token, document.key)
+        for token in document.tokens:
+            if self._discard_key(self._postings, token, document.key):
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    @staticmethod
+    def _discard_key(postings: Dict[str, List[int]], token: str, key: int) -> bool:
+        # Returns whether no row contains the token any more
+        keys = postings[token]
+        del keys[bisect_left(keys, key)]
+        if keys:
+            return False
+        del postings[token]
+        return True
+
+    def _get_completions(self, prefix: str) -> List[str]:
+        completions = []
+        position = bisect_left(self._tokens, prefix)
+        while position < len(self._tokens) and self._tokens[position].startswith(prefix):
+            completions.append(self._tokens[position])
+            position += 1
+        return completions
+
+    # Public methods
+    # --------------
+
+    @property
+    def needs_rows(self) -> bool:
+        # Until the index is built, the build reads the rows from the table anyway
+        return self._built
+
+    def ensure_built(self, db: DBSession) -> "MemorySearchIndex":
+        if not self._built:
+            self.rebuild(db)
+        return self
+
+    def rebuild(self, db: DBSession) -> int:
+        restaurant_id = self.mapper_type.id if self.mapper_type is RestaurantMapper else self.mapper_type.restaurant_id
+        rows = db.exec(select(self.mapper_type.id, self.mapper_type.name, self.mapper_type.description, restaurant_id))
+        with self._lock:
+            self._documents.clear()
+            self._name_postings.clear()
+            self._postings.clear()
+            self._tokens.clear()
+            # Inserted in key order, every insertion appends to the postings
+            for row in sorted(rows, key=lambda row: _get_key(row[1], row[0])):
+                self._insert(*row)
+            self._built = True
+            return len(self._documents)
+
+    def upsert(self, rows: Iterable[EntityMapperBase]) -> None:
+        with self._lock:
+            if not self._built:
+                return
+            for row in rows:
+                self._discard(row.id)
+                self._insert(row.id, row.name, row.description, self._get_restaurant_id(row))
+
+    def remove(self, ids: Iterable[int]) -> None:
+        with self._lock:
+            for id in ids:
+                self._discard(id)
+
+    def find(
+        self,
+        db: DBSession,
+        tokens: List[str],
+        *,
+        prefix: bool,
+        names_only: bool,
+        restaurant_ids: Optional[Set[int]],
+        limit: int,
+    ) -> List[int]:
+        self.ensure_built(db)
+        with self._lock:
+            postings = self._name_postings if names_only else self._postings
+            # The keys of the rows containing each token, in one list per token that it matches
+            matches: List[List[List[int]]] = []
+            for position, token in enumerate(tokens):
+                if prefix and position == len(tokens) - 1:
+                    completions = self._get_completions(token)
+                    keys = [postings[completion] for completion in completions if completion in postings]
+                else:
+                    keys = [postings[token]] if token in postings else []
+                if not keys:
+                    return []
+                matches.append(keys)
+
+            # Walk the rows of the rarest token in key order, checking the other tokens on each row,
+            # until enough rows are found
+            rarest = min(range(len(tokens)), key=lambda position: sum(map(len, matches[position])))
+            checks = [
+                (token, prefix and position == len(tokens) - 1)
+                for position, token in enumerate(tokens)
+                if position != rarest
+            ]
+            ids: List[int] = []
+            previous_key = None
+            for key in merge(*matches[rarest]):
+                # Rows containing several completions of a prefix come up once for each
+                if key == previous_key:
+                    continue
+                previous_key = key
+                document = self._documents[key & _ID_MASK]
+                if restaurant_ids is not None and document.restaurant_id not in restaurant_ids:
+                    continue
+                document_tokens = document.name_tokens if names_only else document.tokens
+                if all(
+                    any(document_token.startswith(token) for document_token in document_tokens)
+                    if is_prefix
+                    else token in document_tokens
+                    for token, is_prefix in checks
+                ):
+                    ids.append(key & _ID_MASK)
+                    if len(ids) == limit:
+                        break
+            return ids
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+def create_search_index(mapper_type: Type[EntityMapperBase], kind: SearchIndexKind = SEARCH_INDEX) -> SearchIndex:
+    """
+    Create the search index configured by `SEARCH_INDEX` over a table.
+    """
+    if kind == SearchIndexKind.FTS5:
+        return FTS5SearchIndex(mapper_type)
+    if kind == SearchIndexKind.MEMORY:
+        return MemorySearchIndex(mapper_type)
+    raise ValueError(f"Unknown search index: {kind}")
+
+
+item_search_index = create_search_index(ItemMapper)
+restaurant_search_index = create_search_index(RestaurantMapper)
+
+
+def _saturate(frequency: int, length: int, average_length: float) -> float:
+    # BM25's weight of a token that occurs `frequency` times in a field of `length` tokens
+    if frequency == 0:
+        return 0.0
+    norm = 1 - _BM25_B + _BM25_B * length / max(average_length, 1.0)
+    return frequency * (_BM25_K1 + 1) / (frequency + _BM25_K1 * norm)
+
+
+class SearchService:
+    """
+    Full-text search of items and restaurants by name and description, with prefix matching of the
+    last word for autocompletion.
+
+    A query takes the first `SEARCH_CANDIDATES` matches from the search index, in the index's key
+    order (matches in the name first, then in the name or description), then ranks them by BM25,
+    with matches in the name weighing more. The candidates all contain every word of the query, so
+    BM25 is applied without its inverse document frequency, which would take counting every match.
+    Ranking is exact whenever a query has no more matches than candidates, and otherwise favors
+    short names, which match a query more closely.
+    """
+
+    # Constructor
+    # -----------
+
+    def __init__(self, db: Annotated[DBSession, Depends(new_db_session)]) -> None:
+        self.db = db
+
+    # Private methods
+    # ---------------
+
+    def _search(
+        self,
+        index: SearchIndex,
+        query: str,
+        *,
+        limit: int,
+        prefix: bool,
+        coords: Optional[Tuple[float, float]],
+    ) -> List[Tuple[EntityMapperBase, float]]:
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        restaurant_ids = None
+        if coords is not None:
+            nearby = ServiceabilityService(self.db).get_nearby_branch_rows(coords=coords)
+            restaurant_ids = {branch_row.restaurant_id for branch_row, _, _ in nearby}
+            if not restaurant_ids:
+                return []
+
+        # In key order, a match in the description of a short name comes before one in the name of
+        # a long name, so matches in the name are taken first
+        find_options = dict(prefix=prefix, restaurant_ids=restaurant_ids, limit=SEARCH_CANDIDATES)
+        ids = index.find(self.db, tokens, names_only=True, **find_options)
+        if len(ids) < SEARCH_CANDIDATES:
+            found = set(ids)
+            ids += [id for id in index.find(self.db, tokens, names_only=False, **find_options) if id not in found]
+        if not ids:
+            return []
+
+        mapper_type = index.mapper_type
+        rows_by_id = {row.id: row for row in self.db.exec(select(mapper_type).where(column(mapper_type.id).in_(ids)))}
+        rows = [rows_by_id[id] for id in ids if id in rows_by_id]
+        fields = [(tokenize(row.name), tokenize(row.description)) for row in rows]
+        average_name_length = sum(len(name) for name, _ in fields) / len(fields)
+        average_description_length = sum(len(description) for _, description in fields) / len(fields)
+
+        scored: List[Tuple[EntityMapperBase, float]] = []
+        for row, (name, description) in zip(rows, fields):
+            score = 0.0
+            for position, token in enumerate(tokens):
+                if prefix and position == len(tokens) - 1:
+                    name_frequency = sum(word.startswith(token) for word in name)
+                    description_frequency = sum(word.startswith(token) for word in description)
+                else:
+                    name_frequency = name.count(token)
+                    description_frequency = description.count(token)
+                # Only possible for a prefix longer than the index's longest
+                if name_frequency == 0 and description_frequency == 0:
+                    break
+                score += _NAME_WEIGHT * _saturate(name_frequency, len(name), average_name_length)
+                score += _saturate(description_frequency, len(description), average_description_length)
+            else:
+                scored.append((row, score))
+
+        # Ties keep the order of the index
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[: max(0, min(limit, API_RESOURCE_QUERY_PAGE_MAX))]
+
+    # Public methods
+    # --------------
+
+    def search_items(
+        self,
+        *,
+        query: str,
+        limit: int = 10,
+        prefix: bool = True,
+        coords: Optional[Tuple[float, float]] = None,
+    ) -> List[ItemSearchResult]:
+        """
+        Search items by name and description.
+
+        Parameters:
+        * `query`: `str` -- Words the items must all contain
+        * `limit`: `int` -- Maximum number of items returned
+        * `prefix`: `bool` -- Whether the last word also matches the words it is a prefix of
+        * `coords`: `Optional[Tuple[float, float]]` -- If given, only items of restaurants that
+        deliver to these coordinates are found
+
+        Returns:
+        * `List[ItemSearchResult]` -- The items, most relevant first
+        """
+        return [
+            ItemSearchResult(**row.model_dump(), score=score)
+            for row, score in self._search(item_search_index, query, limit=limit, prefix=prefix, coords=coords)
+        ]
+
+    def search_restaurants(
+        self,
+        *,
+        query: str,
+        limit: int = 10,
+        prefix: bool = True,
+        coords: Optional[Tuple[float, float]] = None,
+    ) -> List[RestaurantSearchResult]:
+        """
+        Search restaurants by name and description, as `search_items` does items.
+        """
+        return [
+            RestaurantSearchResult(**row.model_dump(), score=score)
+            for row, score in self._search(restaurant_search_index, query, limit=limit, prefix=prefix, coords=coords)
+        ]
+
+    def rebuild(self) -> int:
+        """
+        Reindex every item and restaurant, e.g. after restoring a backup without its search tables.
+
+        Returns:
+        * `int` -- The number of rows indexed
+        """
+        return item_search_index.rebuild(self.db) + restaurant_search_index.rebuild(self.db)
@@ -0,0 +1,117 @@
+from fastapi import Depends
+from typing_extensions import Annotated, Dict, List, Optional, Tuple
+
+from app.config import PROXIMITY_THRESHOLD, SERVICEABILITY_GEOHASH_PRECISION
+from app.storage.mappers import BranchMapper, ServiceabilityMapper, column, delete, insert, select
+from app.storage.db import DBSession, new_db_session
+from app.services.availability import availability_cache
+from app.services.geo import geohash_cells_within, geohash_encode, get_distances
+from app.services.eta import EtaModel, EtaService
+
+
+class ServiceabilityService:
+    """
+    Maintains the `serviceability` table, which maps each delivery cell to the branches within
+    `PROXIMITY_THRESHOLD` of it, so that finding the branches that can deliver to a location is a
+    single indexed lookup followed by an exact distance check on a handful of rows. Each entry also
+    holds the estimated delivery time from the branch to the cell, kept up to date by `EtaService`.
+
+    Branch writes update the table in the same transaction as the branch. After changing
+    `PROXIMITY_THRESHOLD` or `SERVICEABILITY_GEOHASH_PRECISION`, run
+    `python -m app.cli rebuild-serviceability`.
+    """
+
+    precision = SERVICEABILITY_GEOHASH_PRECISION
+
+    # Constructor
+    # -----------
+
+    def __init__(self, db: Annotated[DBSession, Depends(new_db_session)]) -> None:
+        self.db = db
+
+    # Private methods
+    # ---------------
+
+    def _get_cell_rows(self, branch_row: BranchMapper, eta_models: Dict[Optional[int], EtaModel]) -> List[dict]:
+        if branch_row.area_id not in eta_models:
+            eta_models[branch_row.area_id] = EtaService(self.db).get_model(branch_row.area_id)
+        base, pace = eta_models[branch_row.area_id]
+        return [
+            {"cell": cell, "branch_id": branch_row.id, "distance": distance, "eta": base + pace * distance}
+            for cell, distance in geohash_cells_within(branch_row.coords, PROXIMITY_THRESHOLD, self.precision)
+        ]
+
+    # Public methods
+    # --------------
+
+    def get_cell_branch_rows(self, *, cell: str) -> List[Tuple[BranchMapper, Optional[float]]]:
+        """
+        Find the branches that can deliver to at least part of a cell, so a superset of the branches
+        that can deliver to any location in it.
+
+        Returns:
+        * `List[Tuple[BranchMapper, Optional[float]]]` -- `(branch, eta)` pairs, with the estimated
+        delivery time to the cell in seconds if known
+        """
+        return self.db.exec(
+            select(BranchMapper, ServiceabilityMapper.eta)
+            .join(ServiceabilityMapper, column(ServiceabilityMapper.branch_id) == column(BranchMapper.id))
+            .where(column(ServiceabilityMapper.cell) == cell)
+        ).all()
+
+    def get_nearby_branch_rows(
+        self, *, coords: Tuple[float, float]
+    ) -> List[Tuple[BranchMapper, float, Optional[float]]]:
+        """
+        Find the branches that can deliver to `coords`.
+
+        Returns:
+        * `List[Tuple[BranchMapper, float, Optional[float]]]` -- `(branch, distance, eta)` triples,
+        closest first, with the estimated delivery time in seconds if known
+        """
+        rows = self.get_cell_branch_rows(cell=geohash_encode(coords, self.precision))
+        if not rows:
+            return []
+
+        # Cells are matched by their closest point, so check the exact distance of each candidate
+        distances = get_distances(coords, [row.coords for row, _ in rows])
+        output = [
+            (row, float(distance), eta)
+            for (row, eta), distance in zip(rows, distances)
+            if distance <= PROXIMITY_THRESHOLD
+        ]
+        output.sort(key=lambda pair: pair[1])
+        return output
+
+    def update_branches(self, branch_rows: List[BranchMapper]) -> None:
+        """
+        Rewrite the entries of created or moved branches. Does not commit, so that the entries are
+        committed along with the branches; deleted branches lose theirs by cascade.
+        """
+        branch_ids = [branch_row.id for branch_row in branch_rows]
+        self.db.exec(delete(ServiceabilityMapper).where(column(ServiceabilityMapper.branch_id).in_(branch_ids)))
+        eta_models: Dict[Optional[int], EtaModel] = {}
+        cell_rows = [
+            cell_row for branch_row in branch_rows for cell_row in self._get_cell_rows(branch_row, eta_models)
+        ]
+        if cell_rows:
+            self.db.exec(insert(ServiceabilityMapper), params=cell_rows)
+
+    def rebuild(self) -> int:
+        """
+        Recompute the whole table from the `branch` table in one transaction.
+
+        Returns:
+        * `int` -- The number of cell-to-branch entries written
+        """
+        self.db.exec(delete(ServiceabilityMapper))
+        count = 0
+        eta_models: Dict[Optional[int], EtaModel] = {}
+        for branch_row in self.db.exec(select(BranchMapper)).all():
+            cell_rows = self._get_cell_rows(branch_row, eta_models)
+            if cell_rows:
+                self.db.exec(insert(ServiceabilityMapper), params=cell_rows)
+                count += len(cell_rows)
+        self.db.commit()
+        availability_cache.clear()
+        return count
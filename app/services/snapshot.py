@@ -0,0 +1,130 @@
+from hashlib import blake2b
+from threading import Lock
+from typing_extensions import Callable, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from app.config import (
+    RESTAURANT_SNAPSHOT_CACHE_MAX_BYTES,
+    RESTAURANT_SNAPSHOT_CACHE_MAX_SIZE,
+    RESTAURANT_SNAPSHOT_CACHE_TTL,
+)
+from app.storage.mappers import BranchMapper, ItemMapper
+from app.services.cache import TTLCache
+
+
+class RestaurantSnapshot(NamedTuple):
+    """
+    A restaurant with its branches and items, serialized to JSON once for every request that reads it
+    """
+
+    content: bytes
+    etag: str
+    branch_ids: FrozenSet[int]
+    item_ids: FrozenSet[int]
+
+    @classmethod
+    def from_content(
+        cls, content: bytes, *, branch_ids: Iterable[int], item_ids: Iterable[int]
+    ) -> "RestaurantSnapshot":
+        # A strong validator: a hash of the exact bytes, so every process gives the same content the same tag
+        etag = f'"{blake2b(content, digest_size=16).hexdigest()}"'
+        return cls(content, etag, frozenset(branch_ids), frozenset(item_ids))
+
+
+class RestaurantSnapshotCache:
+    """
+    Cache of serialized restaurants, keyed by restaurant id and bounded by entry count and by the
+    total size of the snapshots, so that reading a restaurant's menu (and revalidating it with its
+    ETag) costs no query and no serialization until it changes.
+
+    Entries are invalidated by the writes that can change them:
+
+    * the restaurant is updated or deleted
+    * a branch or item of the restaurant is created, updated or deleted, including a branch or item
+      that moves to another restaurant, which invalidates both restaurants
+    * an area of a branch of the restaurant is deleted, as the branch loses its `area_id`
+
+    Every invalidation bumps `version`. Reads take `version` before going to the database and pass
+    it to `put`, so a snapshot read before a write is never stored after it. Writes made by other
+    processes show once the entry expires.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int = RESTAURANT_SNAPSHOT_CACHE_MAX_SIZE,
+        max_bytes: int = RESTAURANT_SNAPSHOT_CACHE_MAX_BYTES,
+        ttl: float = RESTAURANT_SNAPSHOT_CACHE_TTL,
+    ) -> None:
+        self._cache: TTLCache[int, RestaurantSnapshot] = TTLCache(
+            "restaurant_snapshot",
+            max_size=max_size,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            get_size=lambda snapshot: len(snapshot.content),
+        )
+        self._version = 0
+        self._version_lock = Lock()
+
+    # Private methods
+    # ---------------
+
+    def _invalidate_where(self, predicate: Callable[[int, RestaurantSnapshot], bool]) -> None:
+        with self._version_lock:
+            self._version += 1
+            self._cache.invalidate_where(predicate)
+
+    # Public methods
+    # --------------
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, restaurant_id: int) -> Optional[RestaurantSnapshot]:
+        return self._cache.get(restaurant_id)
+
+    def put(self, restaurant_id: int, snapshot: RestaurantSnapshot, *, version: int) -> None:
+        with self._version_lock:
+            if version == self._version:
+                self._cache.put(restaurant_id, snapshot)
+
+    def invalidate_restaurants(self, restaurant_ids: Set[int]) -> None:
+        self._invalidate_where(lambda restaurant_id, _: restaurant_id in restaurant_ids)
+
+    def invalidate_branches(self, rows: List[BranchMapper]) -> None:
+        """
+        Invalidate the entries of the restaurants of the branches, and the entries listing the
+        branches, which belong to another restaurant if the branches were moved.
+        """
+        restaurant_ids = {row.restaurant_id for row in rows}
+        branch_ids = {row.id for row in rows}
+
+        def is_affected(restaurant_id: int, snapshot: RestaurantSnapshot) -> bool:
+            return restaurant_id in restaurant_ids or not branch_ids.isdisjoint(snapshot.branch_ids)
+
+        self._invalidate_where(is_affected)
+
+    def invalidate_items(self, rows: List[ItemMapper]) -> None:
+        """
+        Invalidate the entries of the restaurants of the items, and the entries listing the items,
+        which belong to another restaurant if the items were moved.
+        """
+        restaurant_ids = {row.restaurant_id for row in rows}
+        item_ids = {row.id for row in rows}
+
+        def is_affected(restaurant_id: int, snapshot: RestaurantSnapshot) -> bool:
+            return restaurant_id in restaurant_ids or not item_ids.isdisjoint(snapshot.item_ids)
+
+        self._invalidate_where(is_affected)
+
+    def clear(self) -> None:
+        with self._version_lock:
+            self._version += 1
+            self._cache.clear()
+
+
+restaurant_snapshot_cache = RestaurantSnapshotCache()
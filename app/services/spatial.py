@@ -0,0 +1,168 @@
+from math import asin, ceil, cos, floor, pi, sin
+from threading import RLock
+from time import monotonic
+from typing_extensions import Dict, List, Optional, Sequence, Tuple, Type
+
+from app.config import SPATIAL_INDEX_CELL_SIZE, SPATIAL_INDEX_TTL
+from app.storage.mappers import AreaMapper, EntityMapperBase, select
+from app.storage.db import DBSession
+from app.services.geo import EARTH_RADIUS, get_distances
+
+
+_Coords = Tuple[float, float]
+_Cell = Tuple[int, int]
+
+
+class SpatialIndex:
+    """
+    In-process grid index over the coordinates (in radians) of a locatable table. The sphere is
+    split into cells of roughly `cell_size` meters, so nearest-neighbour queries, e.g. to put an
+    imported branch in its area, only look at the cells that can contain a match instead of scanning
+    the whole table.
+
+    The index is built lazily from the database on first use, and kept up to date by the CRUD
+    services through `upsert` and `remove`. Each worker process holds its own index and only sees
+    its own writes, so the index is reloaded from the table once it is older than `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        mapper_type: Type[EntityMapperBase],
+        *,
+        cell_size: float = SPATIAL_INDEX_CELL_SIZE,
+        ttl: float = SPATIAL_INDEX_TTL,
+    ) -> None:
+        self.mapper_type = mapper_type
+        self.ttl = ttl
+        self._lat_step = cell_size / EARTH_RADIUS
+        self._lon_cols = max(1, ceil(2 * pi / self._lat_step))
+        self._lon_step = 2 * pi / self._lon_cols
+        self._cells: Dict[_Cell, Dict[int, _Coords]] = {}
+        self._points: Dict[int, _Coords] = {}
+        self._built_at: Optional[float] = None
+        self._lock = RLock()
+
+    # Private methods
+    # ---------------
+
+    def _row(self, lat: float) -> int:
+        return floor((lat + pi / 2) / self._lat_step)
+
+    def _col(self, lon: float) -> int:
+        return floor((lon + pi) / self._lon_step) % self._lon_cols
+
+    def _cell(self, coords: _Coords) -> _Cell:
+        return self._row(coords[0]), self._col(coords[1])
+
+    def _candidate_cells(self, coords: _Coords, radius: float) -> Tuple[range, Sequence[int]]:
+        # Rows and columns of the cells that can hold points within `radius` of `coords`
+        lat, lon = coords
+        dlat = radius / EARTH_RADIUS
+        rows = range(self._row(max(lat - dlat, -pi / 2)), self._row(min(lat + dlat, pi / 2)) + 1)
+
+        # Longitudinal half-width of the spherical cap; it covers every meridian if it reaches a pole
+        if dlat >= pi / 2 - abs(lat):
+            return rows, range(self._lon_cols)
+        dlon = asin(min(1.0, sin(dlat) / cos(lat)))
+        first = floor((lon - dlon + pi) / self._lon_step)
+        last = floor((lon + dlon + pi) / self._lon_step)
+        if last - first + 1 >= self._lon_cols:
+            return rows, range(self._lon_cols)
+        return rows, [col % self._lon_cols for col in range(first, last + 1)]
+
+    def _insert(self, id: int, coords: _Coords) -> None:
+        self._points[id] = coords
+        self._cells.setdefault(self._cell(coords), {})[id] = coords
+
+    def _discard(self, id: int) -> None:
+        coords = self._points.pop(id, None)
+        if coords is None:
+            return
+        cell = self._cell(coords)
+        points = self._cells.get(cell)
+        if points is not None:
+            points.pop(id, None)
+            if not points:
+                del self._cells[cell]
+
+    def _nearest_within(self, coords: _Coords, radius: float) -> Optional[int]:
+        # ID of the point closest to `coords` among those within `radius` meters of it
+        ids: List[int] = []
+        points: List[_Coords] = []
+        rows, cols = self._candidate_cells(coords, radius)
+        with self._lock:
+            # Wide searches would visit more empty cells than there are occupied ones, so they
+            # check every occupied cell instead
+            if len(rows) * len(cols) > len(self._cells):
+                cells = [points for cell, points in self._cells.items() if cell[0] in rows]
+            else:
+                cells = [self._cells.get((row, col)) for row in rows for col in cols]
+            for cell_points in cells:
+                if cell_points:
+                    ids.extend(cell_points.keys())
+                    points.extend(cell_points.values())
+        if not ids:
+            return None
+
+        # Compute all candidate distances in one batch
+        distances = get_distances(coords, points)
+        closest = int(distances.argmin())
+        return ids[closest] if distances[closest] <= radius else None
+
+    # Public methods
+    # --------------
+
+    def rebuild(self, db: DBSession) -> "SpatialIndex":
+        """
+        Discard the index contents and reload every row of the table.
+        """
+        stmt = select(self.mapper_type.id, self.mapper_type.latitude, self.mapper_type.longitude)
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            for id, latitude, longitude in db.exec(stmt).all():
+                self._insert(id, (latitude, longitude))
+            self._built_at = monotonic()
+        return self
+
+    def ensure_built(self, db: DBSession) -> "SpatialIndex":
+        """
+        Build the index from the table if it has not been built in this process yet, or if it was
+        built more than `ttl` seconds ago and may miss the writes of other workers.
+        """
+        if self._built_at is None or monotonic() - self._built_at >= self.ttl:
+            self.rebuild(db)
+        return self
+
+    def upsert(self, id: int, coords: _Coords) -> None:
+        """
+        Insert a point, or move it if it is already indexed. No-op until the index is built,
+        since the build will read the row from the table anyway.
+        """
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(id)
+            self._insert(id, coords)
+
+    def remove(self, id: int) -> None:
+        with self._lock:
+            self._discard(id)
+
+    def query_nearest(self, coords: _Coords) -> Optional[int]:
+        """
+        Find the point closest to `coords`.
+
+        Returns:
+        * `Optional[int]` -- The ID of the point, `None` if the index is empty
+        """
+        # Widen the search until a point is found or the whole sphere is covered
+        search_radius = self._lat_step * EARTH_RADIUS
+        while True:
+            nearest = self._nearest_within(coords, search_radius)
+            if nearest is not None or search_radius >= pi * EARTH_RADIUS:
+                return nearest
+            search_radius *= 2
+
+
+area_index = SpatialIndex(AreaMapper)
@@ -0,0 +1,169 @@
+from asyncio import (
+    AbstractEventLoop,
+    Queue,
+    QueueFull,
+    Task,
+    TimeoutError as AsyncTimeoutError,
+    gather,
+    get_running_loop,
+    sleep,
+    wait_for,
+)
+from functools import partial
+from inspect import iscoroutinefunction
+from logging import getLogger
+from threading import Lock
+from typing_extensions import Any, Callable, List, Optional, Tuple
+
+from app.config import (
+    TASK_QUEUE_CONCURRENCY,
+    TASK_QUEUE_DRAIN_TIMEOUT,
+    TASK_QUEUE_MAX_RETRIES,
+    TASK_QUEUE_MAX_SIZE,
+    TASK_QUEUE_RETRY_DELAY,
+)
+from app.schemas.metrics import TaskQueueStats
+from app.services.workers import run_in_db_worker
+
+logger = getLogger(__name__)
+
+_Task = Tuple[Callable[..., Any], Tuple[Any, ...]]
+
+
+class TaskQueue:
+    """
+    In-process queue of background tasks, e.g. the side effects of a request, so that the request
+    itself only does its database write. Tasks are run by `concurrency` asyncio workers on the event
+    loop of the app: coroutine functions are awaited, other functions are run on database worker
+    threads. A task that raises is retried up to `max_retries` times, waiting `retry_delay` seconds
+    before the first retry and twice as long before each next one.
+
+    Tasks are not persisted: those still queued when the app stops after `drain_timeout` seconds
+    are lost, and so are the tasks submitted while the queue is full or not running.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = TASK_QUEUE_CONCURRENCY,
+        max_size: int = TASK_QUEUE_MAX_SIZE,
+        max_retries: int = TASK_QUEUE_MAX_RETRIES,
+        retry_delay: float = TASK_QUEUE_RETRY_DELAY,
+        drain_timeout: float = TASK_QUEUE_DRAIN_TIMEOUT,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.max_size = max(0, max_size)
+        self.max_retries = max(0, max_retries)
+        self.retry_delay = retry_delay
+        self.drain_timeout = drain_timeout
+        self._loop: Optional[AbstractEventLoop] = None
+        self._queue: Optional[Queue] = None
+        self._workers: List[Task] = []
+        self._lock = Lock()
+        self._stats = TaskQueueStats(size=0, max_size=self.max_size, concurrency=self.concurrency)
+
+    # Private methods
+    # ---------------
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+    def _put(self, task: _Task) -> None:
+        # Only called on the event loop of the queue
+        try:
+            self._queue.put_nowait(task)
+        except QueueFull:
+            self._count("dropped")
+            logger.warning("Task queue is full, dropped %s", getattr(task[0], "__name__", task[0]))
+
+    async def _run(self, task: _Task) -> None:
+        func, args = task
+        for attempt in range(self.max_retries + 1):
+            try:
+                if iscoroutinefunction(func):
+                    await func(*args)
+                else:
+                    await run_in_db_worker(func, *args)
+                self._count("completed")
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    self._count("failed")
+                    logger.exception("Task %s failed after %d attempts", getattr(func, "__name__", func), attempt + 1)
+                    return
+                self._count("retried")
+                await sleep(self.retry_delay * 2**attempt)
+
+    async def _work(self) -> None:
+        while True:
+            task = await self._queue.get()
+            try:
+                await self._run(task)
+            finally:
+                self._queue.task_done()
+
+    # Public methods
+    # --------------
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    @property
+    def stats(self) -> TaskQueueStats:
+        with self._lock:
+            return self._stats.model_copy(
+                update={"size": self._queue.qsize() if self._queue else 0, "running": self.running}
+            )
+
+    async def start(self) -> None:
+        """
+        Start the workers on the running event loop.
+        """
+        if self.running:
+            return
+        self._loop = get_running_loop()
+        self._queue = Queue(self.max_size)
+        self._workers = [self._loop.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """
+        Wait up to `drain_timeout` seconds for the queued tasks to finish, then stop the workers.
+        """
+        if not self.running:
+            return
+        queue, workers = self._queue, self._workers
+        try:
+            await wait_for(queue.join(), self.drain_timeout)
+        except AsyncTimeoutError:
+            logger.warning("Task queue stopped with %d tasks left", queue.qsize())
+        finally:
+            self._queue, self._loop, self._workers = None, None, []
+            for worker in workers:
+                worker.cancel()
+            await gather(*workers, return_exceptions=True)
+
+    def submit(self, func: Callable[..., Any], /, *args, **kwargs) -> None:
+        """
+        Queue a call of `func`, from the event loop or from any other thread (e.g. a service method
+        running on a database worker thread). Never blocks: the task is dropped if the queue is full.
+        """
+        loop = self._loop
+        if loop is None:
+            # E.g. a service used from the command line, where there is no app to run the task
+            self._count("dropped")
+            return
+        self._count("submitted")
+        task = (partial(func, **kwargs) if kwargs else func, args)
+        try:
+            on_loop = get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._put(task)
+        else:
+            loop.call_soon_threadsafe(self._put, task)
+
+
+task_queue = TaskQueue()
@@ -1,16 +1,20 @@
+from datetime import datetime
 from fastapi import Depends, HTTPException, status as http_status
-from passlib.context import CryptContext
-from typing_extensions import Optional
+from typing_extensions import Iterator, List, Optional, Tuple
 
-from app.schemas.user import User, UserCreate, UserUpdate, UserPasswordUpdate
+from app.schemas.user import User, UserCreate, UserUpdate, UserPasswordUpdate, UserPrincipal, UserExport
 from app.services.error import NotFoundHTTPException
-from app.storage.mappers import UserMapper, select, column
+from app.storage.mappers import UserMapper, OrderMapper, select, selectinload, column, update
 from app.services.mixins import EntityCRUDMixin
+from app.services.password import password_context
+from app.services.principal import principal_cache
+from app.services.workers import run_in_db_worker, run_in_password_worker
 from app.utilities import overrides
 
 
 class UserService(EntityCRUDMixin[User, UserCreate, UserUpdate, UserMapper]):
-    _pwd_hasher = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    loader_options = (selectinload(UserMapper.orders).selectinload(OrderMapper.item_links),)
+    _pwd_hasher = password_context
 
     # Class methods
     # -------------
@@ -23,19 +27,80 @@ class UserService(EntityCRUDMixin[User, UserCreate, UserUpdate, UserMapper]):
     def verify_password(cls, password: str, hashed_password: str) -> bool:
         return cls._pwd_hasher.verify(password, hashed_password)
 
+    @classmethod
+    def verify_and_update_password(cls, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password, and rehash it if its hash uses a deprecated scheme or cost.
+
+        Returns:
+        * `Tuple[bool, Optional[str]]` -- Whether the password is valid, and the new hash if one is due
+        """
+        return cls._pwd_hasher.verify_and_update(password, hashed_password)
+
+    @classmethod
+    async def hash_password_async(cls, password: str) -> str:
+        return await run_in_password_worker(cls.hash_password, password)
+
+    @classmethod
+    async def verify_password_async(cls, password: str, hashed_password: str) -> bool:
+        return await run_in_password_worker(cls.verify_password, password, hashed_password)
+
+    @classmethod
+    async def verify_and_update_password_async(cls, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await run_in_password_worker(cls.verify_and_update_password, password, hashed_password)
+
     # Private methods
     # ---------------
 
-    def _get_optional_row_by_email(self, email: str) -> Optional[UserMapper]:
+    def _get_optional_row_by_email(self, email: str, *, with_related: bool = True) -> Optional[UserMapper]:
         stmt = select(UserMapper).where(column(UserMapper.email) == email)
+        if with_related:
+            stmt = stmt.options(*self.loader_options)
         return self.db.exec(stmt).first()
 
-    def _get_row_by_email_or_raise(self, email: str) -> UserMapper:
-        row = self._get_optional_row_by_email(email)
+    def _get_row_by_email_or_raise(self, email: str, *, with_related: bool = True) -> UserMapper:
+        row = self._get_optional_row_by_email(email, with_related=with_related)
         if row is None:
             raise NotFoundHTTPException(User, f" with email = {email}")
         return row
 
+    @overrides(EntityCRUDMixin)
+    def _construct_row(self, data: UserCreate, hashed_password: Optional[str] = None) -> UserMapper:
+        if hashed_password is None:
+            hashed_password = self.hash_password(data.password.get_secret_value())
+        return UserMapper(**data.model_dump(exclude={"password"}), hashed_password=hashed_password)
+
+    def _create_with_hash(self, data: UserCreate, hashed_password: Optional[str] = None) -> User:
+        row = self._get_optional_row_by_email(data.email, with_related=False)
+        if row is not None:
+            raise HTTPException(
+                status_code=http_status.HTTP_409_CONFLICT,
+                detail="User already exists",
+            )
+
+        row = self._construct_row(data, hashed_password)
+        self.db.add(row)
+        self._commit_or_raise()
+        self.db.refresh(row)
+        self._after_save(row)
+
+        return self._construct_entity(row)
+
+    def _set_hashed_password(self, id: int, hashed_password: str) -> None:
+        self.db.exec(update(UserMapper).where(column(UserMapper.id) == id).values(hashed_password=hashed_password))
+        self.db.commit()
+
+    # Hooks
+    # -----
+
+    @overrides(EntityCRUDMixin)
+    def _after_save(self, row: UserMapper) -> None:
+        principal_cache.invalidate_user(row.id)
+
+    @overrides(EntityCRUDMixin)
+    def _after_delete(self, row: UserMapper) -> None:
+        principal_cache.invalidate_user(row.id)
+
     # Public methods
     # --------------
 
@@ -43,45 +108,73 @@ class UserService(EntityCRUDMixin[User, UserCreate, UserUpdate, UserMapper]):
         row = self._get_row_by_email_or_raise(email)
         return self._construct_entity(row)
 
-    def authenticate_and_get_user(self, *, email: str, password: str) -> User:
-        row = self._get_row_by_email_or_raise(email)
-        if not self.verify_password(password, row.hashed_password):
+    def get_principal_by_email(self, email: str) -> UserPrincipal:
+        """
+        Get the user without loading their orders.
+        """
+        row = self._get_row_by_email_or_raise(email, with_related=False)
+        return UserPrincipal.model_validate(row)
+
+    async def authenticate_and_get_user(self, *, email: str, password: str) -> User:
+        row = await run_in_db_worker(self._get_row_by_email_or_raise, email)
+        is_valid, new_hashed_password = await self.verify_and_update_password_async(password, row.hashed_password)
+        if not is_valid:
             raise HTTPException(
                 status_code=http_status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid password",
             )
-        return self._construct_entity(row)
+        user = self._construct_entity(row)
+        if new_hashed_password is not None:
+            # The hash is out of date with the configured scheme or cost, upgrade it while the password is at hand
+            await run_in_db_worker(self._set_hashed_password, row.id, new_hashed_password)
+        return user
 
     @overrides(EntityCRUDMixin)
     def create(self, *, data: UserCreate) -> User:
-        row = self._get_optional_row_by_email(data.email)
-        if row is not None:
-            raise HTTPException(
-                status_code=http_status.HTTP_409_CONFLICT,
-                detail="User already exists",
-            )
-        
-        row = UserMapper(
-            **data,
-            hashed_password=self.__class__.hash_password(data.password),
-        )
-        self.db.add(row)
-        self.db.commit()
-        self.db.refresh(row)
-        
-        return self._construct_entity(row)
+        return self._create_with_hash(data)
+
+    async def create_async(self, *, data: UserCreate) -> User:
+        """
+        Same as `create`, but hashes the password on a password worker instead of the calling thread.
+        """
+        hashed_password = await self.hash_password_async(data.password.get_secret_value())
+        return await run_in_db_worker(self._create_with_hash, data, hashed_password)
 
     def update_password(self, *, email: str, data: UserPasswordUpdate) -> User:
         row = self._get_row_by_email_or_raise(email)
-        if not self.verify_password(data.old_password, row.hashed_password):
+        if not self.verify_password(data.old_password.get_secret_value(), row.hashed_password):
             raise HTTPException(
                 status_code=http_status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid password",
             )
 
-        row.hashed_password = self.hash_password(data.new_password)
+        row.hashed_password = self.hash_password(data.new_password.get_secret_value())
         self.db.add(row)
         self.db.commit()
         self.db.refresh(row)
+        self._after_save(row)
 
         return self._construct_entity(row)
+
+    def export(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Iterator[List[UserExport]]:
+        """
+        Stream the users, without their orders, in batches of constant size.
+
+        Parameters:
+        * `since`: `Optional[datetime]` -- Only users created at or after this time
+        * `until`: `Optional[datetime]` -- Only users created before this time
+
+        Returns:
+        * `Iterator[List[UserExport]]` -- The batches of users, in ID order
+        """
+        where = []
+        if since is not None:
+            where.append(column(UserMapper.created_at) >= since)
+        if until is not None:
+            where.append(column(UserMapper.created_at) < until)
+        return self._iter_export_batches(*where, entity_type=UserExport)
@@ -0,0 +1,54 @@
+from anyio import CapacityLimiter, to_thread
+from functools import partial
+from typing_extensions import AsyncIterator, Callable, Iterator, TypeVar
+
+from app.config import DB_WORKER_THREADS, PASSWORD_WORKER_THREADS, PASSWORD_QUEUE_MAX, PASSWORD_QUEUE_RETRY_AFTER
+from app.services.error import TooManyRequestsHTTPException
+
+_TResult = TypeVar("_TResult")
+
+# Each kind of blocking work gets its own bounded set of threads, so that a burst of password
+# hashing cannot starve database calls, and neither of them runs on the event loop
+_db_limiter = CapacityLimiter(DB_WORKER_THREADS)
+_password_limiter = CapacityLimiter(PASSWORD_WORKER_THREADS)
+
+# Password calls that are running or waiting for a thread. Only touched from the event loop.
+_password_pending = 0
+
+
+async def run_in_db_worker(func: Callable[..., _TResult], /, *args, **kwargs) -> _TResult:
+    """
+    Run a blocking database call (typically a service method) on a worker thread
+    """
+    return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=_db_limiter)
+
+
+async def iterate_in_db_worker(iterator: Iterator[_TResult]) -> AsyncIterator[_TResult]:
+    """
+    Pull the items of a blocking iterator (e.g. a streamed query) one at a time on database worker
+    threads. The iterator is closed on a worker too, also when the consumer stops early.
+    """
+    done = object()
+    try:
+        while (item := await run_in_db_worker(next, iterator, done)) is not done:
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_in_db_worker(close)
+
+
+async def run_in_password_worker(func: Callable[..., _TResult], /, *args, **kwargs) -> _TResult:
+    """
+    Run CPU-bound password hashing or verification on a worker thread. Rejects the call with 429
+    when `PASSWORD_QUEUE_MAX` calls are already waiting for a thread, rather than letting the
+    queue (and the response time of every login) grow without bound.
+    """
+    global _password_pending
+    if _password_pending >= PASSWORD_WORKER_THREADS + PASSWORD_QUEUE_MAX:
+        raise TooManyRequestsHTTPException("Too many concurrent logins, try again later", PASSWORD_QUEUE_RETRY_AFTER)
+    _password_pending += 1
+    try:
+        return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=_password_limiter)
+    finally:
+        _password_pending -= 1
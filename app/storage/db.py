@@ -1,27 +1,157 @@
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session as DBSession, create_engine
-from typing_extensions import Generator
+from typing_extensions import Generator, List, Optional
 
-from app.storage.mappers import SQLModel, sqltext
-from app.config import DB_URL, RUN_MODE, RunMode
-
-# Database engine is a singleton
-_engine = create_engine(
+from app.schemas.metrics import DBPoolStats
+from app.config import (
     DB_URL,
-    echo=bool(RUN_MODE == RunMode.DEV),
-    connect_args={"check_same_thread": False},
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_POOL_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_SQLITE_JOURNAL_MODE,
+    DB_SQLITE_SYNCHRONOUS,
+    DB_SQLITE_MMAP_SIZE,
+    DB_SQLITE_CACHE_SIZE,
+    DB_SQLITE_BUSY_TIMEOUT,
 )
 
-# Enable foreign key constraints for SQLite
-if _engine.url.get_driver_name() == "sqlite":
-    with _engine.connect() as connection:
-        connection.execute(sqltext("PRAGMA foreign_keys=ON"))
 
-# Drop and create tables
-SQLModel.metadata.drop_all(_engine)
-SQLModel.metadata.create_all(_engine)
+class _TimedQueuePool(QueuePool):
+    """
+    Queue pool that records how long each checkout waited for a connection
+    """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = Lock()
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
 
-def new_db_session() -> Generator[DBSession, None, None]:
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_time = perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # Pragmas are per connection, so they are applied to every new connection of the pool
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA journal_mode={DB_SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={DB_SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={DB_SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={DB_SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_SQLITE_BUSY_TIMEOUT}")
+    cursor.close()
+
+
+def create_db_engine(url: str = DB_URL) -> Engine:
+    """
+    Create a database engine with the pool settings from the configuration. SQLite connections
+    also get the configured pragmas applied as they are opened.
+    """
+    kwargs = {}
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+    is_memory = is_sqlite and make_url(url).database in (None, "", ":memory:")
+    if is_sqlite:
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not is_memory:
+        # In-memory SQLite databases live in a single connection, so they keep the default pool
+        kwargs.update(
+            poolclass=_TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+
+    engine = create_engine(url, echo=DB_ECHO, **kwargs)
+    if is_sqlite:
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+# Database engine is a singleton, created on first use rather than at import time
+_engine: Optional[Engine] = None
+_engine_lock = Lock()
+
+
+def get_db_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+    return _engine
+
+
+def dispose_db_engine() -> None:
+    """
+    Close the pooled connections and drop the engine; the next use creates a new one.
+    """
     global _engine
-    with DBSession(_engine) as db:
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def new_db_session() -> Generator[DBSession, None, None]:
+    with DBSession(get_db_engine()) as db:
         yield db
+
+
+def get_pool_stats() -> DBPoolStats:
+    pool = get_db_engine().pool
+    if not isinstance(pool, _TimedQueuePool):
+        # Single-connection pool of an in-memory database
+        return DBPoolStats(
+            size=1, checked_out=0, checked_in=0, overflow=0, checkouts=0, wait_time_total=0.0, wait_time_max=0.0
+        )
+    return DBPoolStats(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        overflow=max(0, pool.overflow()),
+        checkouts=pool.checkouts,
+        wait_time_total=pool.wait_time_total,
+        wait_time_max=pool.wait_time_max,
+    )
+
+
+@contextmanager
+def count_queries() -> Generator[List[str], None, None]:
+    """
+    Record the SQL statements sent to the database while the context is active, e.g. to assert
+    the number of queries an endpoint issues.
+
+    Yields:
+    * `List[str]` -- The statements, filled in as they are executed
+    """
+    statements: List[str] = []
+
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = get_db_engine()
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
@@ -1,9 +1,31 @@
 from datetime import datetime
 import re
-from sqlmodel import Field, Relationship, SQLModel, delete, select, col as column, text as sqltext, update
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import (
+    Field,
+    Relationship,
+    SQLModel,
+    delete,
+    select,
+    col as column,
+    text as sqltext,
+    update,
+)
 from typing_extensions import Optional, List
 
-from app.schemas import AreaBase, BranchBase, ItemBase, OrderBase, OrderStatus, OrderItemBase, RestaurantBase, UserBase
+from app.schemas import (
+    AreaBase,
+    BranchBase,
+    ItemBase,
+    OrderBase,
+    OrderStatus,
+    OrderItemBase,
+    RestaurantBase,
+    RiderBase,
+    UserBase,
+)
 
 _camel_case_pattern = re.compile(r"(?<!^)(?=[A-Z])")
 
@@ -69,15 +91,25 @@ class ItemMapper(EntityMapperBase, ItemBase, table=True):
     order_links: List["OrderItemMapper"] = Relationship(back_populates="item", cascade_delete=True)
 
 
+class RiderMapper(EntityMapperBase, RiderBase, table=True):
+    __tablename__ = "rider"
+    available: bool = Field(True, index=True)
+
+
 class OrderMapper(EntityMapperBase, OrderBase, table=True):
     __tablename__ = "order"
     customer_id: int = Field(foreign_key="user.id", index=True, ondelete="CASCADE")
     customer: UserMapper = Relationship(back_populates="orders")
     status: OrderStatus = Field(index=True)
+    version: int = 0  # incremented on every change of status, for optimistic concurrency
+    total: float = 0
 
     branch_id: int = Field(foreign_key="branch.id", index=True, ondelete="CASCADE")
     branch: BranchMapper = Relationship(back_populates="orders")
 
+    # Set by dispatch, along with the `ACCEPTED` status
+    rider_id: Optional[int] = Field(None, foreign_key="rider.id", index=True, ondelete="SET NULL")
+
     item_links: List["OrderItemMapper"] = Relationship(back_populates="order", cascade_delete=True)
 
 
@@ -88,3 +120,65 @@ class OrderItemMapper(MapperBase, OrderItemBase, table=True):
 
     order_id: int = Field(foreign_key="order.id", primary_key=True, ondelete="CASCADE")
     order: OrderMapper = Relationship(back_populates="item_links")
+
+    # Unit price of the item when the order was placed
+    price: float = 0
+
+
+class ServiceabilityMapper(MapperBase, table=True):
+    """
+    Precomputed map from delivery cells (geohashes) to the branches that can deliver to some point
+    in them, with the distance from the branch to the center of the cell.
+    """
+
+    __tablename__ = "serviceability"
+    cell: str = Field(primary_key=True)
+    branch_id: int = Field(foreign_key="branch.id", primary_key=True, index=True, ondelete="CASCADE")
+    distance: float
+    # Estimated delivery time in seconds, see `app.services.eta`; unknown until estimated
+    eta: Optional[float] = None
+
+
+class DeliveryStatsMapper(MapperBase, table=True):
+    """
+    Running statistics of the delivered orders of an area: the number of deliveries, the means of
+    their distances (branch to customer, in meters) and durations (placed to delivered, in seconds),
+    and the sums of squares and of products of their deviations, from which delivery times are
+    fitted by least squares. The statistics are updated in place with each delivery.
+    """
+
+    __tablename__ = "delivery_stats"
+    area_id: int = Field(foreign_key="area.id", primary_key=True, ondelete="CASCADE")
+    samples: int = 0
+    mean_distance: float = 0
+    mean_duration: float = 0
+    distance_deviation: float = 0  # sum of squared deviations of the distances
+    co_deviation: float = 0  # sum of products of the deviations of the distances and the durations
+
+
+class SchemaVersionMapper(MapperBase, table=True):
+    """
+    Versions of the database schema that have been applied, see `app.storage.migrations`.
+    """
+
+    __tablename__ = "schema_version"
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime = Field(default_factory=datetime.now)
+
+
+class IdempotencyKeyMapper(MapperBase, table=True):
+    """
+    Response of an order placed with an `Idempotency-Key`, replayed to retries of the request until
+    the key expires. Keys are chosen by clients, so they are unique per customer only. Inserted in
+    the same transaction as the order, so a key exists if and only if its order does.
+    """
+
+    __tablename__ = "idempotency_key"
+    customer_id: int = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    fingerprint: str  # hash of the request, to tell retries from other requests reusing the key
+    order_id: Optional[int] = Field(None, foreign_key="order.id", ondelete="CASCADE")
+    response: str = ""
+    created_at: datetime = Field(default_factory=datetime.now)
+    expires_at: datetime = Field(index=True)
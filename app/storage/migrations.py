@@ -0,0 +1,345 @@
+from datetime import datetime
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    text,
+)
+from typing_extensions import Callable, List, Optional, Tuple, Type
+
+from app.config import PROXIMITY_THRESHOLD, SERVICEABILITY_GEOHASH_PRECISION
+from app.storage.mappers import (
+    DeliveryStatsMapper,
+    IdempotencyKeyMapper,
+    ItemMapper,
+    MapperBase,
+    OrderItemMapper,
+    OrderMapper,
+    RestaurantMapper,
+    RiderMapper,
+    SchemaVersionMapper,
+    ServiceabilityMapper,
+    SQLModel,
+    insert,
+    select,
+)
+from app.services.geo import geohash_cells_within
+
+
+_Migration = Tuple[str, Callable[[Connection], None]]
+
+
+def _entity_columns() -> List[Column]:
+    return [
+        Column("id", Integer, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime),
+    ]
+
+
+def _location_columns() -> List[Column]:
+    return [
+        Column("latitude", Float, nullable=False),
+        Column("longitude", Float, nullable=False),
+        Column("address", String(200), nullable=False),
+    ]
+
+
+# The schema as it was when versioning was introduced, frozen rather than taken from the mappers, so
+# that the initial migration creates what every later migration was written against
+_baseline = MetaData()
+
+Table(
+    "user",
+    _baseline,
+    Column("phone", String(17), nullable=False),
+    Column("name", String),
+    *_entity_columns(),
+    Column("email", String, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Index("ix_user_email", "email", unique=True),
+)
+Table(
+    "area",
+    _baseline,
+    *_location_columns(),
+    Column("name", String(100), nullable=False),
+    *_entity_columns(),
+    Index("ix_area_latitude_longitude", "latitude", "longitude"),
+)
+Table(
+    "restaurant",
+    _baseline,
+    Column("name", String(100), nullable=False),
+    Column("description", String(500), nullable=False),
+    *_entity_columns(),
+)
+Table(
+    "branch",
+    _baseline,
+    *_location_columns(),
+    *_entity_columns(),
+    Column("restaurant_id", Integer, ForeignKey("restaurant.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("area_id", Integer, ForeignKey("area.id", ondelete="SET NULL"), index=True),
+    Index("ix_branch_latitude_longitude", "latitude", "longitude"),
+)
+Table(
+    "item",
+    _baseline,
+    Column("name", String(100), nullable=False),
+    Column("description", String(500), nullable=False),
+    Column("price", Float, nullable=False),
+    *_entity_columns(),
+    Column("restaurant_id", Integer, ForeignKey("restaurant.id", ondelete="CASCADE"), nullable=False, index=True),
+)
+Table(
+    "order",
+    _baseline,
+    *_location_columns(),
+    *_entity_columns(),
+    Column("customer_id", Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column(
+        "status",
+        Enum("PENDING", "ACCEPTED", "PICKEDUP", "DELIVERED", "REJECTED", "CANCELLED", name="orderstatus"),
+        nullable=False,
+        index=True,
+    ),
+    Column("branch_id", Integer, ForeignKey("branch.id", ondelete="CASCADE"), nullable=False, index=True),
+)
+Table(
+    "order_item",
+    _baseline,
+    Column("quantity", Integer, nullable=False),
+    Column("item_id", Integer, ForeignKey("item.id", ondelete="CASCADE"), primary_key=True),
+    Column("order_id", Integer, ForeignKey("order.id", ondelete="CASCADE"), primary_key=True),
+)
+Table(
+    "serviceability",
+    _baseline,
+    Column("cell", String, primary_key=True),
+    Column("branch_id", Integer, ForeignKey("branch.id", ondelete="CASCADE"), primary_key=True, index=True),
+    Column("distance", Float, nullable=False),
+)
+
+
+def _create_baseline(connection: Connection) -> None:
+    # Tables that already exist are left alone, so databases created before versioning are adopted as is
+    _baseline.create_all(connection)
+
+
+def _create_tables(*mapper_types: Type[MapperBase]) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        SQLModel.metadata.create_all(connection, tables=[mapper_type.__table__ for mapper_type in mapper_types])
+
+    return apply
+
+
+def _add_column(
+    mapper_type: Type[MapperBase], name: str, default: Optional[str] = None
+) -> Callable[[Connection], None]:
+    # Without a default, the column is nullable. Its foreign key and indexes are added with it.
+    def apply(connection: Connection) -> None:
+        # Databases created by earlier releases, whose initial migration took the tables from the
+        # mappers, may have the column already
+        table = mapper_type.__table__
+        if name in {column["name"] for column in inspect(connection).get_columns(table.name)}:
+            return
+        quote = connection.dialect.identifier_preparer.quote
+        column = table.columns[name]
+        definition = f"{quote(name)} {column.type.compile(dialect=connection.dialect)}"
+        if default is not None:
+            definition += f" NOT NULL DEFAULT {default}"
+        for foreign_key in column.foreign_keys:
+            definition += f" REFERENCES {quote(foreign_key.column.table.name)} ({quote(foreign_key.column.name)})"
+            if foreign_key.ondelete:
+                definition += f" ON DELETE {foreign_key.ondelete}"
+        connection.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {definition}"))
+        for index in table.indexes:
+            if name in index.columns:
+                index.create(connection, checkfirst=True)
+
+    return apply
+
+
+def _create_search_table(mapper_type: Type[MapperBase]) -> Callable[[Connection], None]:
+    # SQLite only: contentless FTS5 indexes over the name and description of the table, and over the
+    # name alone, kept in sync by triggers. Their rowids are the length of the name in the high bits
+    # and the id in the low 32 bits, so that matches come out shortest name first, see
+    # `app.services.search`.
+    def apply(connection: Connection) -> None:
+        if connection.dialect.name != "sqlite":
+            return
+        table = mapper_type.__table__.name
+        exists = text("SELECT 1 FROM sqlite_master WHERE name = :name")
+        if connection.execute(exists, {"name": f"{table}_search"}).first():
+            return
+
+        statements = []
+        inserts, deletes = "", ""
+        for index, columns in ((f"{table}_search", ["name", "description"]), (f"{table}_name_search", ["name"])):
+            names = ", ".join(columns)
+            statements += [
+                f"CREATE VIRTUAL TABLE {index} USING fts5({names}, "
+                "content='', prefix='1 2 3 4 5 6', tokenize='unicode61 remove_diacritics 2')",
+                f"INSERT INTO {index} (rowid, {names}) SELECT length(name) * 4294967296 + id, {names} FROM {table}",
+            ]
+            new_values = ", ".join(f"new.{name}" for name in columns)
+            old_values = ", ".join(f"old.{name}" for name in columns)
+            inserts += (
+                f"INSERT INTO {index} (rowid, {names}) "
+                f"VALUES (length(new.name) * 4294967296 + new.id, {new_values});\n"
+            )
+            deletes += (
+                f"INSERT INTO {index} ({index}, rowid, {names}) "
+                f"VALUES ('delete', length(old.name) * 4294967296 + old.id, {old_values});\n"
+            )
+        statements += [
+            f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN\n{inserts}END",
+            f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN\n{deletes}END",
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF name, description ON {table} BEGIN\n"
+            f"{deletes}{inserts}END",
+        ]
+        for statement in statements:
+            connection.execute(text(statement))
+
+    return apply
+
+
+def _drop_indexes(*names: str) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        quote = connection.dialect.identifier_preparer.quote
+        for name in names:
+            connection.execute(text(f"DROP INDEX IF EXISTS {quote(name)}"))
+
+    return apply
+
+
+def _populate_serviceability(connection: Connection) -> None:
+    # Databases whose branches predate the serviceability table have no entries for them; fresh or already
+    # populated databases are left alone. Same entries as `ServiceabilityService`, without their estimates.
+    if connection.execute(text("SELECT 1 FROM serviceability LIMIT 1")).first() is not None:
+        return
+    entries = [
+        {"cell": cell, "branch_id": branch_id, "distance": distance}
+        for branch_id, latitude, longitude in connection.execute(text("SELECT id, latitude, longitude FROM branch"))
+        for cell, distance in geohash_cells_within(
+            (latitude, longitude), PROXIMITY_THRESHOLD, SERVICEABILITY_GEOHASH_PRECISION
+        )
+    ]
+    if entries:
+        connection.execute(
+            text("INSERT INTO serviceability (cell, branch_id, distance) VALUES (:cell, :branch_id, :distance)"),
+            entries,
+        )
+
+
+def _scope_idempotency_keys(connection: Connection) -> None:
+    # Keys become unique per customer. SQLite cannot change a primary key, so the table is rebuilt and
+    # the live keys are copied over with the customer of their order. Tables created by "Idempotency
+    # keys of orders" from a mapper that already has the column are left alone.
+    if "customer_id" in {column["name"] for column in inspect(connection).get_columns("idempotency_key")}:
+        return
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(text("ALTER TABLE idempotency_key RENAME TO idempotency_key_old"))
+    for index in inspect(connection).get_indexes("idempotency_key_old"):
+        connection.execute(text(f"DROP INDEX {quote(index['name'])}"))
+    _create_tables(IdempotencyKeyMapper)(connection)
+    connection.execute(
+        text(
+            "INSERT INTO idempotency_key (customer_id, key, fingerprint, order_id, response, created_at, expires_at) "
+            "SELECT o.customer_id, k.key, k.fingerprint, k.order_id, k.response, k.created_at, k.expires_at "
+            'FROM idempotency_key_old AS k JOIN "order" AS o ON o.id = k.order_id'
+        )
+    )
+    connection.execute(text("DROP TABLE idempotency_key_old"))
+
+
+def _combine(*steps: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    def apply(connection: Connection) -> None:
+        for step in steps:
+            step(connection)
+
+    return apply
+
+
+# Migrations in the order they are applied; the version of a migration is its position, starting at 1.
+# Only ever append to this list, and never change a migration once released: each one is applied to
+# the schema left by the ones before it.
+MIGRATIONS: List[_Migration] = [
+    ("Initial schema", _create_baseline),
+    (
+        "Order totals and item prices",
+        _combine(_add_column(OrderMapper, "total", "0"), _add_column(OrderItemMapper, "price", "0")),
+    ),
+    ("Idempotency keys of orders", _create_tables(IdempotencyKeyMapper)),
+    ("Order versions", _add_column(OrderMapper, "version", "0")),
+    ("Riders", _combine(_create_tables(RiderMapper), _add_column(OrderMapper, "rider_id"))),
+    # Estimates stay unknown until `python -m app.cli rebuild-etas` learns them from past deliveries
+    ("Delivery estimates", _combine(_create_tables(DeliveryStatsMapper), _add_column(ServiceabilityMapper, "eta"))),
+    ("Full-text search", _combine(_create_search_table(ItemMapper), _create_search_table(RestaurantMapper))),
+    # Proximity queries go through the serviceability table and the in-process area index instead
+    ("Unused coordinate indexes", _drop_indexes("ix_area_latitude_longitude", "ix_branch_latitude_longitude")),
+    # Estimates stay unknown until `python -m app.cli rebuild-etas`, as for "Delivery estimates"
+    ("Serviceability of existing branches", _populate_serviceability),
+    ("Idempotency keys per customer", _scope_idempotency_keys),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(engine: Engine) -> int:
+    """
+    Get the version of the database schema, 0 if no migration has been applied yet.
+    """
+    with engine.connect() as connection:
+        return _get_schema_version(connection)
+
+
+def _get_schema_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(SchemaVersionMapper.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaVersionMapper.version))).scalar() or 0
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Apply the migrations the database is missing, each in its own transaction together with the
+    record of its version.
+
+    Parameters:
+    * `engine`: `Engine` -- The database to migrate
+    * `target`: `Optional[int]` -- The version to migrate to, the latest one by default
+
+    Returns:
+    * `List[int]` -- The versions that were applied
+    """
+    target = SCHEMA_VERSION if target is None else min(target, SCHEMA_VERSION)
+    applied: List[int] = []
+
+    with engine.begin() as connection:
+        SQLModel.metadata.create_all(connection, tables=[SchemaVersionMapper.__table__])
+        current = _get_schema_version(connection)
+
+    for version in range(current + 1, target + 1):
+        description, apply = MIGRATIONS[version - 1]
+        with engine.begin() as connection:
+            apply(connection)
+            connection.execute(
+                insert(SchemaVersionMapper).values(
+                    version=version, description=description, applied_at=datetime.now()
+                )
+            )
+        applied.append(version)
+
+    return applied
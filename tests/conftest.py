@@ -0,0 +1,35 @@
+import os
+from tempfile import mkdtemp
+
+# The configuration is read on import, so the test database is set before the app is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{mkdtemp()}/test.db"
+os.environ["RUN_MODE"] = "dev"
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import API_V1_PREFIX
+from app.main import app
+from app.storage.db import new_db_session
+from app.storage.mappers import BranchMapper, ItemMapper
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app, base_url=f"http://testserver{API_V1_PREFIX}") as client:
+        yield client
+
+
+@pytest.fixture
+def restaurant(client):
+    """
+    A restaurant created through the API, with a branch and two items added to the database
+    """
+    restaurant = client.post("/restaurants/", json={"name": "Test Kitchen", "description": "Tests"}).json()
+    for db in new_db_session():
+        db.add(BranchMapper(restaurant_id=restaurant["id"], latitude=0.41, longitude=1.58))
+        for name, price in (("Pizza", 10), ("Pasta", 8)):
+            db.add(ItemMapper(restaurant_id=restaurant["id"], name=name, description="", price=price))
+        db.commit()
+    return restaurant
@@ -0,0 +1,34 @@
+from sqlmodel import Session
+
+from app.storage.db import get_db_engine
+from app.storage.mappers import UserMapper
+from app.services import principal_cache
+
+
+def _login(client, email):
+    client.post("/users/", json={"email": email, "phone": "01712345678", "password": "secret-password"})
+    response = client.post("/login/access-token", data={"username": email, "password": "secret-password"})
+    return response.json()["access_token"]
+
+
+def test_current_user(client):
+    token = _login(client, "me@example.com")
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "me@example.com"
+
+
+def test_current_user_deleted_elsewhere(client):
+    token = _login(client, "gone@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/users/me", headers=headers).json()["id"]
+
+    # Deleted without going through this worker, so its principal is still cached here
+    with Session(get_db_engine()) as db:
+        db.delete(db.get(UserMapper, user_id))
+        db.commit()
+
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 401
+    assert principal_cache.get(token) is None
+    assert client.get("/users/me", headers=headers).status_code == 401
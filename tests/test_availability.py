@@ -0,0 +1,50 @@
+from app.config import PROXIMITY_THRESHOLD
+from app.schemas import BranchCreate, BranchUpdate
+from app.storage.db import new_db_session
+from app.services import BranchService, availability_cache
+from app.services.geo import EARTH_RADIUS
+
+
+def _edge_locations(branch_coords):
+    # Two delivery locations in the same cell, just within and just beyond the branch's delivery range
+    lat, lon = branch_coords
+    for shift in range(0, 1000, 20):
+        inside = (lat + (PROXIMITY_THRESHOLD - 20 - shift) / EARTH_RADIUS, lon)
+        outside = (lat + (PROXIMITY_THRESHOLD + 20 - shift) / EARTH_RADIUS, lon)
+        if availability_cache.get_cell(inside) == availability_cache.get_cell(outside):
+            return inside, outside
+    raise AssertionError("no cell straddles the edge of the delivery range")
+
+
+def _available_ids(client, coords):
+    response = client.get("/restaurants/available", params={"latitude": coords[0], "longitude": coords[1]})
+    assert response.status_code == 200
+    return {restaurant["id"] for restaurant in response.json()}
+
+
+def test_cached_availability_is_exact(client):
+    restaurant = client.post("/restaurants/", json={"name": "Edge Grill", "description": ""}).json()
+    for db in new_db_session():
+        data = BranchCreate(restaurant_id=restaurant["id"], latitude=-0.3, longitude=0.9)
+        branch = BranchService(db).create(data=data)
+    inside, outside = _edge_locations(branch.coords)
+
+    # Both locations share the cached entry, which is filtered by the exact distance
+    assert restaurant["id"] in _available_ids(client, inside)
+    assert restaurant["id"] not in _available_ids(client, outside)
+
+    # Moving the branch away invalidates the entries listing it
+    for db in new_db_session():
+        BranchService(db).update(id=branch.id, data=BranchUpdate(latitude=-0.35))
+    assert restaurant["id"] not in _available_ids(client, inside)
+
+
+def test_availability_put_after_invalidation_is_dropped(client):
+    cell = availability_cache.get_cell((-0.6, 0.3))
+    version = availability_cache.version
+    availability_cache.invalidate_restaurants({0})
+    availability_cache.put(cell, [], version=version)
+    assert availability_cache.get(cell) is None
+
+    availability_cache.put(cell, [], version=availability_cache.version)
+    assert availability_cache.get(cell) == []
@@ -0,0 +1,39 @@
+import pytest
+
+from app.schemas import BranchCreate
+from app.storage.db import new_db_session
+from app.storage.mappers import BranchMapper, ServiceabilityMapper, column, select
+from app.services import BranchService, ServiceabilityService
+
+
+def _count_cells(branch_id):
+    for db in new_db_session():
+        stmt = select(ServiceabilityMapper).where(column(ServiceabilityMapper.branch_id) == branch_id)
+        return len(db.exec(stmt).all())
+
+
+def test_created_branch_is_serviceable(client, restaurant):
+    for db in new_db_session():
+        data = BranchCreate(restaurant_id=restaurant["id"], latitude=0.5, longitude=1.2)
+        branch = BranchService(db).create(data=data)
+    assert _count_cells(branch.id) > 0
+
+
+def test_failed_serviceability_write_rolls_back_branch(client, restaurant, monkeypatch):
+    def fail(self, branch_rows):
+        raise RuntimeError("serviceability write failed")
+
+    monkeypatch.setattr(ServiceabilityService, "update_branches", fail)
+    for db in new_db_session():
+        with pytest.raises(RuntimeError):
+            BranchService(db).create(data=BranchCreate(restaurant_id=restaurant["id"], latitude=0.52, longitude=1.22))
+    for db in new_db_session():
+        assert db.exec(select(BranchMapper).where(column(BranchMapper.latitude) == 0.52)).first() is None
+
+
+def test_imported_branch_is_serviceable(client, restaurant):
+    body = f'{{"restaurant_id": {restaurant["id"]}, "latitude": 0.51, "longitude": 1.21}}\n'
+    assert client.post("/branches/import", content=body).json()["imported"] == 1
+    for db in new_db_session():
+        branch_id = db.exec(select(BranchMapper.id).where(column(BranchMapper.latitude) == 0.51)).one()
+    assert _count_cells(branch_id) > 0
@@ -0,0 +1,20 @@
+def test_bulk_create_items(client, restaurant):
+    data = [{"restaurant_id": restaurant["id"], "name": f"Dish {i}", "description": "", "price": 5} for i in range(3)]
+    response = client.post("/items/bulk", json=data)
+    assert response.status_code == 200
+    assert len(response.json()["ids"]) == 3
+
+
+def test_bulk_create_reports_missing_references(client, restaurant):
+    data = [
+        {"restaurant_id": restaurant["id"], "name": "Soup", "description": "", "price": 4},
+        {"restaurant_id": 999999, "name": "Salad", "description": "", "price": 6},
+    ]
+    response = client.post("/items/bulk", json=data)
+    assert response.status_code == 422
+    [error] = response.json()["detail"]
+    assert error["loc"] == ["body", 1, "restaurant_id"] and error["input"] == 999999
+
+    # Nothing of the batch was written
+    items = client.get(f"/restaurants/{restaurant['id']}").json()["items"]
+    assert "Soup" not in [item["name"] for item in items]
@@ -0,0 +1,52 @@
+from itertools import permutations
+import numpy as np
+
+from app.storage.db import new_db_session
+from app.services import DispatchService, solve_assignment
+
+
+def test_solve_assignment_is_optimal():
+    rng = np.random.default_rng(0)
+    for rows, columns in ((4, 4), (3, 5), (5, 3)):
+        costs = rng.integers(0, 1000, size=(rows, columns)).astype(float)
+        assignment = solve_assignment(costs)
+        assigned = [(row, column) for row, column in enumerate(assignment) if column >= 0]
+        assert len(assigned) == min(rows, columns)
+        assert len({column for _, column in assigned}) == len(assigned)
+
+        # Every way of matching as many rows as possible costs at least as much
+        wide = costs if rows <= columns else costs.T
+        best = min(
+            sum(wide[row, column] for row, column in enumerate(pick))
+            for pick in permutations(range(wide.shape[1]), wide.shape[0])
+        )
+        assert sum(costs[row, column] for row, column in assigned) == best
+
+
+def test_dispatch_assigns_nearby_rider(client):
+    coords = {"latitude": -1.0, "longitude": -1.0}
+    area = client.post("/areas/", json={"name": "Dispatch Area", **coords}).json()
+    user = {"email": "dispatch@example.com", "phone": "01612345678", "password": "secret-password"}
+    customer = client.post("/users/", json=user).json()
+    restaurant = client.post("/restaurants/", json={"name": "Dispatch Kitchen", "description": ""}).json()
+    branch = client.post("/branches/", json={"restaurant_id": restaurant["id"], "area_id": area["id"], **coords}).json()
+    item = {"restaurant_id": restaurant["id"], "name": "Noodles", "description": "", "price": 6}
+    item = client.post("/items/", json=item).json()
+    order = {"customer_id": customer["id"], "branch_id": branch["id"], **coords}
+    order = client.post("/orders/", json={**order, "items": [{"item_id": item["id"], "quantity": 1}]}).json()
+    near = client.post("/riders/", json={"name": "Near", "latitude": -1.0001, "longitude": -1.0}).json()
+    far = client.post("/riders/", json={"name": "Far", "latitude": -1.1, "longitude": -1.0}).json()
+
+    for db in new_db_session():
+        result = DispatchService(db).dispatch()
+    assert result.assigned >= 1
+
+    order = client.get(f"/orders/{order['id']}").json()
+    assert (order["status"], order["rider_id"]) == ("accepted", near["id"])
+    assert not client.get(f"/riders/{near['id']}").json()["available"]
+    # Out of reach of every branch, so left for a later tick
+    assert client.get(f"/riders/{far['id']}").json()["available"]
+
+    # Deleting the order frees its rider
+    assert client.delete(f"/orders/{order['id']}").status_code == 200
+    assert client.get(f"/riders/{near['id']}").json()["available"]
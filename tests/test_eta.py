@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from pytest import approx
+
+from app.schemas import OrderStatus
+from app.storage.db import new_db_session
+from app.storage.mappers import DeliveryStatsMapper, OrderMapper, ServiceabilityMapper, column, select, update
+from app.services import EtaService, availability_cache
+
+
+def _deliver(order_id, minutes):
+    # Mark an order delivered `minutes` after it was placed, without queueing the learning
+    for db in new_db_session():
+        row = db.get(OrderMapper, order_id)
+        row.status = OrderStatus.DELIVERED
+        row.created_at = datetime.now() - timedelta(minutes=minutes)
+        row.updated_at = datetime.now()
+        db.add(row)
+        db.commit()
+
+
+def _get_stats(area_id):
+    for db in new_db_session():
+        stats = db.get(DeliveryStatsMapper, area_id)
+        return stats and stats.model_dump()
+
+
+def _get_etas(branch_id):
+    for db in new_db_session():
+        stmt = select(ServiceabilityMapper.eta).where(column(ServiceabilityMapper.branch_id) == branch_id)
+        return set(db.exec(stmt).all())
+
+
+def test_record_delivery(client):
+    coords = {"latitude": 1.1, "longitude": -2.0}
+    area = client.post("/areas/", json={"name": "Eta Area", **coords}).json()
+    user = {"email": "eta@example.com", "phone": "01512345678", "password": "secret-password"}
+    customer = client.post("/users/", json=user).json()
+    restaurant = client.post("/restaurants/", json={"name": "Eta Kitchen", "description": ""}).json()
+    branch = client.post("/branches/", json={"restaurant_id": restaurant["id"], "area_id": area["id"], **coords}).json()
+    other_branch = {"restaurant_id": restaurant["id"], "area_id": area["id"], "latitude": 1.2, "longitude": -2.0}
+    other_branch = client.post("/branches/", json=other_branch).json()
+    item = {"restaurant_id": restaurant["id"], "name": "Dumplings", "description": "", "price": 3}
+    item = client.post("/items/", json=item).json()
+    orders = [
+        client.post(
+            "/orders/",
+            json={
+                "customer_id": customer["id"],
+                "branch_id": branch["id"],
+                "latitude": 1.1 + offset,
+                "longitude": -2.0,
+                "items": [{"item_id": item["id"], "quantity": 1}],
+            },
+        ).json()
+        for offset in (0.0001, 0.0003)
+    ]
+
+    # Learning invalidates the cached availability listing the area's branches
+    params = {"latitude": coords["latitude"], "longitude": coords["longitude"]}
+    assert restaurant["id"] in [body["id"] for body in client.get("/restaurants/available", params=params).json()]
+    cell = availability_cache.get_cell((coords["latitude"], coords["longitude"]))
+    assert availability_cache.get(cell) is not None
+
+    # Mark the estimates of the other branch, which deliveries from the first one leave alone
+    for db in new_db_session():
+        db.exec(
+            update(ServiceabilityMapper)
+            .where(column(ServiceabilityMapper.branch_id) == other_branch["id"])
+            .values(eta=-1)
+        )
+        db.commit()
+
+    for order, minutes in zip(orders, (20, 40)):
+        _deliver(order["id"], minutes)
+        for db in new_db_session():
+            assert EtaService(db).record_delivery(order["id"])
+    assert availability_cache.get(cell) is None
+    assert _get_etas(other_branch["id"]) == {-1}
+    assert -1 not in _get_etas(branch["id"])
+
+    stats = _get_stats(area["id"])
+    assert stats["samples"] == 2
+    assert stats["mean_duration"] == approx(30 * 60, abs=5)
+
+    # Learning one delivery at a time gives the statistics learned from all of them at once
+    for db in new_db_session():
+        EtaService(db).rebuild()
+    assert _get_stats(area["id"]) == approx(stats, rel=1e-6)
+    assert -1 not in _get_etas(other_branch["id"])
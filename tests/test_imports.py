@@ -0,0 +1,16 @@
+def test_import_csv_with_empty_required_string(client, restaurant):
+    body = f"name,description,price,restaurant_id\nTea,,2.5,{restaurant['id']}\n"
+    response = client.post("/items/import", params={"format": "csv"}, content=body)
+    assert response.status_code == 200
+    assert response.json() == {"imported": 1, "failed": 0, "errors": []}
+
+    items = client.get(f"/restaurants/{restaurant['id']}").json()["items"]
+    assert {"name": "Tea", "description": ""}.items() <= next(item for item in items if item["name"] == "Tea").items()
+
+
+def test_import_csv_with_empty_optional_cell(client, restaurant):
+    # An empty `area_id` is a missing value, so the branch is put in the nearest area if any
+    body = f"restaurant_id,latitude,longitude,area_id\n{restaurant['id']},0.42,1.59,\n"
+    response = client.post("/branches/import", params={"format": "csv"}, content=body)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 1
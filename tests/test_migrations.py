@@ -0,0 +1,96 @@
+from sqlalchemy import inspect, text
+
+from app.storage.db import create_db_engine
+from app.storage.mappers import SQLModel
+from app.storage.migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, migrate
+
+
+def _describe(engine):
+    inspector = inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        columns = {(column["name"], str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)}
+        indexes = {(index["name"], tuple(index["column_names"])) for index in inspector.get_indexes(table)}
+        foreign_keys = {
+            (tuple(key["constrained_columns"]), key["referred_table"]) for key in inspector.get_foreign_keys(table)
+        }
+        schema[table] = (columns, indexes, foreign_keys)
+    return schema
+
+
+def test_migrate_empty_database(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/empty.db")
+    assert migrate(engine) == list(range(1, SCHEMA_VERSION + 1))
+    assert get_schema_version(engine) == SCHEMA_VERSION
+    assert migrate(engine) == []
+
+    # Every table the mappers declare ends up as they declare it
+    expected = create_db_engine(f"sqlite:///{tmp_path}/expected.db")
+    SQLModel.metadata.create_all(expected)
+    migrated = _describe(engine)
+    for table, description in _describe(expected).items():
+        assert migrated[table] == description, table
+
+    # The rider of an order is set null when the rider is deleted
+    with engine.connect() as connection:
+        keys = connection.execute(text("PRAGMA foreign_key_list('order')")).all()
+    assert ("rider", "rider_id", "SET NULL") in {(key[2], key[3], key[6]) for key in keys}
+    engine.dispose()
+    expected.dispose()
+
+
+def test_migrate_step_by_step(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/steps.db")
+    for version in range(1, SCHEMA_VERSION + 1):
+        assert migrate(engine, target=version) == [version]
+    assert get_schema_version(engine) == SCHEMA_VERSION
+    engine.dispose()
+
+
+def test_migrate_populates_serviceability_of_existing_branches(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/branches.db")
+    # Up to the version before the one populating the table
+    migrate(engine, target=[name for name, _ in MIGRATIONS].index("Serviceability of existing branches"))
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO restaurant (name, description, created_at) VALUES ('Old Kitchen', '', '2024-01-01')")
+        )
+        connection.execute(
+            text(
+                "INSERT INTO branch (restaurant_id, latitude, longitude, address, created_at) "
+                "VALUES (1, 0.41, 1.58, '', '2024-01-01')"
+            )
+        )
+    migrate(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM serviceability WHERE branch_id = 1")).scalar() > 0
+    engine.dispose()
+
+
+def test_migrate_keeps_idempotency_keys(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/keys.db")
+    migrate(engine, target=[name for name, _ in MIGRATIONS].index("Idempotency keys per customer"))
+    statements = [
+        # The keys table as released, before its mapper gained the customer
+        "DROP TABLE idempotency_key",
+        "CREATE TABLE idempotency_key (key VARCHAR(255) PRIMARY KEY, fingerprint VARCHAR NOT NULL, "
+        'order_id INTEGER REFERENCES "order" (id) ON DELETE CASCADE, response VARCHAR NOT NULL, '
+        "created_at DATETIME NOT NULL, expires_at DATETIME NOT NULL)",
+        "CREATE INDEX ix_idempotency_key_expires_at ON idempotency_key (expires_at)",
+        "INSERT INTO user (phone, email, hashed_password, created_at) "
+        "VALUES ('01712345678', 'a@example.com', '', '2024-01-01')",
+        "INSERT INTO restaurant (name, description, created_at) VALUES ('Old Kitchen', '', '2024-01-01')",
+        "INSERT INTO branch (restaurant_id, latitude, longitude, address, created_at) "
+        "VALUES (1, 0.41, 1.58, '', '2024-01-01')",
+        'INSERT INTO "order" (customer_id, branch_id, status, latitude, longitude, address, created_at) '
+        "VALUES (1, 1, 'PENDING', 0.41, 1.58, '', '2024-01-01')",
+        "INSERT INTO idempotency_key (key, fingerprint, order_id, response, created_at, expires_at) "
+        "VALUES ('old-key', 'hash', 1, '{}', '2024-01-01', '2999-01-01')",
+    ]
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(text(statement))
+    migrate(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT customer_id, key FROM idempotency_key")).all() == [(1, "old-key")]
+    engine.dispose()
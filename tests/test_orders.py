@@ -0,0 +1,142 @@
+from csv import DictReader
+from io import StringIO
+from json import loads
+from threading import Thread
+from time import sleep
+import pytest
+
+from app.schemas import OrderStatus
+from app.services import ORDER_TRANSITIONS
+
+
+@pytest.fixture(scope="module")
+def order_data(client):
+    """
+    Body of an order for a new customer at a branch of a new restaurant, and a second customer
+    """
+    customers = [
+        client.post("/users/", json={"email": email, "phone": "01912345678", "password": "secret-password"}).json()
+        for email in ("buyer@example.com", "other-buyer@example.com")
+    ]
+    restaurant = client.post("/restaurants/", json={"name": "Order Kitchen", "description": ""}).json()
+    branch = {"restaurant_id": restaurant["id"], "latitude": 0.3, "longitude": 1.4}
+    branch = client.post("/branches/", json=branch).json()
+    item = {"restaurant_id": restaurant["id"], "name": "Soup", "description": "", "price": 4}
+    item = client.post("/items/", json=item).json()
+    order = {"customer_id": customers[0]["id"], "branch_id": branch["id"], "latitude": 0.3, "longitude": 1.4}
+    order["items"] = [{"item_id": item["id"], "quantity": 1}]
+    return order, customers[1]["id"]
+
+
+def test_idempotent_create_replays_retries(client, order_data):
+    order, _ = order_data
+    headers = {"Idempotency-Key": "retry-key"}
+    first = client.post("/orders/", json=order, headers=headers)
+    retry = client.post("/orders/", json=order, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+def test_idempotent_create_rejects_reused_key(client, order_data):
+    order, _ = order_data
+    headers = {"Idempotency-Key": "reused-key"}
+    assert client.post("/orders/", json=order, headers=headers).status_code == 200
+    changed = {**order, "items": [{**order["items"][0], "quantity": 2}]}
+    assert client.post("/orders/", json=changed, headers=headers).status_code == 400
+
+
+def test_idempotency_keys_are_per_customer(client, order_data):
+    order, other_customer_id = order_data
+    headers = {"Idempotency-Key": "shared-key"}
+    first = client.post("/orders/", json=order, headers=headers)
+    other = client.post("/orders/", json={**order, "customer_id": other_customer_id}, headers=headers)
+    assert first.status_code == other.status_code == 200
+    assert other.json()["id"] != first.json()["id"]
+    assert other.json()["customer_id"] == other_customer_id
+    assert "Idempotent-Replayed" not in other.headers
+
+
+# Transitions that take a new order to each status
+_PATHS = {
+    OrderStatus.PENDING: [],
+    OrderStatus.ACCEPTED: [OrderStatus.ACCEPTED],
+    OrderStatus.PICKEDUP: [OrderStatus.ACCEPTED, OrderStatus.PICKEDUP],
+    OrderStatus.DELIVERED: [OrderStatus.ACCEPTED, OrderStatus.PICKEDUP, OrderStatus.DELIVERED],
+    OrderStatus.REJECTED: [OrderStatus.REJECTED],
+    OrderStatus.CANCELLED: [OrderStatus.CANCELLED],
+}
+
+
+def _place(client, order_data, *statuses):
+    order = client.post("/orders/", json=order_data[0]).json()
+    for status in statuses:
+        response = client.post(f"/orders/{order['id']}/status", json={"status": status.value})
+        assert response.status_code == 200
+        order = response.json()
+    return order
+
+
+@pytest.mark.parametrize("current, new", [(current, new) for current in OrderStatus for new in OrderStatus])
+def test_order_transitions(client, order_data, current, new):
+    order = _place(client, order_data, *_PATHS[current])
+    assert order["status"] == current.value
+    response = client.post(f"/orders/{order['id']}/status", json={"status": new.value})
+    if new in ORDER_TRANSITIONS[current]:
+        assert response.status_code == 200
+        assert response.json()["status"] == new.value
+        assert response.json()["version"] == order["version"] + 1
+    else:
+        assert response.status_code == 409
+
+
+def test_transition_of_stale_version(client, order_data):
+    order = _place(client, order_data)
+    path = f"/orders/{order['id']}/status"
+    assert client.post(path, json={"status": "accepted", "version": order["version"]}).status_code == 200
+    assert client.post(path, json={"status": "cancelled", "version": order["version"]}).status_code == 409
+
+
+def test_order_events(client, order_data):
+    order = _place(client, order_data, OrderStatus.ACCEPTED)
+
+    # The stream is read once it ends, so the order is moved to a final status while it is open
+    def finish():
+        sleep(0.2)
+        for status in (OrderStatus.PICKEDUP, OrderStatus.DELIVERED):
+            client.post(f"/orders/{order['id']}/status", json={"status": status.value})
+
+    finisher = Thread(target=finish)
+    finisher.start()
+    response = client.get(f"/orders/{order['id']}/events")
+    finisher.join()
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [event for event in response.text.split("\n\n") if event.startswith("event: order")]
+    statuses = [loads(event.split("data: ", 1)[1])["status"] for event in events]
+    assert statuses == ["accepted", "pickedup", "delivered"]
+
+
+def test_export_orders(client, order_data):
+    order = _place(client, order_data, OrderStatus.REJECTED)
+    params = {"status": "rejected", "branch_id": order["branch_id"]}
+
+    response = client.get("/orders/export", params=params)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    exported = [loads(line) for line in response.text.splitlines()]
+    assert order["id"] in [row["id"] for row in exported]
+    assert {row["status"] for row in exported} == {"rejected"}
+
+    response = client.get("/orders/export", params={**params, "format": "csv"})
+    rows = list(DictReader(StringIO(response.text)))
+    assert len(rows) == len(exported)
+    assert loads(next(row for row in rows if row["id"] == str(order["id"]))["item_links"])
+
+
+def test_order_fieldsets(client, order_data):
+    order = _place(client, order_data)
+    assert client.get(f"/orders/{order['id']}", params={"fields": "status"}).json() == {
+        "id": order["id"],
+        "status": "pending",
+    }
+    assert client.get(f"/orders/{order['id']}", params={"fields": "nonexistent"}).status_code == 400
@@ -0,0 +1,50 @@
+import pytest
+
+from app.storage.db import count_queries
+
+
+@pytest.fixture(scope="module")
+def orders(client):
+    """
+    Restaurants with branches and items, and orders with several line items at each of them
+    """
+    user = {"email": "customer@example.com", "phone": "01812345678", "password": "secret-password"}
+    customer = client.post("/users/", json=user).json()
+    orders = []
+    for i in range(3):
+        restaurant = client.post("/restaurants/", json={"name": f"Kitchen {i}", "description": ""}).json()
+        branch = {"restaurant_id": restaurant["id"], "latitude": 0.4 + i / 10000, "longitude": 1.5}
+        branch = client.post("/branches/", json=branch).json()
+        item = {"restaurant_id": restaurant["id"], "description": "", "price": 5}
+        items = [client.post("/items/", json={**item, "name": name}) for name in ("Rice", "Curry", "Bread")]
+        order = {"customer_id": customer["id"], "branch_id": branch["id"], "latitude": 0.4, "longitude": 1.5}
+        order["items"] = [{"item_id": item.json()["id"], "quantity": 2} for item in items]
+        orders += [client.post("/orders/", json=order).json() for _ in range(2)]
+    return orders
+
+
+def _count(client, path, **params):
+    with count_queries() as statements:
+        response = client.get(path, params=params)
+    assert response.status_code == 200
+    return response.json(), len(statements)
+
+
+# Each endpoint issues a fixed number of queries, however many rows and related rows it serializes:
+# one for the rows and one per eagerly loaded relationship
+@pytest.mark.parametrize("path, max_queries", [("/restaurants/", 3), ("/branches/", 1), ("/orders/", 2)])
+def test_list_queries(client, orders, path, max_queries):
+    body, queries = _count(client, path, limit=100)
+    assert len(body) >= 3
+    assert queries <= max_queries
+
+
+def test_detail_queries(client, orders):
+    order = orders[0]
+    _, queries = _count(client, f"/orders/{order['id']}")
+    assert queries <= 2
+    _, queries = _count(client, f"/branches/{order['branch_id']}")
+    assert queries <= 1
+    restaurant_id = client.get(f"/branches/{order['branch_id']}").json()["restaurant_id"]
+    _, queries = _count(client, f"/restaurants/{restaurant_id}")
+    assert queries <= 3
@@ -0,0 +1,49 @@
+def test_create_restaurant(client):
+    response = client.post("/restaurants/", json={"name": "Pizza Palace", "description": "Wood fired"})
+    assert response.status_code == 200
+    restaurant = response.json()
+    assert restaurant["name"] == "Pizza Palace"
+    assert restaurant["branches"] == [] and restaurant["items"] == []
+
+
+def test_get_restaurant_from_row(client, restaurant):
+    # The entity is built from the ORM row along with its relationships
+    response = client.get(f"/restaurants/{restaurant['id']}")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["id"] == restaurant["id"]
+    assert len(body["branches"]) == 1
+    assert sorted(item["name"] for item in body["items"]) == ["Pasta", "Pizza"]
+
+
+def test_list_restaurants(client, restaurant):
+    response = client.get("/restaurants/", params={"limit": 100})
+    assert response.status_code == 200
+    assert restaurant["id"] in [body["id"] for body in response.json()]
+
+
+def test_get_missing_restaurant(client):
+    assert client.get("/restaurants/999999").status_code == 404
+
+
+def test_restaurant_etag(client, restaurant):
+    path = f"/restaurants/{restaurant['id']}"
+    first = client.get(path)
+    etag = first.headers["ETag"]
+    assert client.get(path).headers["ETag"] == etag
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    # A write to the restaurant changes its snapshot, so the old tag no longer matches
+    assert client.put(path, json={"name": "Renamed Kitchen", "description": "Tests"}).status_code == 200
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["name"] == "Renamed Kitchen"
+
+
+def test_restaurant_fieldsets(client, restaurant):
+    path = f"/restaurants/{restaurant['id']}"
+    assert client.get(path, params={"fields": "name"}).json() == {"id": restaurant["id"], "name": "Test Kitchen"}
+    body = client.get(path, params={"fields": "name", "include": "items"}).json()
+    assert set(body) == {"id", "name", "items"}
+    assert sorted(item["name"] for item in body["items"]) == ["Pasta", "Pizza"]
@@ -0,0 +1,55 @@
+import pytest
+
+from app.storage.db import new_db_session
+from app.storage.mappers import ItemMapper
+from app.services.search import FTS5SearchIndex, MemorySearchIndex, tokenize
+
+
+@pytest.fixture(scope="module")
+def menu(client):
+    """
+    A restaurant with a branch and items whose names and descriptions share a few words
+    """
+    restaurant = client.post("/restaurants/", json={"name": "Search Bakery", "description": "Cakes"}).json()
+    branch = {"restaurant_id": restaurant["id"], "latitude": -0.2, "longitude": -0.7}
+    client.post("/branches/", json=branch)
+    items = {}
+    for name, description in (
+        ("Zesty Lemon Tart", "Tangy and sweet"),
+        ("Lemon Zest Cake", "Light sponge"),
+        ("Zebra Cake", "Marbled with zesty glaze"),
+        ("Crème Brûlée", "Caramelised lemon custard"),
+    ):
+        item = {"restaurant_id": restaurant["id"], "name": name, "description": description, "price": 3}
+        items[name] = client.post("/items/", json=item).json()["id"]
+    return restaurant, items
+
+
+def _search(client, q, **params):
+    response = client.get("/search/items", params={"q": q, **params})
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_search_items(client, menu):
+    # Matches in the name rank above matches in the description
+    assert _search(client, "zest", prefix=False) == ["Lemon Zest Cake"]
+    assert _search(client, "zest") == ["Lemon Zest Cake", "Zesty Lemon Tart", "Zebra Cake"]
+    assert _search(client, "creme brulee") == ["Crème Brûlée"]
+    assert _search(client, "lemon cust") == ["Crème Brûlée"]
+
+    # Near the branch, and far from it
+    assert "Zebra Cake" in _search(client, "zebra", latitude=-0.2, longitude=-0.7)
+    assert _search(client, "zebra", latitude=0.9, longitude=2.5) == []
+
+
+@pytest.mark.parametrize("query", ["zest", "lemon", "lemon ca", "cake zes", "brulee", "tangy sweet", "nothing"])
+@pytest.mark.parametrize("prefix", [True, False])
+@pytest.mark.parametrize("names_only", [True, False])
+def test_memory_index_matches_fts(client, menu, query, prefix, names_only):
+    restaurant, _ = menu
+    options = dict(prefix=prefix, names_only=names_only, restaurant_ids={restaurant["id"]}, limit=10)
+    for db in new_db_session():
+        fts = FTS5SearchIndex(ItemMapper).find(db, tokenize(query), **options)
+        memory = MemorySearchIndex(ItemMapper).find(db, tokenize(query), **options)
+    assert memory == fts
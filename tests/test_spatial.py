@@ -0,0 +1,34 @@
+from sqlmodel import Session
+
+from app.storage.db import get_db_engine
+from app.storage.mappers import AreaMapper
+from app.services.spatial import SpatialIndex
+
+
+def _add_area(name, coords):
+    # Written through a separate session, like another worker would
+    with Session(get_db_engine()) as db:
+        row = AreaMapper(name=name, latitude=coords[0], longitude=coords[1])
+        db.add(row)
+        db.commit()
+        return row.id
+
+
+def test_index_reloads_writes_of_other_workers(client):
+    with Session(get_db_engine()) as db:
+        fresh = SpatialIndex(AreaMapper, ttl=0).ensure_built(db)
+        cached = SpatialIndex(AreaMapper, ttl=3600).ensure_built(db)
+        area_id = _add_area("Elsewhere", (-0.9, -2.1))
+
+        assert fresh.ensure_built(db).query_nearest((-0.9, -2.1)) == area_id
+        assert cached.ensure_built(db).query_nearest((-0.9, -2.1)) != area_id
+
+
+def test_nearest_in_sparse_index(client):
+    assert SpatialIndex(AreaMapper).query_nearest((0.1, 0.2)) is None
+
+    # Points far beyond the first cells searched are still found, across the antimeridian too
+    area_id = _add_area("Across", (-0.5, 3.1))
+    with Session(get_db_engine()) as db:
+        index = SpatialIndex(AreaMapper).ensure_built(db)
+    assert index.query_nearest((-0.5, -3.1)) == area_id
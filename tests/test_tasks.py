@@ -0,0 +1,48 @@
+from asyncio import run
+from threading import current_thread, main_thread
+
+from app.services.tasks import TaskQueue
+
+
+def test_tasks_run_and_retry():
+    attempts, threads = [], []
+
+    async def flaky():
+        attempts.append(len(attempts))
+        if len(attempts) < 3:
+            raise RuntimeError("not yet")
+
+    def blocking():
+        # Functions that are not coroutines run on a database worker thread
+        threads.append(current_thread())
+
+    async def main():
+        queue = TaskQueue(concurrency=2, max_retries=2, retry_delay=0.01)
+        queue.submit(flaky)
+        await queue.start()
+        queue.submit(flaky)
+        queue.submit(blocking)
+        await queue.stop()
+        return queue.stats
+
+    stats = run(main())
+    assert len(attempts) == 3
+    assert len(threads) == 1 and threads[0] is not main_thread()
+    # The task submitted before the start is dropped
+    assert (stats.submitted, stats.dropped, stats.completed, stats.retried, stats.failed) == (2, 1, 2, 2, 0)
+    assert not stats.running
+
+
+def test_failing_task_gives_up():
+    async def broken():
+        raise RuntimeError("always")
+
+    async def main():
+        queue = TaskQueue(max_retries=1, retry_delay=0.01)
+        await queue.start()
+        queue.submit(broken)
+        await queue.stop()
+        return queue.stats
+
+    stats = run(main())
+    assert (stats.retried, stats.failed, stats.completed) == (1, 1, 0)